@@ -24,5 +24,100 @@ class TestCommon(unittest.TestCase):
         shortest_path = astar.PathFinder().find(test_map, [0, 0], [19, 19])
         self.assertTrue(_equal(path_data, numpy.array(shortest_path)))
 
+    def test_same_source_and_destination(self):
+        """The path leaves the source and comes back to it"""
+        test_map = numpy.ones((12, 15))
+        path = astar.PathFinder().find(test_map, [8, 0], [8, 0])
+        self.assertEqual([[8, 1], [8, 0]], path)
+
+    def test_repeated_searches(self):
+        """Searches on the same map do not share any state"""
+        test_map = numpy.random.RandomState(0).uniform(0, 2, (30, 30))
+        finder = astar.PathFinder()
+        first = finder.find(test_map, [0, 0], [29, 29])
+        self.assertEqual(first, finder.find(test_map, [0, 0], [29, 29]))
+        self.assertEqual([29, 29], first[-1])
+
+    def _maze(self):
+        test_map = numpy.ones((20, 20))
+        test_map[10, :] = 50.0
+        test_map[10, 18] = 1.0
+        return test_map
+
+    def test_bidirectional(self):
+        """The bidirectional search finds a cheapest path"""
+        test_map = self._maze()
+        for landmarks in (0, 3):
+            finder = astar.PathFinder(bidirectional=True, landmarks=landmarks)
+            path = finder.find(test_map, [0, 0], [19, 19])
+            self.assertEqual([19, 19], path[-1])
+            self.assertEqual(38, len(path))  # around the wall without going up it
+            self.assertTrue([18, 10] in path)
+
+    def test_landmarks(self):
+        test_map = self._maze()
+        finder = astar.PathFinder(landmarks=2)
+        path = finder.find(test_map, [0, 0], [19, 19])
+        self.assertTrue([18, 10] in path)
+        self.assertEqual([19, 19], path[-1])
+
+        landmarks = astar.Landmarks(test_map.ravel(), 20, 20, 2)
+        estimates = landmarks.estimates(19 * 20 + 19)
+        cost, _ = astar._dijkstra(test_map.ravel(), 20, 20, [19 * 20 + 19])
+        # lower bounds of the cost to the target, without the cell itself
+        self.assertTrue((estimates <= cost - test_map.ravel() + 1e-9).all())
+
+    def test_landmarks_cheapest_path(self):
+        """With landmarks the path found is a cheapest one"""
+        for seed in range(100):
+            rs = numpy.random.RandomState(seed)
+            height, width = rs.randint(5, 30, 2)
+            test_map = rs.uniform(0, 5, (height, width)) ** 2
+            source = [int(rs.randint(width)), int(rs.randint(height))]
+            destination = [int(rs.randint(width)), int(rs.randint(height))]
+            if source == destination:
+                continue
+            path = astar.PathFinder(landmarks=3).find(test_map, source, destination)
+            self.assertEqual(destination, path[-1])
+            path_cost = test_map[source[1], source[0]] + sum(test_map[y, x] for x, y in path)
+            cost, _ = astar._dijkstra(test_map.ravel(), width, height,
+                                      [source[1] * width + source[0]])
+            self.assertAlmostEqual(cost[destination[1] * width + destination[0]], path_cost)
+
+    def test_max_nodes(self):
+        test_map = self._maze()
+        self.assertEqual([], astar.PathFinder(max_nodes=10).find(test_map, [0, 0], [19, 19]))
+        self.assertEqual([], astar.PathFinder(max_nodes=10, bidirectional=True).find(
+            test_map, [0, 0], [19, 19]))
+        self.assertNotEqual([], astar.PathFinder(max_nodes=1000).find(
+            test_map, [0, 0], [19, 19]))
+
+    def test_find_many(self):
+        test_map = numpy.random.RandomState(1).uniform(0, 2, (25, 30))
+        pairs = [([0, 0], [29, 24]), ([5, 20], [25, 3]), ([3, 3], [4, 3])]
+        finder = astar.PathFinder(height_map=test_map)
+        expected = [astar.PathFinder().find(test_map, s, d) for s, d in pairs]
+        self.assertEqual(expected, finder.find_many(pairs))
+        self.assertEqual(expected, finder.find_many(pairs, workers=2))
+
+        self.assertRaises(Exception, astar.PathFinder().find_many, pairs)
+
+    def test_dijkstra(self):
+        test_map = self._maze()
+        finder = astar.PathFinder(height_map=test_map)
+        cost, predecessor = finder.dijkstra([[0, 0]])
+        self.assertEqual((20, 20), cost.shape)
+        self.assertEqual(1.0, cost[0, 0])
+        self.assertEqual(39.0, cost[19, 19])  # around the wall, all cells cost 1
+        self.assertEqual(48.0, cost[11, 0])   # cheaper around than through the wall
+
+        path = finder.path_to(predecessor, [19, 19])
+        self.assertEqual(38, len(path))
+        self.assertEqual([19, 19], path[-1])
+        self.assertTrue([18, 10] in path)
+        self.assertTrue(all(type(c) is int for cell in path for c in cell))
+        self.assertEqual([], finder.path_to(predecessor, [0, 0]))
+
+
 if __name__ == '__main__':
     unittest.main()
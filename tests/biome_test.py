@@ -1,10 +1,12 @@
 import unittest
 import os
 
+import numpy
+
 from worldengine.biome import Biome, Ocean, PolarDesert, SubpolarDryTundra, \
-    CoolTemperateMoistForest, biome_name_to_index, biome_index_to_name
+    CoolTemperateMoistForest, biome_name_to_index, biome_index_to_name, biome_index_names
 from worldengine.simulations.biome import BiomeSimulation
-from worldengine.model.world import World
+from worldengine.model.world import World, Size, GenerationParameters
 
 
 class TestBiome(unittest.TestCase):
@@ -120,6 +122,26 @@ class TestBiome(unittest.TestCase):
         self.assertEqual('warm temperate thorn scrub', biome_index_to_name(39))
         self.assertEqual('warm temperate wet forest', biome_index_to_name(40))
 
+    def test_biome_layer(self):
+        w = World("biome", Size(3, 2), 0, GenerationParameters(0, 1.0, 0))
+        names = numpy.array([['ocean', 'ice', 'bare rock'],
+                             ['boreal desert', 'ocean', 'tropical rain forest']], dtype=object)
+        w.biome = names
+        # the layer holds the indices, the names are found when asked
+        self.assertEqual(numpy.uint8, w.biome_indices.dtype)
+        self.assertEqual([biome_name_to_index('ocean'), biome_name_to_index('ice'),
+                          len(biome_index_names()) - 1], w.biome_indices[0].tolist())
+        self.assertTrue(numpy.array_equal(names, w.biome))
+        self.assertEqual('tropical rain forest', w.biome_at((2, 1)).name())
+        # the names are built once, and cannot be changed in place
+        self.assertIs(w.biome, w.biome)
+        self.assertRaises(ValueError, w.biome.__setitem__, (0, 0), 'ice')
+
+        w.biome = w.biome_indices.astype(int)
+        self.assertTrue(numpy.array_equal(names, w.biome))
+        self.assertRaises(Exception, setattr, w, 'biome', numpy.full((2, 3), 'marsh', dtype=object))
+        self.assertRaises(Exception, setattr, w, 'biome', numpy.full((2, 3), 100))
+
     def test_locate_biomes(self):
         w = World.open_protobuf("%s/seed_28070.world" % self.tests_data_dir)
         #TODO: do something to the result
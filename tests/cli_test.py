@@ -73,6 +73,20 @@ class TestCLI(TestBase):
         except Exception as e:
             raise e
 
+    def test_smoke_reclassify(self):
+        backup_argv = sys.argv
+        sys.argv = ["python", "reclassify", self.world, "-n", "reclassified",
+                    "--temps", ".2/.3/.45/.6/.7/.9", "-gv", "1.5"]
+        try:
+            main()
+        except Exception as e:
+            raise e
+        # the world reclassified is not overwritten
+        sys.argv = ["python", "reclassify", self.world, "-n", "seed_28070",
+                    "-o", self.tests_data_dir]
+        self.assertRaises(SystemExit, main)
+        sys.argv = backup_argv
+
     def test_smoke_ancient(self):
         backup_argv = sys.argv
         sys.argv = ["python", "ancient_map", "-w", self.world]
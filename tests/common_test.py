@@ -1,6 +1,7 @@
 import unittest
 import numpy
-from worldengine.common import Counter, anti_alias, get_verbose, set_verbose, _equal
+from worldengine.common import Counter, anti_alias, get_verbose, set_verbose, _equal, \
+    label_components, count_neighbours
 
 
 class TestCommon(unittest.TestCase):
@@ -38,6 +39,38 @@ class TestCommon(unittest.TestCase):
         antialiased = anti_alias(original, 10)
         self.assertAlmostEqual(0.8, antialiased[0][0])
 
+    def test_count_neighbours(self):
+        mask = numpy.array([[1, 1, 0, 0, 1],
+                            [0, 0, 0, 1, 0],
+                            [1, 0, 0, 0, 0],
+                            [1, 0, 1, 1, 0]], dtype=bool)
+        self.assertTrue(_equal(numpy.array([[1, 1, 2, 2, 1],
+                                            [3, 3, 2, 1, 2],
+                                            [1, 3, 3, 3, 2],
+                                            [1, 3, 1, 1, 1]]), count_neighbours(mask)))
+
+        # the borders do not wrap around
+        counts = count_neighbours(mask, 2)
+        self.assertEqual(2, counts[0, 0])
+        self.assertEqual(8, counts[2, 2])
+        self.assertEqual(7, count_neighbours(mask, 10)[0, 0])
+
+    def test_label_components(self):
+        mask = numpy.array([[1, 1, 0, 0, 1],
+                            [0, 0, 0, 1, 0],
+                            [1, 0, 0, 0, 0],
+                            [1, 0, 1, 1, 0]], dtype=bool)
+        labels, n = label_components(mask)
+        self.assertEqual(4, n)
+        self.assertTrue(_equal(numpy.array([[1, 1, 0, 0, 2],
+                                            [0, 0, 0, 2, 0],
+                                            [3, 0, 0, 0, 0],
+                                            [3, 0, 4, 4, 0]]), labels))
+
+        labels, n = label_components(numpy.zeros((3, 3), dtype=bool))
+        self.assertEqual(0, n)
+        self.assertFalse(labels.any())
+
     def test_dictionary_equality(self):
         a = {}
         b = {}
@@ -6,7 +6,7 @@ from worldengine.draw import _biome_colors, draw_simple_elevation, elevation_col
     draw_elevation, draw_riversmap, draw_ocean, draw_precipitation, \
     draw_world, draw_temperature_levels, draw_biome, draw_scatter_plot, draw_satellite
 from worldengine.biome import Biome
-from worldengine.model.world import World
+from worldengine.model.world import World, Size, GenerationParameters
 from worldengine.image_io import PNGWriter, PNGReader
 
 
@@ -161,5 +161,81 @@ class TestDraw(TestBase):
         draw_satellite(w, target)
         self._assert_img_equal("satellite_28070", target)
 
+
+class TestDrawTargets(unittest.TestCase):
+
+    class Canvas(object):
+        """A target with nothing but set_pixel, which fills in the missing
+        channels of a color with an opaque alpha like PNGWriter"""
+
+        def __init__(self, width, height, channels=4):
+            self.array = numpy.zeros((height, width, channels), dtype=numpy.uint8)
+            self.lengths = set()
+
+        def set_pixel(self, x, y, color):
+            self.lengths.add(len(color))
+            self.array[y, x] = (tuple(color) + (255,))[:self.array.shape[2]]
+
+    def _world(self):
+        w = World("draw", Size(3, 2), 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = numpy.array([[True, False, False], [True, True, False]])
+        w.sea_depth = numpy.array([[0.5, 0.0, 0.0], [1.0, 0.2, 0.0]])
+        w.biome = numpy.array([['ocean', 'ice', 'boreal desert'],
+                               ['ocean', 'ocean', 'tropical rain forest']], dtype=object)
+        return w
+
+    def test_same_image_on_any_target(self):
+        w = self._world()
+
+        for draw in (draw_world, draw_biome):
+            png = PNGWriter.rgba_from_dimensions(w.width, w.height)
+            canvas = self.Canvas(w.width, w.height)
+            draw(w, png)
+            draw(w, canvas)
+            self.assertTrue(numpy.array_equal(png.array, canvas.array))
+
+        # the pixels are set as they always were: biomes as RGB, the sea as RGBA
+        canvas = self.Canvas(w.width, w.height)
+        draw_biome(w, canvas)
+        self.assertEqual(set([3]), canvas.lengths)
+        canvas = self.Canvas(w.width, w.height)
+        draw_world(w, canvas)
+        self.assertEqual(set([3, 4]), canvas.lengths)
+        canvas = self.Canvas(w.width, w.height)
+        draw_ocean(w.layers['ocean'].data, canvas)
+        self.assertEqual(set([4]), canvas.lengths)
+
+        png = PNGWriter.rgba_from_dimensions(w.width, w.height)
+        draw_ocean(w.layers['ocean'].data, png)
+        self.assertEqual([0, 0, 255, 255], png.array[0, 0].tolist())
+        self.assertEqual([0, 255, 255, 255], png.array[0, 1].tolist())
+
+        png = PNGWriter.rgba_from_dimensions(w.width, w.height)
+        draw_world(w, png)
+        self.assertEqual([0, 0, 105, 255], png.array[0, 0].tolist())  # 255 - (0.5 * 200 + 50)
+        self.assertEqual(list(_biome_colors['tropical rain forest']) + [255],
+                         png.array[1, 2].tolist())
+
+    def test_rgb_target(self):
+        w = self._world()
+
+        for draw in (draw_world, draw_biome):
+            png = PNGWriter.rgb_from_dimensions(w.width, w.height)
+            canvas = self.Canvas(w.width, w.height, channels=3)
+            rgba = PNGWriter.rgba_from_dimensions(w.width, w.height)
+            draw(w, png)
+            draw(w, rgba)
+            self.assertEqual((w.height, w.width, 3), png.array.shape)
+            self.assertTrue(numpy.array_equal(rgba.array[:, :, :3], png.array))
+            if draw is draw_biome:
+                draw(w, canvas)
+                self.assertTrue(numpy.array_equal(png.array, canvas.array))
+
+        png = PNGWriter.rgb_from_dimensions(w.width, w.height)
+        draw_ocean(w.layers['ocean'].data, png)
+        self.assertEqual([0, 0, 255], png.array[0, 0].tolist())
+        self.assertEqual([0, 255, 255], png.array[0, 1].tolist())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+
+import numpy
+
+from worldengine.simulations.erosion import ErosionSimulation, _downstream, \
+    _first_downstream, _flow_accumulation, _priority_flood
+from worldengine.model.world import World, Size, GenerationParameters
+
+
+class TestErosion(unittest.TestCase):
+
+    def _world(self, elevation):
+        height, width = elevation.shape
+        w = World("erosion", Size(width, height), 0, GenerationParameters(0, 1.0, 0))
+        w.elevation = (elevation, None)
+        return w
+
+    def test_find_water_flow(self):
+        elevation = numpy.array([[5.0, 1.0, 5.0, 5.0],
+                                 [4.0, 3.0, 2.0, 5.0],
+                                 [0.5, 3.0, 3.0, 3.0],
+                                 [5.0, 5.0, 5.0, 5.0]])
+        water_path = numpy.zeros(elevation.shape, dtype=int)
+        ErosionSimulation().find_water_flow(self._world(elevation), water_path)
+
+        # 0 = no direction, then north, east, south and west; steps wrapping
+        # around the border and the last row and column get no direction
+        self.assertTrue(numpy.array_equal(numpy.array([[2, 0, 4, 0],
+                                                       [3, 1, 0, 0],
+                                                       [0, 4, 1, 0],
+                                                       [0, 0, 0, 0]]), water_path))
+
+    def test_find_water_flow_ties(self):
+        # the first of the lowest neighbours wins: north, east, south, west
+        elevation = numpy.array([[9.0, 1.0, 9.0],
+                                 [1.0, 5.0, 1.0],
+                                 [9.0, 1.0, 9.0]])
+        water_path = numpy.zeros(elevation.shape, dtype=int)
+        ErosionSimulation().find_water_flow(self._world(elevation), water_path)
+        self.assertEqual(1, water_path[1, 1])
+
+    def test_flow_accumulation(self):
+        # 0 -> 1 -> 2 <- 3, 4 -> 2, 5 alone
+        downstream = numpy.array([1, 2, -1, 2, 2, -1])
+        accumulated = _flow_accumulation(downstream, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+        self.assertEqual([1.0, 3.0, 15.0, 4.0, 5.0, 6.0], accumulated.tolist())
+
+        marked = numpy.array([False, False, True, False, False, False])
+        self.assertEqual([2, 2, -1, 2, 2, -1], _first_downstream(downstream, marked).tolist())
+        marked = numpy.array([True, True, False, False, False, False])
+        self.assertEqual([1, -1, -1, -1, -1, -1], _first_downstream(downstream, marked).tolist())
+
+    def test_downstream(self):
+        water_path = numpy.array([[2, 3, 0],
+                                  [1, 4, 0]])
+        self.assertEqual([1, 4, -1, 0, 3, -1], _downstream(water_path).tolist())
+
+    def test_river_sources(self):
+        # a mountain slope draining to the east, into the sea
+        elevation = numpy.array([[9.9, 9.0, 8.0, 7.0, 0.0, 9.9],
+                                 [9.9, 9.5, 8.5, 7.5, 0.0, 9.9],
+                                 [9.9, 9.0, 8.0, 7.0, 0.0, 9.9],
+                                 [9.9, 9.9, 9.9, 9.9, 0.0, 9.9]])
+        w = self._world(elevation)
+        w.elevation = (elevation, [('sea', 0.5), ('plain', 2.0), ('hill', 5.0), ('mountain', None)])
+        w.ocean = elevation < 0.5
+        w.precipitation = (numpy.full(elevation.shape, 0.01), None)
+
+        water_path = numpy.zeros(elevation.shape, dtype=int)
+        water_flow = numpy.zeros(elevation.shape)
+        simulation = ErosionSimulation()
+        simulation.find_water_flow(w, water_path)
+        sources = simulation.river_sources(w, water_flow, water_path)
+
+        # the flow of the second cell in row order reaches the threshold one
+        # cell downstream, no other seeds are created around that one
+        self.assertEqual([[2, 0]], sources)
+        # the sea receives the rainfall of the cells flowing into it
+        self.assertTrue(water_flow[1, 4] > 0.02)
+
+    def test_river_flow_joins_rivers(self):
+        elevation = numpy.array([[9.0, 8.0, 7.0, 6.0],
+                                 [9.0, 8.0, 7.0, 6.0],
+                                 [9.0, 8.0, 7.0, 6.0]])
+        w = self._world(elevation)
+        w.ocean = numpy.zeros(elevation.shape, dtype=bool)
+
+        river_list = [[[0, 0], [1, 0], [2, 0], [3, 0]],
+                      [[0, 1], [1, 1], [1, 0], [2, 0]]]
+        path = ErosionSimulation().river_flow([1, 2], w, river_list, [])
+        # the cell north of the source belongs to the second river
+        self.assertEqual([[1, 2], [1, 1], [1, 0], [2, 0]], path)
+
+        path = ErosionSimulation().river_flow([2, 1], w, river_list, [])
+        # the first river wins where two rivers share a cell
+        self.assertEqual([[2, 1], [2, 0], [3, 0]], path)
+
+    def test_priority_flood(self):
+        elevation = numpy.array([[9.0, 9.0, 9.0, 9.0, 9.0, 9.0, 9.0],
+                                 [9.0, 3.0, 2.0, 4.0, 1.0, 0.0, 9.0],
+                                 [9.0, 9.0, 9.0, 9.0, 9.0, 9.0, 9.0]])
+        ocean = elevation < 0.5
+        filled, receivers, lakes = _priority_flood(elevation, ocean)
+
+        # the depression west of the 4.0 is filled up to it
+        self.assertEqual([9.0, 4.0, 4.0, 4.0, 1.0, 0.0, 9.0], filled[1].tolist())
+        self.assertEqual([-1, 0, 0, -1, -1, -1, -1], lakes[1].tolist())
+        self.assertTrue((lakes[[0, 2]] == -1).all())
+        # and drains through it to the sea
+        self.assertEqual([9, 10, 11, 12, -1], receivers[[8, 9, 10, 11, 12]].tolist())
+
+    def test_river_flow_leaves_depressions(self):
+        elevation = numpy.array([[9.0, 9.0, 9.0, 9.0, 9.0, 9.0, 9.0],
+                                 [9.0, 3.0, 2.0, 4.0, 1.0, 0.0, 9.0],
+                                 [9.0, 9.0, 9.0, 9.0, 9.0, 9.0, 9.0]])
+        w = self._world(elevation)
+        w.ocean = elevation < 0.5
+        depressions = _priority_flood(elevation, w.ocean)
+
+        simulation = ErosionSimulation(fill_depressions=True)
+        path = simulation.river_flow([1, 1], w, [], [], depressions=depressions)
+        self.assertEqual([[1, 1], [2, 1], [3, 1], [4, 1], [5, 1]], path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,8 @@ from tests.draw_test import TestBase
 
 from worldengine.plates import Step, center_land, world_gen
 from worldengine.model.world import World, Size, GenerationParameters
-from worldengine.generation import sea_depth
-from worldengine.common import anti_alias
+from worldengine.generation import fill_ocean, flood_level, sea_depth, reclassify_world
+from worldengine.common import anti_alias, _equal
 
 
 class TestGeneration(TestBase):
@@ -16,6 +16,44 @@ class TestGeneration(TestBase):
         # Very stupid test that just verify nothing explode badly
         world_gen("Dummy", 32, 16, 1, step=Step.get_by_name("full"))
 
+    def test_reclassify_world(self):
+        temps = [.9, .8, .6, .45, .3, .1]
+        humids = [.95, .8, .5, .25, 0.07, .01, .001]
+        numpy.random.seed(3)
+        expected = world_gen("Dummy", 48, 32, 3, temps=temps, humids=humids,
+                             step=Step.get_by_name("full"))
+        numpy.random.seed(3)
+        w = world_gen("Dummy", 48, 32, 3, step=Step.get_by_name("full"))
+
+        reclassify_world(w, temps, humids)
+        for layer in ['temperature', 'humidity', 'biome', 'icecap']:
+            self.assertEqual(expected.layers[layer], w.layers[layer])
+
+    def test_reclassify_world_keeps_missing_values(self):
+        temps = [.9, .8, .6, .45, .3, .1]
+        humids = [.95, .8, .5, .25, 0.07, .01, .001]
+        numpy.random.seed(3)
+        expected = world_gen("Dummy", 48, 32, 3, temps=temps, humids=humids,
+                             step=Step.get_by_name("full"))
+        numpy.random.seed(3)
+        w = world_gen("Dummy", 48, 32, 3, humids=humids, step=Step.get_by_name("full"))
+        # the world file stores neither the temps nor the humids
+        w = World.protobuf_unserialize(w.protobuf_serialize())
+
+        reclassify_world(w, temps)
+        for layer in ['temperature', 'humidity', 'biome', 'icecap']:
+            self.assertEqual(expected.layers[layer], w.layers[layer])
+
+        # new humidity values, the same share of the land in each humidity band
+        humidity = w.layers['humidity']
+        ocean = w.layers['ocean'].data
+        before = [(humidity.data[~ocean] > humidity.quantiles[q]).mean() for q in ['87', '50', '12']]
+        reclassify_world(w, gamma_curve=1.5)
+        self.assertFalse(_equal(humidity.data, w.layers['humidity'].data))
+        humidity = w.layers['humidity']
+        after = [(humidity.data[~ocean] > humidity.quantiles[q]).mean() for q in ['87', '50', '12']]
+        self.assertTrue(numpy.allclose(before, after, atol=0.01), "%s %s" % (before, after))
+
     @staticmethod
     def _mean_elevation_at_borders(world):
         borders_total_elevation = 0.0
@@ -29,6 +67,21 @@ class TestGeneration(TestBase):
         n_cells_on_border = world.width * 2 + world.height * 2 - 4
         return borders_total_elevation / n_cells_on_border
 
+    def test_lakes_on_eroded_elevation(self):
+        numpy.random.seed(5)
+        w = world_gen("Dummy", 80, 80, 5, step=Step.get_by_name("full"),
+                      fill_depressions=True)
+        elevation = w.layers['elevation'].data
+        ocean = w.layers['ocean'].data
+        lake = w.lakemap > 0
+        surface = elevation + w.lakemap
+
+        # the rivers have not cut the shore of the lakes below their surface
+        for shift in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            shore = ~numpy.roll(ocean | lake, shift, axis=(0, 1))
+            below = numpy.roll(elevation, shift, axis=(0, 1)) < surface
+            self.assertFalse((lake & shore & below).any())
+
     def test_center_land(self):
         w = World.open_protobuf("%s/seed_28070.world" % self.tests_data_dir)
 
@@ -38,6 +91,30 @@ class TestGeneration(TestBase):
         el_after = TestGeneration._mean_elevation_at_borders(w)
         self.assertTrue(el_after <= el_before)
 
+    def test_fill_ocean(self):
+        elevation = numpy.array([[0.0, 2.0, 2.0, 2.0, 2.0],
+                                 [2.0, 0.5, 2.0, 0.0, 2.0],
+                                 [2.0, 2.0, 2.0, 2.0, 2.0],
+                                 [2.0, 2.0, 2.0, 1.0, 0.0]])
+        ocean, labels = fill_ocean(elevation, 1.0, return_labels=True)
+
+        # the pit at (1, 1) touches the border diagonally, the one at (3, 1) does not
+        expected_ocean = numpy.zeros(elevation.shape, dtype=bool)
+        expected_ocean[0, 0] = expected_ocean[1, 1] = True
+        expected_ocean[3, 3] = expected_ocean[3, 4] = True
+        self.assertTrue(numpy.array_equal(expected_ocean, ocean))
+        self.assertTrue(numpy.array_equal(expected_ocean, fill_ocean(elevation, 1.0)))
+
+        lakes = numpy.logical_and(labels > 0, numpy.logical_not(ocean))
+        self.assertEqual([(1, 3)], list(zip(*numpy.nonzero(lakes))))
+
+    def test_flood_level(self):
+        elevation = numpy.random.RandomState(0).rand(30, 40) * 10.0
+        level = flood_level(elevation)
+        for sea_level in (1.0, 3.0, 5.0, 7.0):
+            self.assertTrue(numpy.array_equal(fill_ocean(elevation, sea_level),
+                                              level <= sea_level))
+
     def test_sea_depth(self):
         ocean_level = 1.0
         extent = 11
@@ -85,6 +162,37 @@ class TestGeneration(TestBase):
             for x in range(extent):
                 self.assertAlmostEqual(desired_result[y, x], result[y, x])
 
+    def test_sea_depth_max_radius(self):
+        extent = 21
+        w = World("sea_depth", Size(extent, extent), 0, GenerationParameters(0, 1.0, 0), None)
+        ocean = numpy.full([extent, extent], True)
+        ocean[10, 10] = False
+        elevation = numpy.zeros([extent, extent], float)
+        elevation[10, 10] = 2.0
+        w.elevation = (elevation, None)
+        w.ocean = ocean
+
+        self.assertRaises(ValueError, sea_depth, w, 1.0, 3, [0.0, 0.5])
+
+        # with more factors than cells on the way to the border nothing is left
+        # unscaled and the depth keeps growing towards the borders
+        result = sea_depth(w, 1.0, max_radius=10, factors=numpy.linspace(0.0, 0.9, 10))
+        self.assertTrue(result[10, 10] < result[10, 5] < result[10, 0])
+        self.assertTrue(result[10, 10] < result[5, 5] < result[0, 0])
+
+    def test_sea_depth_without_land(self):
+        extent = 8
+        w = World("sea_depth", Size(extent, extent), 0, GenerationParameters(0, 1.0, 0), None)
+        w.ocean = numpy.full([extent, extent], True)
+        w.elevation = (numpy.arange(extent * extent, dtype=float).reshape(extent, extent), None)
+
+        # no cell is near land, whatever the radius: the depths are not scaled
+        max_radius = 2 * extent
+        expected = anti_alias(1.0 - w.elevation, 10)
+        expected = (expected - expected.min()) / (expected.max() - expected.min())
+        result = sea_depth(w, 1.0, max_radius, [0.0] * max_radius)
+        self.assertTrue(numpy.allclose(expected, result))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+
+from worldengine.astar import _dijkstra
+from worldengine.hpa import AbstractGraph
+
+
+class TestHpa(unittest.TestCase):
+
+    def _check_path(self, source, destination, path):
+        self.assertEqual(destination, path[-1])
+        previous = source
+        for cell in path:
+            self.assertEqual(1, abs(cell[0] - previous[0]) + abs(cell[1] - previous[1]))
+            previous = cell
+
+    def test_find(self):
+        height_map = numpy.ones((20, 30))
+        height_map[10, :] = 50.0
+        height_map[10, 18] = 1.0
+        graph = AbstractGraph.build(height_map, 8)
+
+        path = graph.find([0, 0], [29, 19])
+        self._check_path([0, 0], [29, 19], path)
+        self.assertTrue([18, 10] in path)  # through the gap in the wall
+        self.assertEqual(48, len(path))  # the cheapest path is found
+        self.assertTrue(all(type(c) is int for cell in path for c in cell))
+
+        # inside a single cluster
+        path = graph.find([1, 1], [3, 2])
+        self._check_path([1, 1], [3, 2], path)
+        self.assertEqual(3, len(path))
+
+        self.assertEqual([], graph.find([4, 4], [4, 4]))
+
+    def test_random_maps(self):
+        rng = numpy.random.RandomState(0)
+        for _ in range(20):
+            height, width = rng.randint(2, 40, 2)
+            height_map = rng.uniform(0.1, 3.0, (height, width))
+            graph = AbstractGraph.build(height_map, rng.randint(2, 10))
+            source = [rng.randint(width), rng.randint(height)]
+            destination = [rng.randint(width), rng.randint(height)]
+            if source == destination:
+                continue
+            path = graph.find(source, destination)
+            self._check_path(source, destination, path)
+
+            # never cheaper than the cheapest path
+            cost = height_map[source[1], source[0]] + sum(height_map[y, x] for x, y in path)
+            cheapest, _ = _dijkstra(height_map.ravel(), width, height,
+                                    [source[1] * width + source[0]])
+            self.assertTrue(cost >= cheapest[destination[1] * width + destination[0]] - 1e-9)
+
+    def test_save_and_load(self):
+        height_map = numpy.random.RandomState(1).uniform(0.0, 1.0, (17, 23))
+        graph = AbstractGraph.build(height_map, 5)
+        filename = os.path.join(tempfile.mkdtemp(), 'graph_paths.npz')
+        graph.save(filename)
+
+        loaded = AbstractGraph.load(filename, height_map)
+        self.assertEqual(5, loaded.cluster_size)
+        self.assertTrue(numpy.array_equal(graph.nodes, loaded.nodes))
+        self.assertTrue(numpy.array_equal(graph.edges, loaded.edges))
+        self.assertTrue(numpy.array_equal(graph.costs, loaded.costs))
+        self.assertEqual(graph.find([0, 0], [22, 16]), loaded.find([0, 0], [22, 16]))
+
+        self.assertRaises(Exception, AbstractGraph.load, filename, height_map[:10])
+        # a map of the same shape with other values
+        other = height_map.copy()
+        other[8, 11] += 1.0
+        self.assertRaises(Exception, AbstractGraph.load, filename, other)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import numpy
+from noise import snoise2
+
+from worldengine.noise_field import noise_field, snoise2_array
+
+
+class TestNoiseField(unittest.TestCase):
+
+    def test_snoise2_array_matches_snoise2(self):
+        rng = numpy.random.RandomState(0)
+        x = rng.uniform(-50.0, 50.0, 500)
+        y = rng.uniform(-50.0, 50.0, 500)
+        for octaves in (1, 6):
+            for base in (0, 1234):
+                expected = [snoise2(xi, yi, octaves, base=base) for xi, yi in zip(x, y)]
+                result = snoise2_array(x, y, octaves, base=base)
+                self.assertTrue(numpy.array_equal(numpy.array(expected), result))
+
+    def test_noise_field_with_border(self):
+        width, height = 40, 20
+        octaves = 8
+        freq = 16.0 * octaves
+        n_scale = 1024 / float(height)
+        border = width / 4
+        base = 42
+
+        expected = numpy.zeros((height, width))
+        for y in range(height):
+            for x in range(width):
+                n = snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves, base=base)
+                if x <= border:
+                    n = (n * x / border) + \
+                        (snoise2(((x * n_scale) + width) / freq, (y * n_scale) / freq,
+                                 octaves, base=base) * (border - x) / border)
+                expected[y, x] = n
+
+        result = noise_field(width, height, freq, octaves, base, scale=n_scale,
+                             border=border, border_inclusive=True)
+        self.assertTrue(numpy.array_equal(expected, result))
+
+        band = noise_field(width, height, freq, octaves, base, scale=n_scale,
+                           border=border, border_inclusive=True, rows=(5, 12))
+        self.assertTrue(numpy.array_equal(expected[5:12], band))
+
+    def test_workers_give_identical_output(self):
+        serial = noise_field(50, 33, 384.0, 6, 99, scale=1024 / 33.0, border=12.5)
+        parallel = noise_field(50, 33, 384.0, 6, 99, scale=1024 / 33.0, border=12.5,
+                               workers=3)
+        self.assertTrue(numpy.array_equal(serial, parallel))
+
+    def test_inexact_mode_is_close(self):
+        exact = noise_field(30, 30, 64.0, 6, 7)
+        inexact = noise_field(30, 30, 64.0, 6, 7, exact=False)
+        self.assertTrue(numpy.allclose(exact, inexact, atol=1e-4))
+
+
+if __name__ == '__main__':
+    unittest.main()
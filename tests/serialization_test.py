@@ -2,7 +2,7 @@ import unittest
 import tempfile
 import os
 
-from worldengine.plates import Step, world_gen
+from worldengine.plates import Step, world_gen, world_gen_ocean_levels
 from worldengine.model.world import World
 from worldengine.common import _equal
 from worldengine.hdf5_serialization import save_world_to_hdf5, load_world_to_hdf5
@@ -32,6 +32,13 @@ class TestSerialization(unittest.TestCase):
         self.assertEqual(sorted(dir(w)),            sorted(dir(unserialized)))
         self.assertEqual(w, unserialized)
 
+    def test_protobuf_flood_level(self):
+        w = next(world_gen_ocean_levels("Dummy", 32, 16, 1, [1.0],
+                                        step=Step.get_by_name("plates")))
+        self.assertTrue(w.has_flood_level())
+        unserialized = World.protobuf_unserialize(w.protobuf_serialize())
+        self.assertEqual(w.layers['flood_level'], unserialized.layers['flood_level'])
+
     def test_hdf5_serialize_unserialize(self):
         filename = None
         try:
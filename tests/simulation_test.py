@@ -1,8 +1,12 @@
+import sys
 import unittest
 
 import numpy
 
+from worldengine.simulations.basic import find_threshold_f, find_thresholds
 from worldengine.simulations.hydrology import WatermapSimulation
+from worldengine.simulations.irrigation import IrrigationSimulation
+from worldengine.simulations.icecap import IcecapSimulation
 from worldengine.model.world import World, Size, GenerationParameters
 
 class TestSimulation(unittest.TestCase):
@@ -62,6 +66,83 @@ class TestSimulation(unittest.TestCase):
 
         WatermapSimulation._watermap(w, 200)
 
+    def test_watermap_long_flow(self):
+        # a slope going down to the east over many more cells than the
+        # recursion limit: the water flows all the way to the last cell
+        size = Size(3000, 1)
+        elevation = numpy.fromfunction(lambda y, x: 3000.0 - x, (1, size.width))
+        w = World("watermap", size, 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = numpy.zeros((1, size.width), dtype=bool)
+        w.precipitation = (numpy.ones((1, size.width)), numpy.zeros(5))
+        w.elevation = (elevation, numpy.zeros(5))
+
+        numpy.random.seed(3)
+        start = w.random_land(1)[0]
+        numpy.random.seed(3)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(200)
+        try:
+            data, _ = WatermapSimulation._watermap(w, 1)
+        finally:
+            sys.setrecursionlimit(limit)
+
+        # every cell passes the water on, the last one also keeps it
+        expected = numpy.where(numpy.arange(size.width) > start, 1.0, 0.0)
+        expected[-1] = 2.0
+        self.assertTrue(size.width - start > 200)
+        self.assertTrue(numpy.array_equal(expected, data[0]))
+
+    def test_watermap_flow(self):
+        # a slope going down to the east, ocean on the last column
+        size = Size(40, 3)
+        elevation = numpy.fromfunction(lambda y, x: 40.0 - x, (size.height, size.width))
+        w = World("watermap", size, 0, GenerationParameters(0, 1.0, 0))
+        ocean = numpy.zeros((size.height, size.width), dtype=bool)
+        ocean[:, -1] = True
+        w.ocean = ocean
+        w.precipitation = (numpy.ones((size.height, size.width)), numpy.zeros(5))
+        w.elevation = (elevation, numpy.zeros(5))
+
+        state = numpy.random.get_state()
+        data, thresholds = WatermapSimulation._flow_watermap(w)
+        self.assertTrue(numpy.array_equal(state[1], numpy.random.get_state()[1]))
+        self.assertTrue(numpy.array_equal(data, WatermapSimulation._flow_watermap(w)[0]))
+
+        # the water grows going down the slope and never reaches the ocean
+        self.assertTrue((numpy.diff(data[:, :-1], axis=1) > 0).all())
+        self.assertTrue((data[:, -1] == 0).all())
+        self.assertAlmostEqual(3 * (size.width - 1), data[:, -2].sum())
+        self.assertEqual(['creek', 'main river', 'river'], sorted(thresholds))
+
+        self.assertRaises(ValueError, WatermapSimulation, 'rain')
+
+    def test_watermap_adaptive(self):
+        size = Size(60, 50)
+        elevation = numpy.fromfunction(lambda y, x: 60.0 - x + (y % 7), (size.height, size.width))
+        w = World("watermap", size, 0, GenerationParameters(0, 1.0, 0))
+        ocean = numpy.zeros((size.height, size.width), dtype=bool)
+        ocean[:, -1] = True
+        w.ocean = ocean
+        w.precipitation = (numpy.ones((size.height, size.width)), numpy.zeros(5))
+        w.elevation = (elevation, numpy.zeros(5))
+
+        numpy.random.seed(7)
+        data, thresholds, curve = WatermapSimulation._adaptive_watermap(w, 0.05)
+        # batches of 500 droplets, at most one droplet per land cell
+        droplets = [used for used, _ in curve]
+        self.assertEqual(list(range(500, 500 * len(curve), 500)), droplets[:-1])
+        self.assertTrue(droplets[-1] <= 59 * 50)
+        self.assertTrue(droplets[-1] == 59 * 50 or curve[-1][1] < 0.05)
+        # only full batches are compared
+        self.assertEqual(None, curve[0][1])
+        if droplets[-1] - droplets[-2] < 500:
+            self.assertEqual(None, curve[-1][1])
+        self.assertEqual(['creek', 'main river', 'river'], sorted(thresholds))
+
+        # the same droplets as the default method, scaled to 20000 of them
+        numpy.random.seed(7)
+        expected, _ = WatermapSimulation._watermap(w, droplets[-1])
+        self.assertTrue(numpy.allclose(expected * 20000.0 / droplets[-1], data))
 
     def test_random_land_returns_only_land(self):
         size = Size(100, 90)
@@ -77,7 +158,156 @@ class TestSimulation(unittest.TestCase):
 
         for i in range(0, num_samples*2, 2):
             self.assertFalse(ocean[land_indices[i+1], land_indices[i]])
-        
+
+    def test_random_land_rng(self):
+        size = Size(30, 20)
+        ocean = numpy.fromfunction(lambda y, x: y >= x, (size.height, size.width))
+        w = World("random_land", size, 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = ocean
+
+        # the global RNG gives the same cells as one randint per cell did
+        land = numpy.transpose(numpy.nonzero(numpy.invert(ocean)))
+        numpy.random.seed(11)
+        expected = []
+        for _ in range(50):
+            y, x = land[numpy.random.randint(0, len(land))]
+            expected += [x, y]
+        numpy.random.seed(11)
+        self.assertEqual(expected, w.random_land(50).tolist())
+
+        # an explicit generator leaves the global RNG alone
+        state = numpy.random.get_state()
+        first = w.random_land(50, numpy.random.default_rng(3))
+        self.assertTrue(numpy.array_equal(state[1], numpy.random.get_state()[1]))
+        self.assertEqual(first.tolist(), w.random_land(50, numpy.random.default_rng(3)).tolist())
+
+        # the land cells are found again when the ocean changes
+        w.ocean = numpy.ones((size.height, size.width), dtype=bool)
+        self.assertEqual((None, None), w.random_land(5))
+
+    def test_class_layers(self):
+        rng = numpy.random.RandomState(5)
+        size = Size(20, 15)
+        w = World("classes", size, 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = rng.uniform(size=(size.height, size.width)) < 0.3
+        w.elevation = (rng.uniform(0, 10, (size.height, size.width)),
+                       [('sea', 1.0), ('plain', 2.0), ('hill', 3.0), ('mountain', None)])
+        temperature = rng.uniform(size=(size.height, size.width))
+        w.temperature = (temperature, [('polar', 0.1), ('alpine', 0.2), ('boreal', 0.4), ('cool', 0.5),
+                                       ('warm', 0.6), ('subtropical', 0.8), ('tropical', None)])
+
+        self.assertTrue(w.elevation_band() is w.elevation_band())
+        for y in range(size.height):
+            for x in range(size.width):
+                e = w.elevation[y, x]
+                land = not w.ocean[y, x]
+                self.assertEqual(land and 2.0 < e < 3.0, w.is_hill((x, y)))
+                self.assertEqual(land and e > 3.0, w.is_mountain((x, y)))
+                self.assertEqual(land and 3.0 < e < 5.0, w.is_low_mountain((x, y)))
+                self.assertEqual(land and e > 7.0, w.is_high_mountain((x, y)))
+                self.assertEqual(max(e - 3.0, 0), w.level_of_mountain((x, y)))
+                t = temperature[y, x]
+                self.assertEqual(0.2 <= t < 0.4, w.is_temperature_boreal((x, y)))
+                self.assertEqual(t >= 0.8, w.is_temperature_tropical((x, y)))
+
+        # the classes are found again when a layer is set or changed
+        w.ocean = numpy.ones((size.height, size.width), dtype=bool)
+        self.assertFalse(w.is_mountain((0, 0)) or w.elevation_band().any())
+        w.temperature = (temperature + 1.0, w.layers['temperature'].thresholds)
+        self.assertTrue((w.temperature_class() == 6).all())
+        w.layers['temperature'].thresholds = [('polar', 5.0)] + w.layers['temperature'].thresholds[1:]
+        w.layer_changed('temperature')
+        self.assertTrue((w.temperature_class() == 0).all())
+
+    def test_irrigation(self):
+        rng = numpy.random.RandomState(2)
+        size = Size(23, 17)
+        w = World("irrigation", size, 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = rng.uniform(size=(size.height, size.width)) < 0.3
+        w.watermap = (rng.uniform(0, 5, (size.height, size.width)), {})
+
+        for radius in (3, 10, 30):
+            # every ocean cell gives its water / (ln(distance + 1) + 1) to
+            # the cells at most radius cells away on both axes
+            expected = numpy.zeros((size.height, size.width))
+            for y, x in numpy.transpose(numpy.nonzero(w.ocean)):
+                for ty in range(max(y - radius, 0), min(y + radius + 1, size.height)):
+                    for tx in range(max(x - radius, 0), min(x + radius + 1, size.width)):
+                        distance = numpy.sqrt((tx - x) ** 2 + (ty - y) ** 2)
+                        expected[ty, tx] += w.watermap[y, x] / (numpy.log1p(distance) + 1)
+            values = IrrigationSimulation._calculate(w, radius)
+            self.assertTrue(numpy.allclose(expected, values))
+
+        w.watermap = (numpy.where(w.ocean, 0.0, 1.0), {})
+        self.assertTrue((IrrigationSimulation._calculate(w) == 0).all())
+
+    def _icecap_world(self):
+        rng = numpy.random.RandomState(4)
+        size = Size(45, 30)
+        w = World("icecap", size, 0, GenerationParameters(0, 1.0, 0))
+        w.ocean = rng.uniform(size=(size.height, size.width)) < 0.7
+        w.temperature = (rng.uniform(size=(size.height, size.width)),
+                         [('polar', 0.4), ('alpine', 0.5), ('boreal', 0.6), ('cool', 0.7),
+                          ('warm', 0.8), ('subtropical', 0.9), ('tropical', None)])
+        return w
+
+    def test_icecap_raster(self):
+        # the tiles visited one by one, as IcecapSimulation used to do
+        w = self._icecap_world()
+        temperature = w.layers['temperature'].data
+        temp_min = temperature.min()
+        freeze_threshold = (0.4 - temp_min) * 0.6
+        freeze_chance_threshold = freeze_threshold * 0.8
+        solid_map = numpy.logical_or(temperature <= freeze_chance_threshold + temp_min,
+                                     numpy.logical_not(w.ocean))
+        expected = numpy.zeros(temperature.shape)
+        rng = numpy.random.RandomState(9)
+        for y in range(w.height):
+            for x in range(w.width):
+                t = temperature[y, x]
+                if w.ocean[y, x] and t - temp_min < freeze_threshold:
+                    chance = numpy.interp(t, [temp_min, freeze_chance_threshold, freeze_threshold],
+                                          [1.0, 1.0, 0.0])
+                    if 0 < x < w.width - 1 and 0 < y < w.height - 1:
+                        count = solid_map[y-1:y+2, x-1:x+2].sum() - solid_map[y, x]
+                        chance += numpy.interp(count, [0, 8], [-1.0, 1.0]) * 0.5
+                    if rng.rand() <= chance:
+                        solid_map[y, x] = True
+                        expected[y, x] = freeze_threshold - (t - temp_min)
+
+        icecap = IcecapSimulation._calculate(w, 9)
+        self.assertTrue(expected.any())
+        self.assertTrue(numpy.array_equal(expected, icecap))
+
+    def test_icecap_checkerboard(self):
+        w = self._icecap_world()
+        raster = IcecapSimulation._calculate(w, 9)
+        icecap = IcecapSimulation._calculate(w, 9, 'checkerboard')
+        self.assertTrue(numpy.array_equal(icecap, IcecapSimulation._calculate(w, 9, 'checkerboard')))
+        # the same tiles can freeze, with the same thickness
+        self.assertFalse(icecap[numpy.logical_not(w.ocean)].any())
+        both = numpy.logical_and(icecap > 0, raster > 0)
+        self.assertTrue(numpy.array_equal(icecap[both], raster[both]))
+        self.assertTrue(abs(numpy.count_nonzero(icecap) - numpy.count_nonzero(raster)) <
+                        0.1 * numpy.count_nonzero(raster))
+
+        self.assertRaises(ValueError, IcecapSimulation, 'spiral')
+
+    def test_find_thresholds(self):
+        rng = numpy.random.RandomState(0)
+        data = rng.normal(0.0, 2.0, (50, 60))
+        ocean = rng.uniform(size=(50, 60)) < 0.3
+        percentages = [0.75, 0.3, 0.1, 0.03]
+
+        thresholds = find_thresholds(data, percentages, ocean)
+        for perc, th in zip(percentages, thresholds):
+            self.assertEqual(find_threshold_f(data, perc, ocean), th)
+
+        land = data[numpy.logical_not(ocean)]
+        thresholds = find_thresholds(data, percentages, ocean, exact=False)
+        for perc, th in zip(percentages, thresholds):
+            self.assertEqual(int(round(land.size * perc)), (land > th).sum())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -10,13 +10,20 @@ between the two with the lowest cost.
 This is perfect for height maps for example, because you can use it to
 find path through mountain/hills between villages.
 
-usage: You can use the PathFinder.find(height_map, source, destination)
+usage: You can use the PathFinder().find(height_map, source, destination)
 where height_map is any 2D array while source and destination are both
-lists of two values [x, y].
+lists of two values [x, y]. The PathFinder can be given a node budget, a
+weight for the heuristic, and can search from both ends or use landmarks
+for its estimates.
 
 author:  Bret Curtis
 """
 
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
 
 class Path:
     """ A path object, containing the nodes and total cost."""
@@ -47,91 +54,318 @@ class Node:
             return 0
 
 
+def _neighbours(lid, width, height):
+    """The location ids of the cells east, west, south and north of lid"""
+    x, y = lid % width, lid // width
+    result = []
+    if x + 1 < width:
+        result.append(lid + 1)
+    if x > 0:
+        result.append(lid - 1)
+    if y + 1 < height:
+        result.append(lid + width)
+    if y > 0:
+        result.append(lid - width)
+    return result
+
+
+def _dijkstra(map_data, width, height, sources):
+    """
+    The cost of the cheapest path from any of the sources to every cell,
+    counting the map value of every cell on the path (the source included,
+    as the A* does), and the cell preceding each cell on that path (-1 for
+    the sources and the cells which cannot be reached).
+    """
+    size = width * height
+    cost = numpy.full(size, numpy.inf)
+    predecessor = numpy.full(size, -1, dtype=numpy.int64)
+    m = map_data.tolist() if isinstance(map_data, numpy.ndarray) else map_data
+    best = cost.tolist()
+    done = bytearray(size)
+
+    queue = []
+    for lid in sources:
+        best[lid] = m[lid]
+        queue.append((m[lid], lid))
+    heapq.heapify(queue)
+
+    while queue:
+        lid_cost, lid = heapq.heappop(queue)
+        if done[lid]:
+            continue
+        done[lid] = 1
+        for n_lid in _neighbours(lid, width, height):
+            n_cost = m[n_lid] + lid_cost
+            if n_cost < best[n_lid]:
+                best[n_lid] = n_cost
+                predecessor[n_lid] = lid
+                heapq.heappush(queue, (n_cost, n_lid))
+
+    cost[:] = best
+    return cost, predecessor
+
+
+class Landmarks:
+    """
+    Lower bounds on the cost between two cells, from the cost of reaching
+    them from a few landmark cells ("ALT" heuristic). As the cost of a path
+    is the sum of the map values of its cells it does not depend on the
+    direction, and for every landmark L
+
+        cost(u, t) >= |cost(L, t) - cost(L, u)| - a map value
+
+    The landmarks are chosen one after the other as the reachable cell
+    farthest from those already chosen, starting from the one farthest from
+    the first cell. They are only valid while the map data does not change.
+    """
+
+    def __init__(self, map_data, width, height, count=4):
+        self.m = numpy.asarray(map_data, dtype=float)
+        self.w = width
+        self.h = height
+        self.landmarks = []
+        distances = []
+
+        closest, _ = _dijkstra(self.m, width, height, [0])
+        for _ in range(count):
+            reachable = numpy.isfinite(closest)
+            landmark = int(numpy.argmax(numpy.where(reachable, closest, -1)))
+            if landmark in self.landmarks:
+                break
+            cost, _ = _dijkstra(self.m, width, height, [landmark])
+            self.landmarks.append(landmark)
+            distances.append(cost)
+            closest = numpy.minimum(closest, cost) if len(distances) > 1 else cost
+        self.distances = numpy.array(distances)
+
+    def estimates(self, target):
+        """
+        For every cell a lower bound on the cost still to pay to reach
+        target from it, i.e. the cost of the path without the cell itself.
+        """
+        to_target = self.distances[:, target:target + 1]
+        forward = to_target - self.distances
+        backward = self.distances - to_target + (self.m[target] - self.m)
+        bounds = numpy.maximum(forward, backward).max(axis=0)
+        # cells not connected to the target or to the landmarks
+        bounds[~numpy.isfinite(bounds)] = 0.0
+        return numpy.maximum(bounds, 0.0)
+
+
 class AStar:
     """ The "A* Star Search Algorithm" itself.
 
     Have a read:
     https://en.wikipedia.org/wiki/A*_search_algorithm
+
+    The open set is a heap ordered by score; among nodes with the same score
+    the one added (or improved) last is expanded first. The state and the
+    cost of every location are kept in arrays indexed by the location id, so
+    no objects are created until the path is found.
+
+    The score of a node is its cost plus weight times the estimate of the
+    cost still to pay: the Manhattan distance to the destination, or the
+    lower bound given by landmarks if they are passed. The search gives up
+    once more than max_nodes nodes have been expanded.
+
+    With the Manhattan distance the search stops as soon as the destination
+    is reached from one of its neighbours, as it always did. With landmarks
+    it stops when the destination is taken from the open set, so that the
+    path found is a cheapest one (for a weight of 1).
     """
-    def __init__(self, map_handler):
-        self.mh = map_handler
-        self.o = []
-        self.on = []
-        self.c = []
-
-    def _get_best_open_node(self):
-        best_node = None
-        for n in self.on:
-            if not best_node:
-                best_node = n
-            else:
-                if n.score <= best_node.score:
-                    best_node = n
-        return best_node
 
-    @staticmethod
-    def _trace_path(n):
-        nodes = []
-        total_cost = n.mCost
-        p = n.parent
-        nodes.insert(0, n)
+    # states of a location
+    UNSEEN = 0
+    OPEN = 1
+    CLOSED = 2
 
-        while 1:
-            if p.parent is None:
-                break
+    def __init__(self, map_handler, max_nodes=10000, weight=1.0, landmarks=None):
+        self.mh = map_handler
+        self.max_nodes = max_nodes
+        self.weight = weight
+        self.landmarks = landmarks
 
-            nodes.insert(0, p)
-            p = p.parent
-
-        return Path(nodes, total_cost)
-
-    def _handle_node(self, node, end):
-        i = self.o.index(node.lid)
-        self.on.pop(i)
-        self.o.pop(i)
-        self.c.append(node.lid)
-
-        nodes = self.mh.get_adjacent_nodes(node, end)
-
-        for n in nodes:
-            if n.location == end:  # reached the destination
-                return n
-            elif n.lid in self.c:  # already in close, skip this
-                continue
-            elif n.lid in self.o:  # already in open, check if better score
-                i = self.o.index(n.lid)
-                on = self.on[i]
-                if n.mCost < on.mCost:
-                    self.on.pop(i)
-                    self.o.pop(i)
-                    self.on.append(n)
-                    self.o.append(n.lid)
-            else:  # new node, append to open list
-                self.on.append(n)
-                self.o.append(n.lid)
+    def _make_path(self, lids, start_cost):
+        """The path through the given locations, the start excluded"""
+        width = self.mh.w
+        nodes = []
+        node = None
+        cost = start_cost
+        for lid in lids:
+            lid = int(lid)
+            cost = self.mh.m[lid] + cost
+            node = Node(SQLocation(lid % width, lid // width), cost, lid, node)
+            nodes.append(node)
+        return Path(nodes, cost)
 
-        return None
+    @staticmethod
+    def _trace_back(lid, parent, stop):
+        """The locations from stop (excluded) to lid following parent"""
+        lids = []
+        while lid != stop:
+            lids.append(lid)
+            lid = parent[lid]
+        lids.reverse()
+        return lids
+
+    def _estimator(self, x, y):
+        """Function giving the estimate of the cost from a location to (x, y)"""
+        weight = self.weight
+        if self.landmarks is not None:
+            estimates = (weight * self.landmarks.estimates(y * self.mh.w + x)).tolist()
+            return lambda lid, nx, ny: estimates[lid]
+        return lambda lid, nx, ny: weight * (abs(nx - x) + abs(ny - y))
 
     def find_path(self, from_location, to_location):
-        end = to_location
+        m = self.mh.m
+        width, height = self.mh.w, self.mh.h
+        end_x, end_y = to_location.x, to_location.y
+        estimate = self._estimator(end_x, end_y)
+
         f_node = self.mh.get_node(from_location)
-        self.on.append(f_node)
-        self.o.append(f_node.lid)
-        next_node = f_node
+        # with landmarks the destination is only accepted once expanded
+        end_lid = (end_y * width) + end_x if self.landmarks is not None else None
 
-        counter = 0  # a bail-out counter
+        state = bytearray(width * height)
+        cost = numpy.empty(width * height)
+        parent = numpy.empty(width * height, dtype=numpy.int64)
+        # (score, -insertion counter, location id, cost)
+        open_heap = []
+        counter = 0
 
-        while next_node is not None:
-            if counter > 10000:
+        lid = f_node.lid
+        cost[lid] = f_node.mCost
+        parent[lid] = -1
+
+        handled = 0  # a bail-out counter
+
+        while lid is not None:
+            if handled > self.max_nodes:
                 break  # no path found under limit
-            finish = self._handle_node(next_node, end)
-            if finish:
-                return self._trace_path(finish)
-            next_node = self._get_best_open_node()
-            counter += 1
+
+            state[lid] = AStar.CLOSED
+            x, y = lid % width, lid // width
+            lid_cost = cost[lid]
+
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if nx < 0 or nx >= width or ny < 0 or ny >= height:
+                    continue
+                n_lid = (ny * width) + nx
+                n_cost = m[n_lid] + lid_cost
+                # reached the destination (or came back to the source)
+                if nx == end_x and ny == end_y and (end_lid is None or n_lid == f_node.lid):
+                    return self._make_path(self._trace_back(lid, parent, f_node.lid) + [n_lid],
+                                           f_node.mCost)
+                n_state = state[n_lid]
+                if n_state == AStar.CLOSED:  # already closed, skip this
+                    continue
+                if n_state == AStar.OPEN and not n_cost < cost[n_lid]:
+                    continue  # already open with a better or equal cost
+                state[n_lid] = AStar.OPEN
+                cost[n_lid] = n_cost
+                parent[n_lid] = lid
+                score = n_cost + estimate(n_lid, nx, ny)
+                counter += 1
+                heapq.heappush(open_heap, (score, -counter, n_lid, n_cost))
+
+            # next best open node, skipping the entries which were improved
+            lid = None
+            while open_heap:
+                _, _, n_lid, n_cost = heapq.heappop(open_heap)
+                if state[n_lid] == AStar.OPEN and n_cost == cost[n_lid]:
+                    lid = n_lid
+                    break
+            if lid is not None and lid == end_lid:
+                return self._make_path(self._trace_back(lid, parent, f_node.lid), f_node.mCost)
+            handled += 1
 
         return None
 
+    def find_path_bidirectional(self, from_location, to_location):
+        """
+        Search from both ends at once, always expanding the side with fewer
+        open nodes, until the best path through a cell reached by both sides
+        costs no more than the best score left on either side. max_nodes
+        counts the nodes expanded by both searches.
+        """
+        if from_location == to_location:
+            return self.find_path(from_location, to_location)
+
+        m = self.mh.m
+        width, height = self.mh.w, self.mh.h
+        f_node = self.mh.get_node(from_location)
+        t_node = self.mh.get_node(to_location)
+        if f_node is None or t_node is None:
+            return None
+
+        size = width * height
+        # index 0: from the source, index 1: from the destination
+        ends = (f_node, t_node)
+        estimates = (self._estimator(t_node.location.x, t_node.location.y),
+                     self._estimator(f_node.location.x, f_node.location.y))
+        states = (bytearray(size), bytearray(size))
+        costs = (numpy.empty(size), numpy.empty(size))
+        parents = (numpy.empty(size, dtype=numpy.int64), numpy.empty(size, dtype=numpy.int64))
+        heaps = ([], [])
+        counter = 0
+        for side, node in enumerate(ends):
+            states[side][node.lid] = AStar.OPEN
+            costs[side][node.lid] = node.mCost
+            parents[side][node.lid] = -1
+            heaps[side].append((0, 0, node.lid, node.mCost))
+
+        best_cost = numpy.inf
+        meeting = None
+        handled = 0
+
+        while True:
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            state, cost, parent, heap = states[side], costs[side], parents[side], heaps[side]
+            other_state, other_cost = states[1 - side], costs[1 - side]
+            estimate = estimates[side]
+
+            lid = None
+            while heap:
+                score, _, n_lid, n_cost = heapq.heappop(heap)
+                if state[n_lid] == AStar.OPEN and n_cost == cost[n_lid]:
+                    lid = n_lid
+                    break
+            if lid is None or score >= best_cost:
+                break
+            if handled > self.max_nodes:
+                return None  # no path found under limit
+            handled += 1
+
+            state[lid] = AStar.CLOSED
+            lid_cost = cost[lid]
+            for n_lid in _neighbours(lid, width, height):
+                n_state = state[n_lid]
+                if n_state == AStar.CLOSED:
+                    continue
+                n_cost = m[n_lid] + lid_cost
+                if n_state != AStar.OPEN or n_cost < cost[n_lid]:
+                    state[n_lid] = AStar.OPEN
+                    cost[n_lid] = n_cost
+                    parent[n_lid] = lid
+                    score = n_cost + estimate(n_lid, n_lid % width, n_lid // width)
+                    counter += 1
+                    heapq.heappush(heap, (score, -counter, n_lid, n_cost))
+                if other_state[n_lid] != AStar.UNSEEN:
+                    # the value of the meeting cell is counted on both sides
+                    total = cost[n_lid] + other_cost[n_lid] - m[n_lid]
+                    if total < best_cost:
+                        best_cost = total
+                        meeting = n_lid
+
+        if meeting is None:
+            return None
+        lids = self._trace_back(meeting, parents[0], f_node.lid)
+        lid = meeting
+        while lid != t_node.lid:
+            lid = parents[1][lid]
+            lids.append(lid)
+        return self._make_path(lids, f_node.mCost)
+
 
 class SQLocation:
     """A simple Square Map Location implementation"""
@@ -200,24 +434,57 @@ class SQMapHandler:
 class PathFinder:
     """Using the a* algorithm we will try to find the best path between two
        points.
+
+       max_nodes is the number of nodes expanded before giving up, weight
+       multiplies the estimate of the remaining cost (values above 1 expand
+       fewer nodes for paths which may cost more). With bidirectional the
+       search runs from both ends at once. If landmarks is greater than 0
+       the estimates come from that many landmarks, computed the first time
+       a height map is searched and reused for as long as the same array
+       is passed (so its values should not change in between).
+
+       A PathFinder can be bound to a height map, to run many queries on it
+       with find_many and dijkstra.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, max_nodes=10000, weight=1.0, bidirectional=False, landmarks=0,
+                 height_map=None):
+        self.max_nodes = max_nodes
+        self.weight = weight
+        self.bidirectional = bidirectional
+        self.landmarks = landmarks
+        self._landmarks = None  # (height map, Landmarks)
+        self.height_map = height_map
+
+    def _landmarks_for(self, height_map, graph):
+        if not self.landmarks:
+            return None
+        if self._landmarks is None or self._landmarks[0] is not height_map:
+            height, width = height_map.shape
+            self._landmarks = (height_map, Landmarks(graph, width, height, self.landmarks))
+        return self._landmarks[1]
 
-    @staticmethod
-    def find(height_map, source, destination):
+    def _bound_map(self):
+        if self.height_map is None:
+            raise Exception("The PathFinder is not bound to a height map")
+        return self.height_map
+
+    def find(self, height_map, source, destination):
         sx, sy = source
         dx, dy = destination
         path = []
         height, width = height_map.shape
 
-        graph = height_map.flatten('C') #flatten array (row-major)
+        graph = height_map.ravel('C')  # row-major view, no copy unless needed
 
-        pathfinder = AStar(SQMapHandler(graph, width, height))
+        pathfinder = AStar(SQMapHandler(graph, width, height), self.max_nodes, self.weight,
+                           self._landmarks_for(height_map, graph))
         start = SQLocation(sx, sy)
         end = SQLocation(dx, dy)
-        p = pathfinder.find_path(start, end)
+        if self.bidirectional:
+            p = pathfinder.find_path_bidirectional(start, end)
+        else:
+            p = pathfinder.find_path(start, end)
 
         if not p:
             return path
@@ -226,3 +493,67 @@ class PathFinder:
             path.append([node.location.x, node.location.y])
 
         return path
+
+    def find_many(self, pairs, workers=1):
+        """
+        The paths between the (source, destination) pairs on the bound height
+        map, in the same order and format as find. workers > 1 spreads the
+        queries over that many processes.
+        """
+        height_map = self._bound_map()
+        pairs = [(list(source), list(destination)) for source, destination in pairs]
+        if workers <= 1 or len(pairs) <= 1:
+            return [self.find(height_map, source, destination)
+                    for source, destination in pairs]
+
+        # prepare the landmarks once instead of in every process
+        self._landmarks_for(height_map, height_map.ravel('C'))
+        bounds = numpy.linspace(0, len(pairs), min(workers, len(pairs)) + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_path_worker,
+                                 initargs=(self,)) as executor:
+            futures = [executor.submit(_find_paths, pairs[bounds[i]:bounds[i + 1]])
+                       for i in range(len(bounds) - 1)]
+            return [path for future in futures for path in future.result()]
+
+    def dijkstra(self, sources):
+        """
+        The cost of the cheapest path from any of the sources ([x, y] each)
+        to every cell of the bound height map, counted like the cost of the
+        paths of find (the map values of all the cells, the source included),
+        and the cell before each cell on that path, as a flat index (-1 for
+        the sources). Both are arrays with the shape of the height map.
+        """
+        height_map = self._bound_map()
+        height, width = height_map.shape
+        cost, predecessor = _dijkstra(height_map.ravel('C'), width, height,
+                                      [y * width + x for x, y in sources])
+        return cost.reshape(height, width), predecessor.reshape(height, width)
+
+    @staticmethod
+    def path_to(predecessor, destination):
+        """The path to destination in the predecessors given by dijkstra,
+        from the cell after the source, as returned by find (empty for the
+        sources and the cells which cannot be reached)"""
+        width = predecessor.shape[1]
+        predecessor = predecessor.ravel()
+        x, y = destination
+        lid = int(y * width + x)
+        path = []
+        while predecessor[lid] >= 0:
+            path.append([lid % width, lid // width])
+            lid = int(predecessor[lid])
+        path.reverse()
+        return path
+
+
+_path_finder = None  # the PathFinder of a worker process
+
+
+def _init_path_worker(path_finder):
+    global _path_finder
+    _path_finder = path_finder
+
+
+def _find_paths(pairs):
+    height_map = _path_finder.height_map
+    return [_path_finder.find(height_map, source, destination) for source, destination in pairs]
@@ -282,3 +282,12 @@ def biome_index_to_name(biome_index):
     if not 0 <= biome_index < len(names):
         raise Exception("Not found")
     return names[biome_index]
+
+
+def biome_index_names():
+    """
+    The names of the values of a biome layer: the index of a biome is the one
+    used for the serialization, and the one after the last biome is 'bare
+    rock', for the cells no biome was found for.
+    """
+    return sorted(_BiomeMetaclass.biomes.keys()) + ['bare rock']
@@ -9,9 +9,11 @@ from worldengine.draw import draw_ancientmap_on_file, draw_biome_on_file, draw_o
     draw_precipitation_on_file, draw_grayscale_heightmap_on_file, draw_simple_elevation_on_file, \
     draw_temperature_levels_on_file, draw_riversmap_on_file, draw_scatter_plot_on_file, \
     draw_satellite_on_file, draw_icecaps_on_file
+from worldengine.hpa import AbstractGraph
 from worldengine.imex import export
 from worldengine.model.world import World, Size, GenerationParameters
-from worldengine.plates import world_gen, generate_plates_simulation
+from worldengine.plates import world_gen, world_gen_ocean_levels, generate_plates_simulation
+from worldengine.simulations.hydrology import WatermapSimulation
 from worldengine.step import Step
 from worldengine.version import __version__
 
@@ -24,7 +26,7 @@ except:
 
 VERSION = __version__
 
-OPERATIONS = 'world|plates|ancient_map|info|export'
+OPERATIONS = 'world|plates|ancient_map|info|export|reclassify'
 SEA_COLORS = 'blue|brown'
 STEPS = 'plates|precipitations|full'
 
@@ -32,11 +34,40 @@ STEPS = 'plates|precipitations|full'
 def generate_world(world_name, width, height, seed, num_plates, output_dir,
                    step, ocean_level, temps, humids, world_format='protobuf',
                    gamma_curve=1.25, curve_offset=.2, fade_borders=True,
-                   verbose=True, black_and_white=False):
+                   verbose=True, black_and_white=False, workers=1, fill_depressions=False,
+                   watermap='droplets'):
     w = world_gen(world_name, width, height, seed, temps, humids, num_plates, ocean_level,
                   step, gamma_curve=gamma_curve, curve_offset=curve_offset,
-                  fade_borders=fade_borders, verbose=verbose)
+                  fade_borders=fade_borders, verbose=verbose, workers=workers,
+                  fill_depressions=fill_depressions, watermap=watermap)
+    save_world_and_images(w, world_name, output_dir, step, world_format, black_and_white)
+    return w
+
 
+def generate_worlds_for_ocean_levels(world_name, width, height, seed, num_plates,
+                                     output_dir, step, ocean_levels, temps, humids,
+                                     world_format='protobuf', gamma_curve=1.25,
+                                     curve_offset=.2, fade_borders=True, verbose=True,
+                                     black_and_white=False, workers=1,
+                                     fill_depressions=False, watermap='droplets'):
+    """
+    Generate and save one world per ocean level, running the plates simulation
+    and the flood fill only once. Yields (name, world) for every level.
+    """
+    worlds = world_gen_ocean_levels(world_name, width, height, seed, ocean_levels,
+                                    temps, humids, num_plates, step,
+                                    gamma_curve=gamma_curve, curve_offset=curve_offset,
+                                    fade_borders=fade_borders, verbose=verbose,
+                                    workers=workers, fill_depressions=fill_depressions,
+                                    watermap=watermap)
+    for ocean_level, w in zip(ocean_levels, worlds):
+        name = "%s_ocean_level_%s" % (world_name, ocean_level)
+        save_world_and_images(w, name, output_dir, step, world_format, black_and_white)
+        yield name, w
+
+
+def save_world_and_images(w, world_name, output_dir, step, world_format='protobuf',
+                          black_and_white=False):
     print('')  # empty line
     print('Producing ouput:')
     sys.stdout.flush()
@@ -75,7 +106,15 @@ def generate_world(world_name, width, height, seed, num_plates, output_dir,
     sea_level = w.sea_level()
     draw_simple_elevation_on_file(w, filename, sea_level=sea_level)
     print("* elevation image generated in '%s'" % filename)
-    return w
+
+
+def reclassify_world(world, world_name, output_dir, temps, humids, world_format='protobuf',
+                     gamma_curve=None, curve_offset=None, black_and_white=False, workers=1):
+    geo.reclassify_world(world, temps, humids, gamma_curve=gamma_curve,
+                         curve_offset=curve_offset, workers=workers)
+    save_world_and_images(world, world_name, output_dir, world.step, world_format,
+                          black_and_white)
+    return world
 
 
 def generate_grayscale_heightmap(world, filename):
@@ -103,6 +142,11 @@ def draw_icecaps_map(world, filename):
     print("+ icecap map generated in '%s'" % filename)
 
 
+def generate_path_graph(world, filename, cluster_size):
+    AbstractGraph.build(world.layers['elevation'].data, cluster_size).save(filename)
+    print("+ path finding graph generated in '%s'" % filename)
+
+
 def generate_plates(seed, world_name, output_dir, width, height,
                     num_plates=10):
     """
@@ -282,6 +326,10 @@ def main():
     parser.add_argument('--recursion_limit', dest='recursion_limit', type=int,
                         help="Set the recursion limit [default = %(default)s]",
                         metavar="N", default='2000')
+    parser.add_argument('--workers', dest='workers', type=int,
+                        help="N = number of processes used to evaluate the noise " +
+                             "layers [default = %(default)s]",
+                        metavar="N", default='1')
     parser.add_argument('-v', '--verbose', dest='verbose', action="store_true",
                         help="Enable verbose messages", default=False)
     parser.add_argument('--version', dest='version', action="store_true",
@@ -304,6 +352,11 @@ def main():
                             help='elevation cut off for sea level " +'
                                  '[default = %(default)s]',
                             metavar="N", default=1.0)
+    g_generate.add_argument('--ocean-levels', dest='ocean_levels',
+                            help="Generate one world for each of the given ocean levels, " +
+                                 "running the plates simulation only once. " +
+                                 "Overrides --ocean_level.",
+                            metavar="#/#/...")
     g_generate.add_argument('--temps', dest='temps',
                             help="Provide alternate ranges for temperatures. " +
                                  "If not provided, the default values will be used. \n" +
@@ -316,21 +369,38 @@ def main():
                             metavar="#/#/#/#/#/#/#")
     g_generate.add_argument('-gv', '--gamma-value', dest='gv', type=float,
                             help="N = Gamma value for temperature/precipitation " +
-                                 "gamma correction curve. [default = %(default)s]",
-                            metavar="N", default='1.25')
+                                 "gamma correction curve. [default = 1.25]",
+                            metavar="N")
     g_generate.add_argument('-go', '--gamma-offset', dest='go', type=float,
                             help="N = Adjustment value for temperature/precipitation " +
-                                 "gamma correction curve. [default = %(default)s]",
-                            metavar="N", default='.2')
+                                 "gamma correction curve. [default = .2]",
+                            metavar="N")
     g_generate.add_argument('--not-fade-borders', dest='fade_borders', action="store_false",
                             help="Not fade borders",
                             default=True)
+    g_generate.add_argument('--fill-depressions', dest='fill_depressions',
+                            action="store_true",
+                            help="Let rivers leave depressions through their spill point, " +
+                                 "found by filling the depressions of the map, " +
+                                 "and turn the depressions they cross into lakes")
+    g_generate.add_argument('--watermap', dest='watermap', choices=WatermapSimulation.METHODS,
+                            help="How the water flowing through every cell is found: " +
+                                 "from 20000 random droplets, from as many droplets " +
+                                 "as needed for the river thresholds to converge " +
+                                 "(adaptive) or by accumulating the flow of all the " +
+                                 "cells [default = %(default)s]",
+                            default='droplets')
     g_generate.add_argument('--scatter', dest='scatter_plot',
                             action="store_true", help="generate scatter plot")
     g_generate.add_argument('--sat', dest='satelite_map',
                             action="store_true", help="generate satellite map")
     g_generate.add_argument('--ice', dest='icecaps_map',
                             action="store_true", help="generate ice caps map")
+    g_generate.add_argument('--path-graph', dest='path_graph', type=int, nargs='?',
+                            const=32, default=None,
+                            help="store the graph for hierarchical path finding on the " +
+                                 "elevation, with clusters of N cells [default = 32]",
+                            metavar="N")
 
     # -----------------------------------------------------
     g_ancient_map = parser.add_argument_group(
@@ -419,7 +489,7 @@ def main():
     else:
         operation = args.OPERATOR.lower()
 
-    if args.OPERATOR == 'info' or args.OPERATOR == 'export':
+    if args.OPERATOR == 'info' or args.OPERATOR == 'export' or args.OPERATOR == 'reclassify':
         if args.FILE is None:
             parser.print_help()
             usage("For operation info only the filename should be specified")
@@ -450,6 +520,8 @@ def main():
         world_format = 'hdf5'
 
     generation_operation = (operation == 'world') or (operation == 'plates')
+    # reclassifying a world accepts the options for temperatures, humidities and gamma curve
+    climate_operation = generation_operation or (operation == 'reclassify')
 
     if args.grayscale_heightmap and not generation_operation:
         usage(
@@ -459,16 +531,28 @@ def main():
     if args.rivers_map and not generation_operation:
         usage(error="Rivers map can be produced only during world generation")
 
-    if args.temps and not generation_operation:
-        usage(error="temps can be assigned only during world generation")
+    if args.temps and not climate_operation:
+        usage(error="temps can be assigned only during world generation or reclassification")
 
     if args.temps and len(args.temps.split('/')) != 6:
         usage(error="temps must have exactly 6 values")
 
-    if args.go >= 1 or args.go < 0:
+    if args.workers < 1:
+        usage(error="Number of workers should be at least 1")
+    if args.path_graph is not None and args.path_graph < 2:
+        usage(error="Clusters of the path finding graph should be at least 2 cells wide")
+
+    # reclassify keeps the values of the world for the options not given
+    if operation != 'reclassify':
+        if args.gv is None:
+            args.gv = 1.25
+        if args.go is None:
+            args.go = .2
+
+    if args.go is not None and (args.go >= 1 or args.go < 0):
         usage(error="Gamma offset must be greater than or equal to 0 and less than 1")
 
-    if args.gv <= 0:
+    if args.gv is not None and args.gv <= 0:
         usage(error="Gamma value must be greater than 0")
 
     temps = [.874, .765, .594, .439, .366, .124]
@@ -477,8 +561,8 @@ def main():
         for x in range(0, len(temps)):
             temps[x] = 1 - float(temps[x])
 
-    if args.humids and not generation_operation:
-        usage(error="humidity can be assigned only during world generation")
+    if args.humids and not climate_operation:
+        usage(error="humidity can be assigned only during world generation or reclassification")
 
     if args.humids and len(args.humids.split('/')) != 7:
         usage(error="humidity must have exactly 7 values")
@@ -491,6 +575,15 @@ def main():
     if args.scatter_plot and not generation_operation:
         usage(error="Scatter plot can be produced only during world generation")
 
+    ocean_levels = None
+    if args.ocean_levels:
+        if operation != 'world':
+            usage(error="ocean levels can be assigned only during world generation")
+        try:
+            ocean_levels = [float(level) for level in args.ocean_levels.split('/')]
+        except ValueError:
+            usage(error="ocean levels must be numbers separated by '/'")
+
     print('Worldengine - a world generator (v. %s)' % VERSION)
     print('-----------------------')
     if generation_operation:
@@ -509,6 +602,15 @@ def main():
         print(' scatter plot         : %s' % args.scatter_plot)
         print(' satellite map        : %s' % args.satelite_map)
         print(' fade borders         : %s' % args.fade_borders)
+        print(' fill depressions     : %s' % args.fill_depressions)
+        print(' watermap             : %s' % args.watermap)
+        if args.path_graph:
+            print(' path graph clusters  : %i' % args.path_graph)
+        if ocean_levels:
+            print(' ocean levels         : %s' % args.ocean_levels)
+        else:
+            print(' ocean level          : %s' % args.ocean_level)
+        print(' workers              : %i' % args.workers)
         if args.temps:
             print(' temperature ranges   : %s' % args.temps)
         if args.humids:
@@ -551,27 +653,43 @@ def main():
         print('')  # empty line
         print('starting (it could take a few minutes) ...')
 
-        world = generate_world(world_name, args.width, args.height,
-                               seed, args.number_of_plates, args.output_dir,
-                               step, args.ocean_level, temps, humids, world_format,
-                               gamma_curve=args.gv, curve_offset=args.go,
-                               fade_borders=args.fade_borders,
-                               verbose=args.verbose, black_and_white=args.black_and_white)
-        if args.grayscale_heightmap:
-            generate_grayscale_heightmap(world,
-                                         '%s/%s_grayscale.png' % (args.output_dir, world_name))
-        if args.rivers_map:
-            generate_rivers_map(world,
-                                '%s/%s_rivers.png' % (args.output_dir, world_name))
-        if args.scatter_plot:
-            draw_scatter_plot(world,
-                              '%s/%s_scatter.png' % (args.output_dir, world_name))
-        if args.satelite_map:
-            draw_satellite_map(world,
-                               '%s/%s_satellite.png' % (args.output_dir, world_name))
-        if args.icecaps_map:
-            draw_icecaps_map(world,
-                             '%s/%s_icecaps.png' % (args.output_dir, world_name))
+        if ocean_levels:
+            worlds = generate_worlds_for_ocean_levels(
+                world_name, args.width, args.height, seed, args.number_of_plates,
+                args.output_dir, step, ocean_levels, temps, humids, world_format,
+                gamma_curve=args.gv, curve_offset=args.go,
+                fade_borders=args.fade_borders, verbose=args.verbose,
+                black_and_white=args.black_and_white, workers=args.workers,
+                fill_depressions=args.fill_depressions, watermap=args.watermap)
+        else:
+            world = generate_world(world_name, args.width, args.height,
+                                   seed, args.number_of_plates, args.output_dir,
+                                   step, args.ocean_level, temps, humids, world_format,
+                                   gamma_curve=args.gv, curve_offset=args.go,
+                                   fade_borders=args.fade_borders,
+                                   verbose=args.verbose, black_and_white=args.black_and_white,
+                                   workers=args.workers, fill_depressions=args.fill_depressions,
+                                   watermap=args.watermap)
+            worlds = [(world_name, world)]
+        for world_name, world in worlds:
+            if args.grayscale_heightmap:
+                generate_grayscale_heightmap(world,
+                                             '%s/%s_grayscale.png' % (args.output_dir, world_name))
+            if args.rivers_map:
+                generate_rivers_map(world,
+                                    '%s/%s_rivers.png' % (args.output_dir, world_name))
+            if args.scatter_plot:
+                draw_scatter_plot(world,
+                                  '%s/%s_scatter.png' % (args.output_dir, world_name))
+            if args.satelite_map:
+                draw_satellite_map(world,
+                                   '%s/%s_satellite.png' % (args.output_dir, world_name))
+            if args.icecaps_map:
+                draw_icecaps_map(world,
+                                 '%s/%s_icecaps.png' % (args.output_dir, world_name))
+            if args.path_graph:
+                generate_path_graph(world, '%s/%s_paths.npz' % (args.output_dir, world_name),
+                                    args.path_graph)
 
     elif operation == 'plates':
         print('')  # empty line
@@ -605,6 +723,24 @@ def main():
                               args.resize_factor, sea_color,
                               args.draw_biome, args.draw_rivers,
                               args.draw_mountains, args.draw_outer_border)
+    elif operation == 'reclassify':
+        world = load_world(args.FILE)
+        if not world.has_biome():
+            usage("Only fully generated worlds can be reclassified")
+        if not args.world_name:
+            world_name = "%s_reclassified" % world.name
+        if os.path.realpath("%s/%s.world" % (args.output_dir, world_name)) == \
+                os.path.realpath(args.FILE):
+            usage("Reclassifying %s would overwrite it, choose another name "
+                  "with -n or another output directory with -o" % args.FILE)
+        print('')  # empty line
+        print('reclassifying %s (temperature ranges: %s, humidity ranges: %s, '
+              'gamma value: %s, gamma offset: %s) ...' % (
+                  args.FILE, args.temps, args.humids, args.gv, args.go))
+        reclassify_world(world, world_name, args.output_dir,
+                         temps if args.temps else None, humids if args.humids else None,
+                         world_format, gamma_curve=args.gv, curve_offset=args.go,
+                         black_and_white=args.black_and_white, workers=args.workers)
     elif operation == 'info':
         world = load_world(args.FILE)
         print_world_info(world)
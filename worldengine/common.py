@@ -85,8 +85,6 @@ def anti_alias(map_in, steps):
     Execute the anti_alias operation steps times on the given map
     """
 
-    height, width = map_in.shape
-
     map_part = (2.0/11.0)*map_in
 
     # notice how [-1/sqrt(3), -1/sqrt(3), -1/sqrt(3)] * [-1/sqrt(3), -1/sqrt(3), -1/sqrt(3)]^T
@@ -95,34 +93,40 @@ def anti_alias(map_in, steps):
     # therefore the kernel is seperable
 
     w = -1.0/numpy.sqrt(3.0)
-    kernel = [w, w, w]
 
-    def _anti_alias_step(original):
+    def _convolve_rows(a):
+        # equivalent to numpy.convolve(row, [w, w, w], 'valid') for each row,
+        # including the order of the operations
+        a = a * w
+        result = a[:, :-2] + a[:, 1:-1]
+        result += a[:, 2:]
+        return result
 
-        # cf. comments above fo the factor
-        # this also makes a copy which might actually be superfluous
-        result = original * (3.0/11.0)
+    def _convolve_columns(a):
+        a = a * w
+        result = a[:-2] + a[1:-1]
+        result += a[2:]
+        return result
 
-        # we need to handle boundary conditions by hand, unfortunately
-        # there might be a better way but this works (circular boundary)
-        # notice how we'll need to add 2 to width and height later
-        # because of this
-        result = numpy.append(result, [result[0, :]], 0)
-        result = numpy.append(result, numpy.transpose([result[:, 0]]), 1)
+    def _anti_alias_step(original):
 
-        result = numpy.insert(result, [0], [result[-2, :]], 0)
-        result = numpy.insert(result, [0], numpy.transpose([result[:, -2]]), 1)
+        # cf. comments above fo the factor
+        # we need to handle boundary conditions by hand (circular boundary):
+        # pad by one cell on each side with the values from the opposite side
+        height, width = original.shape
+        result = numpy.empty((height + 2, width + 2),
+                             dtype=numpy.result_type(original, 3.0/11.0))
+        numpy.multiply(original, 3.0/11.0, out=result[1:-1, 1:-1])
+        result[0, 1:-1] = result[-2, 1:-1]
+        result[-1, 1:-1] = result[1, 1:-1]
+        result[:, 0] = result[:, -2]
+        result[:, -1] = result[:, 1]
 
         # with a seperable kernel we can convolve the rows first ...
-        for y in range(height+2):
-            result[y, 1:-1] = numpy.convolve(result[y, :], kernel, 'valid')
-
-        # ... and then the columns
-        for x in range(width+2):
-            result[1:-1, x] = numpy.convolve(result[:, x], kernel, 'valid')
+        result = _convolve_rows(result)
 
-        # throw away invalid values at the boundary
-        result = result[1:-1, 1:-1]
+        # ... and then the columns (the padding is gone after the second pass)
+        result = _convolve_columns(result)
 
         result += map_part
 
@@ -133,28 +137,107 @@ def anti_alias(map_in, steps):
         current = _anti_alias_step(current)
     return current
 
-def count_neighbours(mask, radius=1):
-    '''Count how many neighbours of a coordinate are set to one.
-    This uses the same principles as anti_alias, compare comments there.'''
 
-    height, width = mask.shape
+def _box_sum_rows(data, radius):
+    """
+    For each cell the sum of the values in its row from x - radius to
+    x + radius. Cells beyond the borders count as 0.
+    """
+    height, width = data.shape
+    radius = min(radius, width)
 
-    f = 2.0*radius+1.0
+    # sums[:, x] is the sum of the first x values of each row
+    sums = numpy.zeros((height, width + 1))
+    numpy.cumsum(data, axis=1, out=sums[:, 1:])
 
-    w = -1.0/numpy.sqrt(f)
-    kernel = [w]*radius + [w] + [w]*radius
+    result = numpy.empty((height, width))
+    # the windows ending at x + radius, or at the end of the row
+    result[:, :width - radius] = sums[:, radius + 1:]
+    result[:, width - radius:] = sums[:, width:]
+    # minus the windows starting at x - radius, or at the start of the row
+    result[:, radius:] -= sums[:, :width - radius]
+    return result
 
-    result = mask * f
 
-    for y in range(height):
-        result[y, :] = numpy.convolve(result[y, :], kernel, 'same')
+def count_neighbours(mask, radius=1):
+    '''Count how many neighbours of a coordinate are set to one.
+    The cells within the square of the given radius around each coordinate
+    are summed (cells beyond the borders count as 0), using cumulative sums so
+    the cost does not depend on the radius.'''
 
-    for x in range(width):
-        result[:, x] = numpy.convolve(result[:, x], kernel, 'same')
+    result = _box_sum_rows(numpy.asarray(mask, dtype=float), radius)
+    result = _box_sum_rows(result.T, radius).T
 
     return result - mask
 
 
+def label_components(mask):
+    """
+    Label the 8-connected components of a boolean mask.
+    Returns (labels, n): labels is an int array with 0 for unset cells and
+    1..n for the cells of each of the n components, numbered in raster order
+    of their first cell.
+
+    Instead of expanding cell by cell the mask is split into horizontal runs,
+    runs on adjacent rows which touch (diagonals included) are merged with a
+    union-find and the labels are then painted back run by run.
+    """
+
+    height, width = mask.shape
+    labels = numpy.zeros(mask.shape, dtype=numpy.int32)
+
+    # find the runs: pad every row with a False cell on both sides
+    padded = numpy.zeros((height, width + 2), dtype=numpy.int8)
+    padded[:, 1:-1] = mask
+    changes = numpy.diff(padded, axis=1)
+    rows, starts = numpy.nonzero(changes == 1)
+    _, ends = numpy.nonzero(changes == -1)
+    n_runs = len(starts)
+    if n_runs == 0:
+        return labels, 0
+
+    # a run in row y touches the runs in row y+1 which start before its end
+    # (+1 for the diagonal) and end after its start (-1 for the diagonal).
+    # Runs are sorted by row and then by position, so encoding the row in the
+    # key lets us find all of those with two binary searches
+    stride = width + 2
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    first = numpy.searchsorted(end_keys, (rows + 1) * stride + starts, side='left')
+    last = numpy.searchsorted(start_keys, (rows + 1) * stride + ends, side='right')
+    counts = numpy.maximum(last - first, 0)
+    a = numpy.repeat(numpy.arange(n_runs), counts)
+    b = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + \
+        numpy.repeat(first, counts)
+
+    # union-find over the runs, always hooking the larger root onto the
+    # smaller one and compressing the paths completely after every round
+    parent = numpy.arange(n_runs)
+    while len(a):
+        ra = parent[a]
+        rb = parent[b]
+        different = ra != rb
+        a, b, ra, rb = a[different], b[different], ra[different], rb[different]
+        if not len(a):
+            break
+        numpy.minimum.at(parent, numpy.maximum(ra, rb), numpy.minimum(ra, rb))
+        while True:
+            grandparent = parent[parent]
+            if numpy.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    roots, run_labels = numpy.unique(parent, return_inverse=True)
+    run_labels = (run_labels.reshape(-1) + 1).astype(numpy.int32)
+
+    lengths = ends - starts
+    cells = numpy.repeat(rows * width + starts - numpy.cumsum(lengths) + lengths, lengths) + \
+        numpy.arange(lengths.sum())
+    labels.reshape(-1)[cells] = numpy.repeat(run_labels, lengths)
+
+    return labels, len(roots)
+
+
 def _equal(a, b):
     # This is probably not a very good idea.
     # TODO: Remove and replace calls with specific comparisons.
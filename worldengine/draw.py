@@ -1,5 +1,6 @@
 import numpy
 
+from worldengine.biome import biome_index_names
 from worldengine.drawing_functions import draw_ancientmap, \
     draw_rivers_on_image
 from worldengine.image_io import PNGWriter
@@ -321,6 +322,49 @@ def get_biome_color_based_on_elevation(world, elev, x, y, rng):
     return this_tile_color
 
 
+def _target_channels(target):
+    """The channels of a PNGWriter with RGB or RGBA pixels, whose array is
+    filled at once, or None for the targets drawn one pixel at a time"""
+    if isinstance(target, PNGWriter) and target.channels in (3, 4):
+        return target.channels
+    return None
+
+
+def _fill_target(target, colors, rgb=None):
+    """
+    Set every pixel of target to the colors, an array of the shape of the
+    world with the channels of the target: straight into the array of a
+    PNGWriter, one pixel at a time on any other target. There the colors
+    are tuples of all their channels, or only of the first three where the
+    rgb mask is set.
+    """
+    if _target_channels(target):
+        target.array[:] = colors
+    else:
+        height, width = colors.shape[:2]
+        for y in range(height):
+            for x in range(width):
+                color = colors[y, x].tolist()
+                if rgb is not None and rgb[y, x]:
+                    color = color[:3]
+                target.set_pixel(x, y, tuple(color))
+
+
+def _biome_rgba(world, colors, channels=4):
+    """The RGB (or RGBA, opaque) color of the biome of every cell, from a dict
+    of colors by biome name, through a palette indexed by the biome layer"""
+    names = biome_index_names()
+    palette = numpy.zeros((len(names), channels), dtype=numpy.uint8)
+    for i, name in enumerate(names):
+        if name in colors:
+            palette[i] = (colors[name] + (255,))[:channels]
+    biome = world.biome_indices
+    for i in numpy.nonzero(numpy.bincount(biome.ravel(), minlength=len(names)))[0]:
+        if names[i] not in colors:
+            raise KeyError(names[i])
+    return palette[biome]
+
+
 # ----------------------
 # Draw on generic target
 # ----------------------
@@ -522,14 +566,11 @@ def draw_elevation(world, shadow, target):
 
 
 def draw_ocean(ocean, target):
-    height, width = ocean.shape
-
-    for y in range(height):
-        for x in range(width):
-            if ocean[y, x]:
-                target.set_pixel(x, y, (0, 0, 255, 255))
-            else:
-                target.set_pixel(x, y, (0, 255, 255, 255))
+    channels = _target_channels(target) or 4
+    colors = numpy.where(ocean[:, :, numpy.newaxis],
+                         numpy.array([0, 0, 255, 255][:channels], dtype=numpy.uint8),
+                         numpy.array([0, 255, 255, 255][:channels], dtype=numpy.uint8))
+    _fill_target(target, colors)
 
 
 def draw_precipitation(world, target, black_and_white=False):
@@ -570,17 +611,18 @@ def draw_precipitation(world, target, black_and_white=False):
 
 
 def draw_world(world, target):
-    width = world.width
-    height = world.height
+    ocean = world.layers['ocean'].data
+    channels = _target_channels(target) or 4
+    colors = _biome_rgba(world, _biome_colors, channels)
 
-    for y in range(height):
-        for x in range(width):
-            if world.is_land((x, y)):
-                biome = world.biome_at((x, y))
-                target.set_pixel(x, y, _biome_colors[biome.name()])
-            else:
-                c = int(world.layers['sea_depth'].data[y, x] * 200 + 50)
-                target.set_pixel(x, y, (0, 0, 255 - c, 255))
+    # the deeper the sea, the darker
+    c = (world.layers['sea_depth'].data[ocean] * 200 + 50).astype(int)
+    colors[ocean, 0:2] = 0
+    colors[ocean, 2] = 255 - c
+    if channels == 4:
+        colors[ocean, 3] = 255
+    # set_pixel gets the biome colors as RGB and the sea as RGBA, as always
+    _fill_target(target, colors, rgb=~ocean)
 
 
 def draw_temperature_levels(world, target, black_and_white=False):
@@ -619,15 +661,7 @@ def draw_temperature_levels(world, target, black_and_white=False):
 
 
 def draw_biome(world, target):
-    width = world.width
-    height = world.height
-
-    biome = world.layers['biome'].data
-
-    for y in range(height):
-        for x in range(width):
-            v = biome[y, x]
-            target.set_pixel(x, y, _biome_colors[v])
+    _fill_target(target, _biome_rgba(world, _biome_colors, _target_channels(target) or 3))
 
 
 def draw_scatter_plot(world, size, target):
@@ -9,7 +9,7 @@ import time
 import numpy
 from worldengine.common import get_verbose, count_neighbours
 from worldengine.common import anti_alias as anti_alias_channel
-from worldengine.biome import BiomeGroup, _un_camelize
+from worldengine.biome import BiomeGroup, _un_camelize, biome_name_to_index
 
 
 # -------------------
@@ -85,7 +85,7 @@ def _build_biome_group_masks(world, factor):
         group_mask = numpy.zeros((world.height, world.width), float)
 
         for biome in group.__subclasses__():
-            group_mask[world.biome == _un_camelize(biome.__name__)] += 1.0
+            group_mask[world.biome_indices == biome_name_to_index(_un_camelize(biome.__name__))] += 1.0
                     
         group_mask[group_mask > 0] = count_neighbours(group_mask)[group_mask > 0]
 
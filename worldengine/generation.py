@@ -1,9 +1,7 @@
 import numpy
 
-from noise import snoise2
-
-from worldengine.model.world import Step
-from worldengine.simulations.basic import find_threshold_f
+from worldengine.model.world import Step, HUMIDITY_QUANTILES
+from worldengine.simulations.basic import find_thresholds
 from worldengine.simulations.hydrology import WatermapSimulation
 from worldengine.simulations.irrigation import IrrigationSimulation
 from worldengine.simulations.humidity import HumiditySimulation
@@ -13,7 +11,8 @@ from worldengine.simulations.erosion import ErosionSimulation
 from worldengine.simulations.precipitation import PrecipitationSimulation
 from worldengine.simulations.biome import BiomeSimulation
 from worldengine.simulations.icecap import IcecapSimulation
-from worldengine.common import anti_alias, get_verbose
+from worldengine.common import anti_alias, get_verbose, label_components
+from worldengine.noise_field import noise_field
 
 
 # ------------------
@@ -45,6 +44,7 @@ def center_land(world):
             world.layers['plates'].data,
             -y_with_min_sum + latshift, axis=0),
         - x_with_min_sum, axis=1)
+    world.layer_changed('elevation')
     if get_verbose():
         print("geo.center_land: width complete")
 
@@ -69,43 +69,81 @@ def place_oceans_at_map_borders(world):
         for i in range(ocean_border):
             place_ocean(i, y, i)
             place_ocean(world.width - i - 1, y, i)
+    world.layer_changed('elevation')
 
 
-def add_noise_to_elevation(world, seed):
+def add_noise_to_elevation(world, seed, workers=1):
     octaves = 8
     freq = 16.0 * octaves
-    for y in range(world.height):
-        for x in range(world.width):
-            n = snoise2(x / freq * 2, y / freq * 2, octaves, base=seed)
-            world.layers['elevation'].data[y, x] += n
+    world.layers['elevation'].data += noise_field(
+        world.width, world.height, freq, octaves, seed, scale=2.0, workers=workers)
 
 
-def fill_ocean(elevation, sea_level):#TODO: Make more use of numpy?
-    height, width = elevation.shape
+def fill_ocean(elevation, sea_level, return_labels=False):
+    """
+    The ocean consists of all the cells at or below sea level which are
+    connected (diagonals included) to the border of the map.
+    If return_labels is set (ocean, labels) is returned, where labels numbers
+    every body of water from 1 on (0 is land): the ones touching the border
+    form the ocean, the others are lakes.
+    """
+
+    labels, n = label_components(elevation <= sea_level)
 
-    ocean = numpy.zeros(elevation.shape, dtype=bool)
-    to_expand = []
-    for x in range(width):#handle top and bottom border of the map
-        if elevation[0, x] <= sea_level:
-            to_expand.append((x, 0))
-        if elevation[height - 1, x] <= sea_level:
-            to_expand.append((x, height - 1))
-    for y in range(height):#handle left- and rightmost border of the map
-        if elevation[y, 0] <= sea_level:
-            to_expand.append((0, y))
-        if elevation[y, width - 1] <= sea_level:
-            to_expand.append((width - 1, y))
-    for t in to_expand:
-        tx, ty = t
-        if not ocean[ty, tx]:
-            ocean[ty, tx] = True
-            for px, py in _around(tx, ty, width, height):
-                if not ocean[py, px] and elevation[py, px] <= sea_level:
-                    to_expand.append((px, py))
+    border_labels = numpy.concatenate((labels[0, :], labels[-1, :],
+                                       labels[:, 0], labels[:, -1]))
+    is_ocean = numpy.zeros(n + 1, dtype=bool)
+    is_ocean[border_labels] = True
+    is_ocean[0] = False
+    ocean = is_ocean[labels]
 
+    if return_labels:
+        return ocean, labels
     return ocean
 
 
+def flood_level(elevation):
+    """
+    For every cell calculate the lowest sea level at which it becomes part
+    of the ocean, i.e. the lowest possible value for the highest cell on a
+    path connecting it to the border of the map (diagonals allowed).
+    This is the value a priority-flood from the border assigns to each cell:
+    the ocean for any sea level is then given by flood_level <= sea_level,
+    without filling the ocean again.
+
+    Instead of expanding cell by cell using a priority queue the values are
+    relaxed with alternating sweeps over the columns and the rows of the map,
+    each processing a whole column (row) at a time, until nothing changes.
+    """
+
+    height, width = elevation.shape
+
+    level = numpy.full(elevation.shape, numpy.inf)
+    level[0, :] = elevation[0, :]
+    level[-1, :] = elevation[-1, :]
+    level[:, 0] = elevation[:, 0]
+    level[:, -1] = elevation[:, -1]
+
+    def sweep(level, elevation, order):
+        step = 1 if order[0] < order[-1] else -1
+        for x in order[1:]:
+            previous = level[:, x - step]
+            lowest = previous.copy()
+            numpy.minimum(lowest[1:], previous[:-1], out=lowest[1:])
+            numpy.minimum(lowest[:-1], previous[1:], out=lowest[:-1])
+            numpy.minimum(lowest, level[:, x], out=lowest)
+            numpy.maximum(lowest, elevation[:, x], out=level[:, x])
+
+    while True:
+        before = level.copy()
+        sweep(level, elevation, range(width))
+        sweep(level, elevation, range(width - 1, -1, -1))
+        sweep(level.T, elevation.T, range(height))
+        sweep(level.T, elevation.T, range(height - 1, -1, -1))
+        if numpy.array_equal(before, level):
+            return level
+
+
 def initialize_ocean_and_thresholds(world, ocean_level=1.0):
     """
     Calculate the ocean, the sea depth and the elevation thresholds
@@ -114,9 +152,12 @@ def initialize_ocean_and_thresholds(world, ocean_level=1.0):
     :return: nothing, the world will be changed
     """
     e = world.layers['elevation'].data
-    ocean = fill_ocean(e, ocean_level)
-    hl = find_threshold_f(e, 0.10)  # the highest 10% of all (!) land are declared hills
-    ml = find_threshold_f(e, 0.03)  # the highest 3% are declared mountains
+    if world.has_flood_level():
+        ocean = world.flood_level <= ocean_level
+    else:
+        ocean = fill_ocean(e, ocean_level)
+    # the highest 10% of all (!) land are declared hills, the highest 3% are declared mountains
+    hl, ml = find_thresholds(e, [0.10, 0.03])
     e_th = [('sea', ocean_level),
             ('plain', hl),
             ('hill', ml),
@@ -148,49 +189,63 @@ def harmonize_ocean(ocean, elevation, ocean_level):
 # Misc
 # ----
 
-def sea_depth(world, sea_level):
+def sea_depth(world, sea_level, max_radius=5, factors=None):
+    """
+    The raw depth (sea_level - elevation) is multiplied by a factor depending
+    on the distance from the next land, up to max_radius cells away.
+    factors holds one value per distance from 1 to max_radius; by default
+    [0.0, 0.3, 0.5, 0.7, 0.9], stretched over max_radius values.
+    """
 
-    # a dynamic programming approach to gather how far the next land is
-    # from a given coordinate up to a maximum distance of max_radius
+    # how far the next land is from a given coordinate, counting diagonal
+    # steps as one, up to a maximum distance of max_radius
     # result is 0 for land coordinates and -1 for coordinates further than
     # max_radius away from land
-    # there might be even faster ways but it does the trick
-
-    def next_land_dynamic(ocean, max_radius=5):
-        next_land = numpy.full(ocean.shape, -1, int)
-
-        # non ocean tiles are zero distance away from next land
-        next_land[numpy.logical_not(ocean)] = 0
+    # this is a two-pass distance transform: one pass top to bottom and one
+    # bottom to top, each row taking the distances of the row before and then
+    # spreading them along itself. The cost does not depend on max_radius.
 
+    def next_land_dynamic(ocean, max_radius):
         height, width = ocean.shape
-
-        for dist in range(max_radius):
-            indices = numpy.transpose(numpy.where(next_land == dist))
-            for y, x in indices:
-                for dy in range(-1, 2):
-                    ny = y + dy
-                    if 0 <= ny < height:
-                        for dx in range(-1, 2):
-                            nx = x + dx
-                            if 0 <= nx < width:
-                                if next_land[ny, nx] == -1:
-                                    next_land[ny, nx] = dist + 1
-        return next_land
+        far = numpy.iinfo(int).max // 2  # above any max_radius, even without land
+        distance = numpy.where(ocean, far, 0)
+        columns = numpy.arange(width)
+
+        def spread_row(row, previous):
+            if previous is not None:
+                nearby = previous.copy()
+                numpy.minimum(nearby[1:], previous[:-1], out=nearby[1:])
+                numpy.minimum(nearby[:-1], previous[1:], out=nearby[:-1])
+                numpy.minimum(row, nearby + 1, out=row)
+            # row[x] = min(row[x], row[x - 1] + 1) and the same from the right
+            row[:] = numpy.minimum.accumulate(row - columns) + columns
+            row[::-1] = numpy.minimum.accumulate(row[::-1] - columns) + columns
+
+        for y in range(height):
+            spread_row(distance[y], distance[y - 1] if y > 0 else None)
+        for y in range(height - 2, -1, -1):
+            spread_row(distance[y], distance[y + 1])
+
+        distance[distance > max_radius] = -1
+        return distance
 
     # We want to multiply the raw sea_depth by one of these factors
     # depending on the distance from the next land
-    # possible TODO: make this a parameter
-    factors = [0.0, 0.3, 0.5, 0.7, 0.9]
+    if factors is None:
+        factors = numpy.interp(numpy.linspace(0, 4, max_radius), range(5),
+                               [0.0, 0.3, 0.5, 0.7, 0.9])
+    if len(factors) != max_radius:
+        raise ValueError("Expected %d factors, found %d" % (max_radius, len(factors)))
 
-    next_land = next_land_dynamic(world.layers['ocean'].data)
+    # land (distance 0) and cells further than max_radius (distance -1) are
+    # not scaled
+    lookup = numpy.concatenate(([1.0], factors, [1.0]))
+
+    next_land = next_land_dynamic(world.layers['ocean'].data, max_radius)
 
     result = sea_level - world.layers['elevation'].data
 
-    for y in range(world.height):
-        for x in range(world.width):
-            dist_to_next_land = next_land[y, x]
-            if dist_to_next_land > 0:
-                result[y, x] *= factors[dist_to_next_land-1]
+    result *= lookup[next_land]
 
     result = anti_alias(result, 10)
 
@@ -201,33 +256,16 @@ def sea_depth(world, sea_level):
     return result
 
 
-def _around(x, y, width, height):
-    ps = []
-    for dx in range(-1, 2):
-        nx = x + dx
-        if 0 <= nx < width:
-            for dy in range(-1, 2):
-                ny = y + dy
-                if 0 <= ny < height and (dx != 0 or dy != 0):
-                    ps.append((nx, ny))
-    return ps
-
-
-def generate_world(w, step):
-    if isinstance(step, str):
-        step = Step.get_by_name(step)
-
-    if not step.include_precipitations:
-        return w
-
+def _simulation_seeds(seed):
+    """The seeds used by the different simulations of a world with the given seed"""
     # Prepare sufficient seeds for the different steps of the generation
     # create a fresh RNG in case the global RNG is compromised
     # (i.e. has been queried an indefinite amount of times before generate_world() was called)
-    rng = numpy.random.RandomState(w.seed)
+    rng = numpy.random.RandomState(seed)
     # choose lowest common denominator (32 bit Windows numpy cannot handle a larger value)
     sub_seeds = rng.randint(0, numpy.iinfo(numpy.int32).max, size=100)
      # after 0.19.0 do not ever switch out the seeds here to maximize seed-compatibility
-    seed_dict = {
+    return {
                  'PrecipitationSimulation': sub_seeds[ 0],
                  'ErosionSimulation':       sub_seeds[ 1],
                  'WatermapSimulation':      sub_seeds[ 2],
@@ -240,23 +278,40 @@ def generate_world(w, step):
                  '':                        sub_seeds[99]
     }
 
-    TemperatureSimulation().execute(w, seed_dict['TemperatureSimulation'])
+
+def generate_world(w, step, workers=1, fill_depressions=False, watermap='droplets'):
+    """
+    Run the simulations of the given step on a world with elevation and
+    ocean. With fill_depressions rivers leave the depressions they end up in
+    through their spill point, found by a single priority-flood of the map,
+    and the depressions they pass through become lakes. watermap is the
+    method of the WatermapSimulation: 'droplets' or 'flow'.
+    """
+    if isinstance(step, str):
+        step = Step.get_by_name(step)
+
+    if not step.include_precipitations:
+        return w
+
+    seed_dict = _simulation_seeds(w.seed)
+
+    TemperatureSimulation(workers).execute(w, seed_dict['TemperatureSimulation'])
     # Precipitation with thresholds
-    PrecipitationSimulation().execute(w, seed_dict['PrecipitationSimulation'])
+    PrecipitationSimulation(workers).execute(w, seed_dict['PrecipitationSimulation'])
 
     if not step.include_erosion:
         return w
-    ErosionSimulation().execute(w, seed_dict['ErosionSimulation'])  # seed not currently used
+    ErosionSimulation(fill_depressions).execute(w, seed_dict['ErosionSimulation'])  # seed not currently used
     if get_verbose():
         print("...erosion calculated")
 
-    WatermapSimulation().execute(w, seed_dict['WatermapSimulation'])  # seed not currently used
+    WatermapSimulation(watermap).execute(w, seed_dict['WatermapSimulation'])  # seed not currently used
 
     # FIXME: create setters
     IrrigationSimulation().execute(w, seed_dict['IrrigationSimulation'])  # seed not currently used
     HumiditySimulation().execute(w, seed_dict['HumiditySimulation'])  # seed not currently used
 
-    PermeabilitySimulation().execute(w, seed_dict['PermeabilitySimulation'])
+    PermeabilitySimulation(workers).execute(w, seed_dict['PermeabilitySimulation'])
 
     cm, biome_cm = BiomeSimulation().execute(w, seed_dict['BiomeSimulation'])  # seed not currently used
     for cl in cm:
@@ -276,3 +331,68 @@ def generate_world(w, step):
     IcecapSimulation().execute(w, seed_dict['IcecapSimulation'])  # makes use of temperature-map
 
     return w
+
+
+def _shares_above(values, thresholds):
+    """The share of the sorted values above each of the thresholds"""
+    above = len(values) - numpy.searchsorted(values, thresholds, side='right')
+    return (above / float(len(values))).tolist()
+
+
+def reclassify_world(w, temps=None, humids=None, gamma_curve=None, curve_offset=None,
+                     workers=1):
+    """
+    Recompute the temperature and humidity thresholds, the biomes and the
+    icecaps of an already generated world for new temps, humids and gamma
+    curve values, without running the plates simulation and erosion again.
+    Parameters left to None keep the values of the world: the temperature
+    thresholds and humidity quantiles stay as they are (a world file does not
+    store the temps and humids they come from). If the humidity is computed
+    again for a new gamma curve without new humids, its quantiles are the
+    values with the same share of the land above them as before.
+
+    The thresholds are found from the sorted temperature and humidity values,
+    which are cached in their layers, so reclassifying a world repeatedly with
+    different temps and humids only sorts each layer once.
+
+    If the gamma curve changes, precipitation is computed again (with the
+    seed used during generation) and so is humidity; watermap, irrigation and
+    rivers keep the values derived from the original precipitation.
+    """
+    if not (w.has_temperature() and w.has_humidity() and w.has_precipitations()
+            and w.has_irrigation()):
+        raise Exception("Only fully generated worlds can be reclassified")
+
+    seed_dict = _simulation_seeds(w.seed)
+    ocean = w.layers['ocean'].data
+
+    temperature = w.layers['temperature']
+    if temps is not None:
+        w.temps = temps
+        temperature.thresholds = TemperatureSimulation.thresholds(
+            temperature.data, w.temps, ocean, values=temperature.sorted_values(ocean))
+        w.layer_changed('temperature')
+
+    humidity = w.layers['humidity']
+    if humids is not None:
+        w.humids = humids
+
+    gamma_curve = w.gamma_curve if gamma_curve is None else gamma_curve
+    curve_offset = w.curve_offset if curve_offset is None else curve_offset
+    if (gamma_curve, curve_offset) != (w.gamma_curve, w.curve_offset):
+        if humids is None:
+            w.humids = _shares_above(humidity.sorted_values(ocean),
+                                     [humidity.quantiles[q] for q in HUMIDITY_QUANTILES])
+        w.gamma_curve = gamma_curve
+        w.curve_offset = curve_offset
+        PrecipitationSimulation(workers).execute(w, seed_dict['PrecipitationSimulation'])
+        HumiditySimulation().execute(w, seed_dict['HumiditySimulation'])
+    elif humids is not None:
+        humidity.quantiles = HumiditySimulation.quantiles(
+            humidity.data, w.humids, ocean, values=humidity.sorted_values(ocean))
+        w.layer_changed('humidity')
+
+    BiomeSimulation().execute(w, seed_dict['BiomeSimulation'])
+    IcecapSimulation().execute(w, seed_dict['IcecapSimulation'])
+
+    return w
@@ -3,7 +3,6 @@ import numpy
 import h5py
 
 from worldengine.version import __version__
-from worldengine.biome import biome_name_to_index, biome_index_to_name
 from worldengine.model.world import World, Step, Size, GenerationParameters
 
 
@@ -33,11 +32,13 @@ def save_world_to_hdf5(world, filename):
     sea_depth_data = f.create_dataset("sea_depth", (world.height, world.width), dtype=numpy.float)
     sea_depth_data.write_direct(world.layers['sea_depth'].data)
 
+    if world.has_flood_level():
+        flood_level_data = f.create_dataset("flood_level", (world.height, world.width), dtype=numpy.float64)
+        flood_level_data.write_direct(world.layers['flood_level'].data)
+
     if world.has_biome():
         biome_data = f.create_dataset("biome", (world.height, world.width), dtype=numpy.uint16)
-        for y in range(world.height):
-            for x in range(world.width):
-                biome_data[y, x] = biome_name_to_index(world.layers['biome'].data[y][x])
+        biome_data.write_direct(world.layers['biome'].data.astype(numpy.uint16))
 
     if world.has_humidity():
         humidity_grp = f.create_group("humidity")
@@ -146,17 +147,12 @@ def load_world_to_hdf5(filename):
     w.ocean = numpy.array(f['ocean'])
     w.sea_depth = numpy.array(f['sea_depth'])
 
+    if 'flood_level' in f.keys():
+        w.flood_level = numpy.array(f['flood_level'])
+
     # Biome
     if 'biome' in f.keys():
-        biome_data = []
-        for y in range(w.height):
-            row = []
-            for x in range(w.width):
-                value = f['biome'][y, x]
-                row.append(biome_index_to_name(value))
-            biome_data.append(row)
-        biome = numpy.array(biome_data, dtype=object)
-        w.biome = biome
+        w.biome = numpy.array(f['biome'])
 
     if 'humidity' in f.keys():
         data, quantiles = _from_hdf5_matrix_with_quantiles(f['humidity'])
@@ -0,0 +1,237 @@
+"""
+Hierarchical path finding (HPA*) on a height map.
+
+The map is split into square clusters. The border between two neighbouring
+clusters is split in a few parts and the cheapest couple of facing cells of
+every part is an entrance; the cells of the entrances are the nodes of an
+abstract graph, joined by the step across the border and by the cheapest
+paths between the nodes of the same cluster. A query is a search on the abstract graph, after
+connecting the source and the destination to the nodes of their clusters,
+and the abstract path is then refined into cells one cluster at a time.
+
+The costs are those of worldengine.astar: the cost of a path is the sum of
+the values of all its cells. The paths found are the cheapest ones going
+through the entrances, not necessarily the cheapest ones overall.
+
+The graph only depends on the height map, so it can be built once and
+saved next to the world it was built for; the file records a digest of the
+height map and is only loaded for the same one.
+"""
+
+import hashlib
+import heapq
+
+import numpy
+
+from worldengine.astar import PathFinder, _dijkstra
+
+
+def _digest(height_map):
+    """A digest of the values of the height map"""
+    values = numpy.ascontiguousarray(height_map, dtype=numpy.float64)
+    return hashlib.sha1(values.tobytes()).hexdigest()
+
+
+class AbstractGraph(object):
+    """
+    The abstract graph of a height map: nodes holds the flat index of the
+    cell of every node, edges the couples of nodes joined and costs the
+    cost of the path between them, both cells included.
+    """
+
+    def __init__(self, height_map, cluster_size, nodes, edges, costs):
+        self.height_map = height_map
+        self.cluster_size = cluster_size
+        self.nodes = numpy.asarray(nodes, dtype=numpy.int64)
+        self.edges = numpy.asarray(edges, dtype=numpy.int64).reshape(-1, 2)
+        self.costs = numpy.asarray(costs, dtype=float)
+
+        height, width = height_map.shape
+        self._m = height_map.ravel('C')
+        self._clusters_x = (width + cluster_size - 1) // cluster_size
+        self._cluster_nodes = {}
+        for i, lid in enumerate(self.nodes.tolist()):
+            self._cluster_nodes.setdefault(self._cluster_of(lid), []).append(i)
+        self._adjacency = [[] for _ in range(len(self.nodes))]
+        for (a, b), cost in zip(self.edges.tolist(), self.costs.tolist()):
+            self._adjacency[a].append((b, cost))
+            self._adjacency[b].append((a, cost))
+
+    @staticmethod
+    def build(height_map, cluster_size=32, entrances=2):
+        """Find the entrances between the clusters and the costs of the paths
+        between them. The border between two clusters is split in the given
+        number of parts, each one with an entrance."""
+        if cluster_size < 2:
+            raise ValueError("Clusters have to be at least 2 cells wide")
+        if entrances < 1:
+            raise ValueError("There has to be at least one entrance per border")
+        height, width = height_map.shape
+        m = height_map.ravel('C')
+
+        # the cheapest couple of cells across every part of the borders
+        crossings = []
+
+        def cross(cells, step):
+            for part in numpy.array_split(cells, min(entrances, len(cells))):
+                i = numpy.argmin(m[part] + m[part + step])
+                crossings.append((part[i], part[i] + step))
+
+        for y0 in range(0, height, cluster_size):
+            y1 = min(y0 + cluster_size, height)
+            for x0 in range(0, width, cluster_size):
+                x1 = min(x0 + cluster_size, width)
+                if x1 < width:  # the border on the east
+                    cross(numpy.arange(y0, y1) * width + x1 - 1, 1)
+                if y1 < height:  # the border on the south
+                    cross((y1 - 1) * width + numpy.arange(x0, x1), width)
+
+        crossings = numpy.array(crossings, dtype=numpy.int64).reshape(-1, 2)
+        nodes = numpy.unique(crossings)
+        edges = [numpy.searchsorted(nodes, crossings)]
+        costs = [m[crossings[:, 0]] + m[crossings[:, 1]]]
+
+        # the paths inside the clusters
+        graph = AbstractGraph(height_map, cluster_size, nodes, numpy.zeros((0, 2)), [])
+        for cluster, members in sorted(graph._cluster_nodes.items()):
+            for k, a in enumerate(members[:-1]):
+                cost, _ = graph._cluster_search(cluster, nodes[a])
+                for b in members[k + 1:]:
+                    local = graph._local_index(cluster, nodes[b])
+                    if numpy.isfinite(cost[local]):
+                        edges.append(numpy.array([[a, b]]))
+                        costs.append(cost[local:local + 1])
+
+        return AbstractGraph(height_map, cluster_size, nodes, numpy.concatenate(edges),
+                             numpy.concatenate(costs))
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            numpy.savez(f, shape=numpy.array(self.height_map.shape),
+                        digest=numpy.array(_digest(self.height_map)),
+                        cluster_size=numpy.array(self.cluster_size),
+                        nodes=self.nodes, edges=self.edges, costs=self.costs)
+
+    @staticmethod
+    def load(filename, height_map):
+        """The graph saved in filename, for the height map it was built from"""
+        with numpy.load(filename) as data:
+            if tuple(data['shape']) != height_map.shape:
+                raise Exception("The graph was built for a map of shape %s, not %s" %
+                                (tuple(data['shape']), height_map.shape))
+            if 'digest' not in data.files or str(data['digest']) != _digest(height_map):
+                raise Exception("The graph was built for another height map")
+            return AbstractGraph(height_map, int(data['cluster_size']), data['nodes'],
+                                 data['edges'], data['costs'])
+
+    def _cluster_of(self, lid):
+        width = self.height_map.shape[1]
+        y, x = divmod(int(lid), width)
+        return (y // self.cluster_size) * self._clusters_x + x // self.cluster_size
+
+    def _cluster_bounds(self, cluster):
+        height, width = self.height_map.shape
+        cy, cx = divmod(cluster, self._clusters_x)
+        y0, x0 = cy * self.cluster_size, cx * self.cluster_size
+        return y0, min(y0 + self.cluster_size, height), x0, min(x0 + self.cluster_size, width)
+
+    def _local_index(self, cluster, lid):
+        y0, _, x0, x1 = self._cluster_bounds(cluster)
+        y, x = divmod(int(lid), self.height_map.shape[1])
+        return (y - y0) * (x1 - x0) + x - x0
+
+    def _cluster_search(self, cluster, lid):
+        """Costs and predecessors of the paths from lid inside its cluster,
+        indexed by the local index of the cells"""
+        y0, y1, x0, x1 = self._cluster_bounds(cluster)
+        cluster_map = self.height_map[y0:y1, x0:x1]
+        return _dijkstra(cluster_map.ravel('C'), x1 - x0, y1 - y0,
+                         [self._local_index(cluster, lid)])
+
+    def _local_path(self, cluster, predecessor, lid):
+        """The cells leading to lid in the predecessors of a cluster search,
+        as [x, y], the first cell of the search excluded"""
+        y0, y1, x0, x1 = self._cluster_bounds(cluster)
+        local = self._local_index(cluster, lid)
+        path = PathFinder.path_to(predecessor.reshape(y1 - y0, x1 - x0),
+                                  [local % (x1 - x0), local // (x1 - x0)])
+        return [[x + x0, y + y0] for x, y in path]
+
+    def find(self, source, destination):
+        """
+        A path from source to destination ([x, y] each) in the format of
+        PathFinder.find: the cells after the source up to the destination,
+        empty if there is none or source is destination.
+        """
+        width = self.height_map.shape[1]
+        m = self._m
+        s_lid = source[1] * width + source[0]
+        t_lid = destination[1] * width + destination[0]
+        if s_lid == t_lid:
+            return []
+        s_cluster, t_cluster = self._cluster_of(s_lid), self._cluster_of(t_lid)
+        s_cost, s_predecessor = self._cluster_search(s_cluster, s_lid)
+        t_cost, t_predecessor = self._cluster_search(t_cluster, t_lid)
+
+        # Dijkstra on the abstract graph, with the source and the destination
+        # as two more nodes
+        n = len(self.nodes)
+        source_node, target_node = n, n + 1
+        best = {source_node: m[s_lid]}
+        previous = {}
+        queue = []
+
+        def relax(node, cost, origin):
+            if cost < best.get(node, numpy.inf):
+                best[node] = cost
+                previous[node] = origin
+                heapq.heappush(queue, (cost, node))
+
+        for a in self._cluster_nodes.get(s_cluster, []):
+            relax(a, s_cost[self._local_index(s_cluster, self.nodes[a])], source_node)
+        if s_cluster == t_cluster:
+            relax(target_node, s_cost[self._local_index(s_cluster, t_lid)], source_node)
+        to_target = {}
+        for a in self._cluster_nodes.get(t_cluster, []):
+            to_target[a] = t_cost[self._local_index(t_cluster, self.nodes[a])]
+
+        done = set()
+        while queue:
+            cost, node = heapq.heappop(queue)
+            if node in done:
+                continue
+            done.add(node)
+            if node == target_node:
+                break
+            # the value of the node is counted by both paths meeting there
+            cost -= m[self.nodes[node]]
+            for b, edge_cost in self._adjacency[node]:
+                relax(b, cost + edge_cost, node)
+            if node in to_target:
+                relax(target_node, cost + to_target[node], node)
+
+        if target_node not in done or not numpy.isfinite(best[target_node]):
+            return []
+
+        route = [target_node]
+        while route[-1] != source_node:
+            route.append(previous[route[-1]])
+        route.reverse()
+
+        # refine the abstract path
+        if len(route) == 2:
+            return self._local_path(s_cluster, s_predecessor, t_lid)
+        path = self._local_path(s_cluster, s_predecessor, self.nodes[route[1]])
+        for a, b in zip(route[1:-2], route[2:-1]):
+            a_lid, b_lid = self.nodes[a], self.nodes[b]
+            cluster = self._cluster_of(a_lid)
+            if cluster != self._cluster_of(b_lid):  # across the border
+                path.append([int(b_lid % width), int(b_lid // width)])
+            else:
+                _, predecessor = self._cluster_search(cluster, a_lid)
+                path += self._local_path(cluster, predecessor, b_lid)
+        last = self.nodes[route[-2]]
+        to_last = self._local_path(t_cluster, t_predecessor, last)
+        # to_last goes from the destination to the last node, reverse it
+        path += (to_last[::-1] + [[destination[0], destination[1]]])[1:]
+        return path
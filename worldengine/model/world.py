@@ -1,13 +1,39 @@
 import numpy
 
-from worldengine.biome import biome_name_to_index, biome_index_to_name, Biome
+from worldengine.biome import biome_index_names, Biome
 from worldengine.biome import Iceland
 import worldengine.protobuf.World_pb2 as Protobuf
 from worldengine.step import Step
 from worldengine.common import _equal
+from worldengine.simulations.basic import sorted_values
 from worldengine.version import __version__
 
 
+# humidity quantiles bounding the humidity bands, from superarid to superhumid
+HUMIDITY_QUANTILES = ['87', '75', '62', '50', '37', '25', '12']
+
+
+def _band_index(data, thresholds):
+    """
+    Index of the band every cell falls in: band 0 is below thresholds[0], band
+    i is in [thresholds[i-1], thresholds[i]) and the last band is at or above
+    the last threshold. The first matching band wins; cells matching no band
+    (possible if the thresholds are not sorted) get len(thresholds) + 1, as do
+    NaN cells.
+    """
+    if all(a <= b for a, b in zip(thresholds[:-1], thresholds[1:])):
+        band = numpy.digitize(data, thresholds).astype(numpy.uint8)
+        nan = numpy.isnan(data)
+        if nan.any():
+            band[nan] = len(thresholds) + 1
+        return band
+    conditions = [data < thresholds[0]]
+    for th_min, th_max in zip(thresholds[:-1], thresholds[1:]):
+        conditions.append(numpy.logical_and(th_max > data, data >= th_min))
+    conditions.append(data >= thresholds[-1])
+    return numpy.select(conditions, numpy.arange(len(conditions)), len(conditions)).astype(numpy.uint8)
+
+
 class Size(object):
 
     def __init__(self, width, height):
@@ -39,6 +65,7 @@ class Layer(object):
 
     def __init__(self, data):
         self.data = data
+        self._sorted_values = None
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
@@ -52,6 +79,16 @@ class Layer(object):
     def max(self):
         return self.data.max()
 
+    def sorted_values(self, mask=None):
+        """
+        The values of the cells not covered by mask, sorted. The result is
+        computed once per mask and then reused, so the data of the layer (and
+        the mask) are expected not to change afterwards.
+        """
+        if self._sorted_values is None or self._sorted_values[0] is not mask:
+            self._sorted_values = (mask, sorted_values(self.data, mask))
+        return self._sorted_values[1]
+
 
 class LayerWithThresholds(Layer):
 
@@ -101,6 +138,9 @@ class World(object):
         self.generation_params = generation_params
 
         self.layers = {}
+        # values derived from the layers, dropped when the layers they are
+        # derived from are set again
+        self._cache = {}
 
         # Deprecated
         self.width = size.width
@@ -113,8 +153,33 @@ class World(object):
     # General methods
     #
 
+    # the values of _cache derived from every layer
+    _DERIVED = {
+        'ocean': ['land_indices', 'elevation_band'],
+        'elevation': ['elevation_band', 'mountain_levels'],
+        'temperature': ['temperature_class'],
+        'humidity': ['humidity_class'],
+        'biome': ['biome', 'iceland_mask'],
+    }
+
+    def _cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def layer_changed(self, name):
+        """
+        Drop the values cached from the layer name. The setters of the layers
+        call it, it only has to be called after changing a layer in place.
+        """
+        for key in World._DERIVED.get(name, []):
+            self._cache.pop(key, None)
+
     def __eq__(self, other):
-        return _equal(self.__dict__, other.__dict__)
+        # what is cached does not make two worlds different
+        mine = dict((k, v) for k, v in self.__dict__.items() if k != '_cache')
+        theirs = dict((k, v) for k, v in other.__dict__.items() if k != '_cache')
+        return _equal(mine, theirs)
 
     #
     # Serialization / Unserialization
@@ -241,9 +306,11 @@ class World(object):
         # Ocean
         self._to_protobuf_matrix(self.layers['ocean'].data, p_world.ocean)
         self._to_protobuf_matrix(self.layers['sea_depth'].data, p_world.sea_depth)
+        if self.has_flood_level():
+            self._to_protobuf_matrix(self.layers['flood_level'].data, p_world.flood_level)
 
         if self.has_biome():
-            self._to_protobuf_matrix(self.layers['biome'].data, p_world.biome, biome_name_to_index)
+            self._to_protobuf_matrix(self.layers['biome'].data, p_world.biome)
 
         if self.has_humidity():
             self._to_protobuf_matrix_with_quantiles(self.layers['humidity'], p_world.humidity)
@@ -311,12 +378,12 @@ class World(object):
         # Ocean
         w.ocean = numpy.array(World._from_protobuf_matrix(p_world.ocean))
         w.sea_depth = numpy.array(World._from_protobuf_matrix(p_world.sea_depth))
+        if p_world.flood_level.rows:
+            w.flood_level = numpy.array(World._from_protobuf_matrix(p_world.flood_level))
 
         # Biome
         if p_world.biome.rows:
-            w.biome = numpy.array(
-                World._from_protobuf_matrix(p_world.biome, biome_index_to_name), 
-                dtype=object)
+            w.biome = numpy.array(World._from_protobuf_matrix(p_world.biome), dtype=numpy.uint8)
 
         # Humidity
         if p_world.humidity.rows:
@@ -387,20 +454,34 @@ class World(object):
     # Land/Ocean
     #
 
-    def random_land(self, num_samples=1):
-        if self.layers['ocean'].data.all():
+    def land_indices(self):
+        """
+        The [y, x] of all the land cells, as the rows of an array. It is
+        computed once and kept until the ocean is set again.
+        """
+        return self._cached('land_indices', lambda: numpy.transpose(
+            numpy.nonzero(numpy.invert(self.layers['ocean'].data))))
+
+    def random_land(self, num_samples=1, rng=None):
+        """
+        The positions of num_samples random land cells, as a flat array
+        x0, y0, x1, y1... The cells are drawn from the global RNG, giving the
+        same values as one numpy.random.randint call per cell did, unless a
+        numpy.random.Generator is passed as rng.
+        """
+        land_indices = self.land_indices()
+        if len(land_indices) == 0:
             # return invalid indices if there is no land at all
             return None, None
 
-        land = numpy.invert(self.layers['ocean'].data)
-        # returns a list of tuples/indices with land positions
-        land_indices = numpy.transpose(numpy.nonzero(land))  
+        if rng is None:
+            r_nums = numpy.random.randint(0, len(land_indices), size=num_samples)  # uses global RNG
+        else:
+            r_nums = rng.integers(0, len(land_indices), size=num_samples)
 
         result = numpy.zeros(num_samples*2, dtype=int)
-
-        for i in range(0, num_samples*2, 2):
-            r_num = numpy.random.randint(0, len(land_indices)) # uses global RNG
-            result[i+1], result[i] = land_indices[r_num]
+        result[1::2] = land_indices[r_nums, 0]
+        result[0::2] = land_indices[r_nums, 1]
 
         return result
 
@@ -446,54 +527,62 @@ class World(object):
         return self.layers['elevation'].thresholds[mi][1]
 
 
+    # the values of elevation_band(): mountains are more than the mountain
+    # level high, low mountains less than 2 above it, high ones more than 4
+    ELEVATION_BANDS = ['ocean', 'land', 'hill', 'low mountain', 'mountain', 'high mountain']
+
+    def elevation_band(self):
+        """
+        The index in ELEVATION_BANDS of the band of every cell, computed once
+        until the elevation or the ocean are set again.
+        """
+        def compute():
+            elevation = self.layers['elevation'].data
+            if len(self.layers['elevation'].thresholds) == 4:
+                hi = 1
+            else:
+                hi = 0
+            hill_level = self.layers['elevation'].thresholds[hi][1]
+            mountain_level = self.layers['elevation'].thresholds[hi + 1][1]
+
+            band = numpy.ones(elevation.shape, dtype=numpy.uint8)
+            band[numpy.logical_and(hill_level < elevation, elevation < mountain_level)] = 2
+            mountain = elevation > mountain_level
+            band[mountain] = 4
+            band[numpy.logical_and(mountain, elevation < mountain_level + 2.0)] = 3
+            band[numpy.logical_and(mountain, elevation > mountain_level + 4.0)] = 5
+            band[self.layers['ocean'].data] = 0
+            return band
+        return self._cached('elevation_band', compute)
+
+    def mountain_levels(self):
+        """How high above the mountain level every cell is, 0 for the cells
+        below it, computed once until the elevation is set again"""
+        def compute():
+            elevation = self.layers['elevation'].data
+            mountain_level = self.get_mountain_level()
+            return numpy.where(elevation <= mountain_level, 0, elevation - mountain_level)
+        return self._cached('mountain_levels', compute)
+
     def is_mountain(self, pos):
-        if self.is_ocean(pos):
-            return False
         x, y = pos
-
-        return self.layers['elevation'].data[y][x] > self.get_mountain_level()
+        return self.elevation_band()[y, x] >= 3
 
     def is_low_mountain(self, pos):
-        if not self.is_mountain(pos):
-            return False
-        if len(self.layers['elevation'].thresholds) == 4:
-            mi = 2
-        else:
-            mi = 1
-        mountain_level = self.layers['elevation'].thresholds[mi][1]
         x, y = pos
-        return self.layers['elevation'].data[y, x] < mountain_level + 2.0
+        return self.elevation_band()[y, x] == 3
 
     def level_of_mountain(self, pos):
-        mountain_level = self.get_mountain_level()
         x, y = pos
-        if self.layers['elevation'].data[y, x] <= mountain_level:
-            return 0
-        else:
-            return self.layers['elevation'].data[y, x] - mountain_level
+        return self.mountain_levels()[y, x]
 
     def is_high_mountain(self, pos):
-        if not self.is_mountain(pos):
-            return False
-        if len(self.layers['elevation'].thresholds) == 4:
-            mi = 2
-        else:
-            mi = 1
-        mountain_level = self.layers['elevation'].thresholds[mi][1]
         x, y = pos
-        return self.layers['elevation'].data[y, x] > mountain_level + 4.0
+        return self.elevation_band()[y, x] == 5
 
     def is_hill(self, pos):
-        if self.is_ocean(pos):
-            return False
-        if len(self.layers['elevation'].thresholds) == 4:
-            hi = 1
-        else:
-            hi = 0
-        hill_level = self.layers['elevation'].thresholds[hi][1]
-        mountain_level = self.layers['elevation'].thresholds[hi + 1][1]
         x, y = pos
-        return hill_level < self.layers['elevation'].data[y, x] < mountain_level
+        return self.elevation_band()[y, x] == 2
 
     def elevation_at(self, pos):
         return self.layers['elevation'].data[pos[1], pos[0]]
@@ -513,52 +602,46 @@ class World(object):
     # Temperature
     #
 
+    # the values of temperature_class(), 7 being no band
+    TEMPERATURE_BANDS = ['polar', 'alpine', 'boreal', 'cool', 'warm', 'subtropical', 'tropical']
+
+    def temperature_class(self):
+        """
+        The index in TEMPERATURE_BANDS of the band of every cell, computed once
+        until the temperature is set again. If the thresholds are not sorted a
+        cell is in the first band it could be in.
+        """
+        return self._cached('temperature_class', lambda: _band_index(
+            self.layers['temperature'].data,
+            [th for _, th in self.layers['temperature'].thresholds[:-1]]))
+
     def is_temperature_polar(self, pos):
-        th_max = self.layers['temperature'].thresholds[0][1]
         x, y = pos
-        t = self.layers['temperature'].data[y, x]
-        return t < th_max
+        return self.temperature_class()[y, x] == 0
 
     def is_temperature_alpine(self, pos):
-        th_min = self.layers['temperature'].thresholds[0][1]
-        th_max = self.layers['temperature'].thresholds[1][1]
         x, y = pos
-        t = self.layers['temperature'].data[y, x]
-        return th_max > t >= th_min
+        return self.temperature_class()[y, x] == 1
 
     def is_temperature_boreal(self, pos):
-        th_min = self.layers['temperature'].thresholds[1][1]
-        th_max = self.layers['temperature'].thresholds[2][1]
         x, y = pos
-        t = self.layers['temperature'].data[y, x]
-        return th_max > t >= th_min
+        return self.temperature_class()[y, x] == 2
 
     def is_temperature_cool(self, pos):
-        th_min = self.layers['temperature'].thresholds[2][1]
-        th_max = self.layers['temperature'].thresholds[3][1]
         x, y = pos
-        t = self.layers['temperature'].data[y, x]
-        return th_max > t >= th_min
+        return self.temperature_class()[y, x] == 3
 
     def is_temperature_warm(self, pos):
-        th_min = self.layers['temperature'].thresholds[3][1]
-        th_max = self.layers['temperature'].thresholds[4][1]
         x, y = pos
-        t = self.layers['temperature'].data[y, x]
-        return th_max > t >= th_min
+        return self.temperature_class()[y, x] == 4
 
     def is_temperature_subtropical(self, pos):
-        th_min = self.layers['temperature'].thresholds[4][1]
-        th_max = self.layers['temperature'].thresholds[5][1]
         x, y = pos
-        t = self.layers['temperature'].data[y, x]
-        return th_max > t >= th_min
+        return self.temperature_class()[y, x] == 5
 
     def is_temperature_tropical(self, pos):
-        th_min = self.layers['temperature'].thresholds[5][1]
         x, y = pos
-        t = self.layers['temperature'].data[y, x]
-        return t >= th_min
+        return self.temperature_class()[y, x] == 6
 
     def temperature_at(self, pos):
         x, y = pos
@@ -581,59 +664,51 @@ class World(object):
         t = self.layers['humidity'].data[y, x]
         return t >= th
 
+    # the values of humidity_class(), 8 being no band
+    HUMIDITY_BANDS = ['superarid', 'perarid', 'arid', 'semiarid', 'subhumid', 'humid',
+                      'perhumid', 'superhumid']
+
+    def humidity_class(self):
+        """
+        The index in HUMIDITY_BANDS of the band of every cell, bounded by the
+        HUMIDITY_QUANTILES, computed once until the humidity is set again. If
+        the quantiles are not sorted a cell is in the first band it could be in.
+        """
+        return self._cached('humidity_class', lambda: _band_index(
+            self.layers['humidity'].data,
+            [self.layers['humidity'].quantiles[q] for q in HUMIDITY_QUANTILES]))
+
     def is_humidity_superarid(self, pos):
-        th_max = self.layers['humidity'].quantiles['87']
         x, y = pos
-        t = self.layers['humidity'].data[y, x]
-        return t < th_max
+        return self.humidity_class()[y, x] == 0
 
     def is_humidity_perarid(self, pos):
-        th_min = self.layers['humidity'].quantiles['87']
-        th_max = self.layers['humidity'].quantiles['75']
         x, y = pos
-        t = self.layers['humidity'].data[y, x]
-        return th_max > t >= th_min
+        return self.humidity_class()[y, x] == 1
 
     def is_humidity_arid(self, pos):
-        th_min = self.layers['humidity'].quantiles['75']
-        th_max = self.layers['humidity'].quantiles['62']
         x, y = pos
-        t = self.layers['humidity'].data[y, x]
-        return th_max > t >= th_min
+        return self.humidity_class()[y, x] == 2
 
     def is_humidity_semiarid(self, pos):
-        th_min = self.layers['humidity'].quantiles['62']
-        th_max = self.layers['humidity'].quantiles['50']
         x, y = pos
-        t = self.layers['humidity'].data[y, x]
-        return th_max > t >= th_min
+        return self.humidity_class()[y, x] == 3
 
     def is_humidity_subhumid(self, pos):
-        th_min = self.layers['humidity'].quantiles['50']
-        th_max = self.layers['humidity'].quantiles['37']
         x, y = pos
-        t = self.layers['humidity'].data[y, x]
-        return th_max > t >= th_min
+        return self.humidity_class()[y, x] == 4
 
     def is_humidity_humid(self, pos):
-        th_min = self.layers['humidity'].quantiles['37']
-        th_max = self.layers['humidity'].quantiles['25']
         x, y = pos
-        t = self.layers['humidity'].data[y, x]
-        return th_max > t >= th_min
+        return self.humidity_class()[y, x] == 5
 
     def is_humidity_perhumid(self, pos):
-        th_min = self.layers['humidity'].quantiles['25']
-        th_max = self.layers['humidity'].quantiles['12']
         x, y = pos
-        t = self.layers['humidity'].data[y, x]
-        return th_max > t >= th_min
+        return self.humidity_class()[y, x] == 6
 
     def is_humidity_superhumid(self, pos):
-        th_min = self.layers['humidity'].quantiles['12']
         x, y = pos
-        t = self.layers['humidity'].data[y, x]
-        return t >= th_min
+        return self.humidity_class()[y, x] == 7
 
     #
     # Streams
@@ -670,18 +745,26 @@ class World(object):
 
     def biome_at(self, pos):
         x, y = pos
-        b = Biome.by_name(self.layers['biome'].data[y, x])
+        b = Biome.by_name(biome_index_names()[self.layers['biome'].data[y, x]])
         if b is None:
             raise Exception('Not found')
         return b
 
 
-    def is_iceland(self, pos):
-        for subclass in Iceland.__subclasses__():
-            if isinstance(self.biome_at(pos), subclass):
-                return True
+    def iceland_mask(self):
+        """Whether the biome of every cell is one of the Iceland group,
+        computed once until the biome is set again"""
+        def compute():
+            names = biome_index_names()
+            icy = numpy.zeros(len(names), dtype=bool)
+            for subclass in Iceland.__subclasses__():
+                icy[names.index(subclass.name())] = True
+            return icy[self.layers['biome'].data]
+        return self._cached('iceland_mask', compute)
 
-        return False
+    def is_iceland(self, pos):
+        x, y = pos
+        return self.iceland_mask()[y, x]
 
 
     #
@@ -712,6 +795,7 @@ class World(object):
                     "Expected %d x %d, found %d x %d" % (
                         self.width, self.height, data.shape[1], data.shape[0]))
             self.layers['elevation'] = LayerWithThresholds(data, thresholds)
+            self.layer_changed('elevation')
 
     @property
     def plates(self):
@@ -728,10 +812,19 @@ class World(object):
 
     @property
     def biome(self):
-        return self.layers['biome'].data
+        """The names of the biomes, see biome_indices for the layer itself.
+        The array is built once until the biome is set again and is read-only:
+        the biomes are changed through the setter."""
+        def compute():
+            names = numpy.array(biome_index_names(), dtype=object)[self.layers['biome'].data]
+            names.flags.writeable = False
+            return names
+        return self._cached('biome', compute)
 
     @biome.setter
     def biome(self, biome):
+        """Set either the names of the biomes or their indices in
+        biome_index_names(); the layer holds the indices"""
         if biome.shape[0] != self.height:
             raise Exception(
                 "Setting data with wrong height: biome has height %i while "
@@ -739,7 +832,26 @@ class World(object):
                     biome.shape[0], self.height))
         if biome.shape[1] != self.width:
             raise Exception("Setting data with wrong width")
-        self.layers['biome'] = Layer(biome)
+        names = biome_index_names()
+        if biome.dtype.kind in 'iu':
+            if biome.size and (biome.min() < 0 or biome.max() >= len(names)):
+                raise Exception("Biome indices out of range")
+            indices = biome.astype(numpy.uint8)
+        else:
+            found, inverse = numpy.unique(biome, return_inverse=True)
+            for name in found:
+                if name not in names:
+                    raise Exception("No biome named '%s'" % name)
+            lookup = numpy.array([names.index(name) for name in found], dtype=numpy.uint8)
+            indices = lookup[inverse].reshape(biome.shape)
+        self.layers['biome'] = Layer(indices)
+        self.layer_changed('biome')
+
+    @property
+    def biome_indices(self):
+        """The biome layer: the index of the biome of every cell in
+        biome_index_names()"""
+        return self.layers['biome'].data
 
     @property
     def ocean(self):
@@ -753,6 +865,21 @@ class World(object):
                 "found %d x %d" % (self.width, self.height,
                                    ocean.shape[1], ocean.shape[0]))
         self.layers['ocean'] = Layer(ocean)
+        self.layer_changed('ocean')
+
+    @property
+    def flood_level(self):
+        return self.layers['flood_level'].data
+
+    @flood_level.setter
+    def flood_level(self, data):
+        """The lowest sea level at which each cell is part of the ocean"""
+        if (data.shape[0] != self.height) or (data.shape[1] != self.width):
+            raise Exception(
+                "Setting flood level map with wrong dimension. Expected %d x %d, "
+                "found %d x %d" % (self.width, self.height,
+                                   data.shape[1], data.shape[0]))
+        self.layers['flood_level'] = Layer(data)
 
     @property
     def sea_depth(self):
@@ -802,6 +929,7 @@ class World(object):
             if data.shape[1] != self.width:
                 raise Exception("Setting data with wrong width")
             self.layers['humidity'] = LayerWithQuantiles(data, quantiles)
+            self.layer_changed('humidity')
 
     @property
     def irrigation(self):
@@ -831,6 +959,7 @@ class World(object):
             if data.shape[1] != self.width:
                 raise Exception("Setting data with wrong width")
             self.layers['temperature'] = LayerWithThresholds(data, thresholds)
+            self.layer_changed('temperature')
 
     @property
     def permeability(self):
@@ -897,6 +1026,9 @@ class World(object):
     def has_ocean(self):
         return 'ocean' in self.layers
 
+    def has_flood_level(self):
+        return 'flood_level' in self.layers
+
     def has_precipitations(self):
         return 'precipitation' in self.layers
 
@@ -0,0 +1,207 @@
+"""
+Whole-array simplex noise.
+
+The simulations used to call noise.snoise2 once per cell from nested Python
+loops. The functions in this module evaluate the same noise for a complete
+(height, width) grid with a handful of numpy operations.
+
+In exact mode (the default) every operation is carried out in single precision
+and in the same order as the C implementation of noise.snoise2, so the values
+are bit-for-bit identical to the per-pixel calls and existing seeds keep
+producing the same worlds. Passing exact=False evaluates the noise in double
+precision instead, which is smoother but no longer seed-compatible.
+
+With workers > 1 the grid is split into bands of rows which are evaluated by
+a pool of processes and written into a shared-memory array. Every cell is
+computed exactly as in the serial case, so the output is identical.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy
+
+# Permutation table and gradients used by the noise library (_noise.h)
+_PERM = numpy.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140,
+    36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120,
+    234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32, 57, 177, 33,
+    88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74, 165, 71,
+    134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122, 60, 211, 133,
+    230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161,
+    1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169, 200, 196, 135, 130,
+    116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226, 250,
+    124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59, 227,
+    47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44,
+    154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9, 129, 22, 39, 253, 19, 98,
+    108, 110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246, 97, 228, 251, 34,
+    242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14,
+    239, 107, 49, 192, 214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115, 121,
+    50, 45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114, 67, 29, 24, 72, 243,
+    141, 128, 195, 78, 66, 215, 61, 156, 180] * 2, dtype=numpy.int32)
+
+_GRAD3 = numpy.array([
+    [1, 1], [-1, 1], [1, -1], [-1, -1],
+    [1, 0], [-1, 0], [1, 0], [-1, 0],
+    [0, 1], [0, -1], [0, 1], [0, -1]])
+
+_F2 = 0.3660254037844386  # 0.5 * (sqrt(3.0) - 1.0)
+_G2 = 0.21132486540518713  # (3.0 - sqrt(3.0)) / 6.0
+
+
+def _noise2(x, y, dtype):
+    """Single octave of 2D simplex noise for arrays of coordinates."""
+
+    f2 = dtype(_F2)
+    g2 = dtype(_G2)
+    g2_2 = g2 * dtype(2.0)
+    grad = _GRAD3.astype(dtype)
+
+    s = (x + y) * f2
+    i = numpy.floor(x + s)
+    j = numpy.floor(y + s)
+    t = (i + j) * g2
+
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+
+    i1 = x0 > y0
+    j1 = numpy.logical_not(i1)
+
+    xs = (x0, (x0 - i1.astype(dtype)) + g2, (x0 + g2_2) - dtype(1.0))
+    ys = (y0, (y0 - j1.astype(dtype)) + g2, (y0 + g2_2) - dtype(1.0))
+
+    ii = i.astype(numpy.int32) & 255
+    jj = j.astype(numpy.int32) & 255
+    gs = (_PERM[ii + _PERM[jj]] % 12,
+          _PERM[ii + i1 + _PERM[jj + j1]] % 12,
+          _PERM[ii + 1 + _PERM[jj + 1]] % 12)
+
+    total = None
+    for xc, yc, gc in zip(xs, ys, gs):
+        f = (dtype(0.5) - xc * xc) - yc * yc
+        n = f * f * f * f * (grad[gc, 0] * xc + grad[gc, 1] * yc)
+        n[f <= 0] = 0
+        total = n if total is None else total + n
+
+    return total * dtype(70.0)
+
+
+def snoise2_array(x, y, octaves=1, persistence=0.5, lacunarity=2.0,
+                  base=0.0, exact=True):
+    """
+    Vectorized counterpart of noise.snoise2 (without the repeat parameters).
+    x and y are arrays of the same shape, the result is a float array of that
+    shape. In exact mode the values equal the ones snoise2 returns for each
+    pair of coordinates.
+    """
+
+    if octaves <= 0:
+        raise ValueError("Expected octaves value > 0")
+
+    dtype = numpy.float32 if exact else numpy.float64
+    x = numpy.asarray(x, dtype=dtype)
+    y = numpy.asarray(y, dtype=dtype)
+    z = dtype(base)
+    persistence = dtype(persistence)
+    lacunarity = dtype(lacunarity)
+
+    freq = dtype(1.0)
+    amp = dtype(1.0)
+    max_amp = dtype(1.0)
+    total = _noise2(x + z, y + z, dtype)
+    for i in range(1, octaves):
+        freq *= lacunarity
+        amp *= persistence
+        max_amp += amp
+        total += _noise2(x * freq + z, y * freq + z, dtype) * amp
+
+    return (total / max_amp).astype(numpy.float64)
+
+
+def noise_field(width, height, freq, octaves, base, scale=1.0,
+                border=None, border_inclusive=False, rows=None, exact=True,
+                workers=1):
+    """
+    Evaluate simplex noise over a whole grid. Cell (y, x) holds
+
+        snoise2((x * scale) / freq, (y * scale) / freq, octaves, base=base)
+
+    If border is given the columns left of it are blended with the noise
+    found one map-width further to the right, so that the pattern wraps around
+    the left and right edges:
+
+        n * x / border + n' * (border - x) / border
+
+    where n' is the noise at ((x * scale) + width) / freq. The blending covers
+    x < border, or x <= border if border_inclusive is set.
+
+    rows can be a (first, last) pair to only compute the band of rows
+    first <= y < last; the result then has last - first rows.
+
+    workers > 1 spreads the rows over that many processes.
+    """
+
+    first, last = (0, height) if rows is None else rows
+
+    if workers > 1 and last - first > 1:
+        return _parallel_noise_field(
+            (width, height, freq, octaves, base, scale, border, border_inclusive),
+            first, last, exact, workers)
+
+    xs = numpy.arange(width, dtype=numpy.float64) * scale
+    ys = numpy.arange(first, last, dtype=numpy.float64) * scale
+    xx, yy = numpy.meshgrid(xs / freq, ys / freq)
+
+    result = snoise2_array(xx, yy, octaves, base=base, exact=exact)
+
+    if border is not None:
+        x = numpy.arange(width, dtype=numpy.float64)
+        if border_inclusive:
+            blended = x <= border
+        else:
+            blended = x < border
+        if blended.any():
+            x = x[blended]
+            xx_off, yy_off = numpy.meshgrid((xs[blended] + width) / freq, ys / freq)
+            offset = snoise2_array(xx_off, yy_off, octaves, base=base, exact=exact)
+            result[:, blended] = (result[:, blended] * x / border) + \
+                (offset * (border - x) / border)
+
+    return result
+
+
+def _noise_band(shm_name, shape, offset, first, last, args, exact):
+    """Compute the rows first <= y < last and store them in shared memory"""
+
+    shm = SharedMemory(name=shm_name)
+    try:
+        out = numpy.ndarray(shape, dtype=numpy.float64, buffer=shm.buf)
+        out[first - offset:last - offset] = noise_field(
+            *args, rows=(first, last), exact=exact)
+        del out
+    finally:
+        shm.close()
+
+
+def _parallel_noise_field(args, first, last, exact, workers):
+    width = args[0]
+    shape = (last - first, width)
+    bounds = numpy.linspace(first, last, min(workers, last - first) + 1).astype(int)
+
+    shm = SharedMemory(create=True, size=shape[0] * shape[1] * 8)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_noise_band, shm.name, shape, first,
+                                       bounds[i], bounds[i + 1], args, exact)
+                       for i in range(len(bounds) - 1)]
+            for future in futures:
+                future.result()
+        out = numpy.ndarray(shape, dtype=numpy.float64, buffer=shm.buf)
+        result = out.copy()
+        del out
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return result
@@ -6,7 +6,7 @@ import platec
 import numpy
 
 from worldengine.generation import Step, add_noise_to_elevation, center_land, generate_world, \
-    get_verbose, initialize_ocean_and_thresholds, place_oceans_at_map_borders
+    get_verbose, initialize_ocean_and_thresholds, place_oceans_at_map_borders, flood_level
 from worldengine.model.world import World, Size, GenerationParameters
 
 
@@ -52,10 +52,10 @@ def _plates_simulation(name, width, height, seed, temps=
     return world
 
 
-def world_gen(name, width, height, seed, temps=[.874, .765, .594, .439, .366, .124],
-              humids=[.941, .778, .507, .236, 0.073, .014, .002], num_plates=10,
-              ocean_level=1.0, step=Step.full(), gamma_curve=1.25, curve_offset=.2,
-              fade_borders=True, verbose=get_verbose()):
+def _world_elevation(name, width, height, seed, temps, humids, num_plates,
+                     ocean_level, step, gamma_curve, curve_offset, fade_borders,
+                     verbose, workers):
+    """Everything world_gen does before the ocean is placed"""
     if verbose:
         start_time = time.time()
     world = _plates_simulation(name, width, height, seed, temps, humids, gamma_curve,
@@ -69,20 +69,82 @@ def world_gen(name, width, height, seed, temps=[.874, .765, .594, .439, .366, .1
 
     if verbose:
         start_time = time.time()
-    add_noise_to_elevation(world, numpy.random.randint(0, 4096))  # uses the global RNG; this is the very first call to said RNG - should that change, this needs to be taken care of
+    add_noise_to_elevation(world, numpy.random.randint(0, 4096), workers)  # uses the global RNG; this is the very first call to said RNG - should that change, this needs to be taken care of
     if verbose:
         elapsed_time = time.time() - start_time
         print("...plates.world_gen: elevation noise added. Elapsed time " +
               str(elapsed_time) + " seconds.")
 
-    if verbose:
-        start_time = time.time()
     if fade_borders:
         place_oceans_at_map_borders(world)
-    initialize_ocean_and_thresholds(world)
+
+    return world
+
+
+def world_gen(name, width, height, seed, temps=[.874, .765, .594, .439, .366, .124],
+              humids=[.941, .778, .507, .236, 0.073, .014, .002], num_plates=10,
+              ocean_level=1.0, step=Step.full(), gamma_curve=1.25, curve_offset=.2,
+              fade_borders=True, verbose=get_verbose(), workers=1,
+              fill_depressions=False, watermap='droplets'):
+    world = _world_elevation(name, width, height, seed, temps, humids, num_plates,
+                             ocean_level, step, gamma_curve, curve_offset, fade_borders,
+                             verbose, workers)
+
+    if verbose:
+        start_time = time.time()
+    initialize_ocean_and_thresholds(world, ocean_level)
     if verbose:
         elapsed_time = time.time() - start_time
         print("...plates.world_gen: oceans initialized. Elapsed time " +
               str(elapsed_time) + " seconds.")
 
-    return generate_world(world, step)
+    return generate_world(world, step, workers, fill_depressions, watermap)
+
+
+def world_gen_ocean_levels(name, width, height, seed, ocean_levels,
+                           temps=[.874, .765, .594, .439, .366, .124],
+                           humids=[.941, .778, .507, .236, 0.073, .014, .002],
+                           num_plates=10, step=Step.full(), gamma_curve=1.25,
+                           curve_offset=.2, fade_borders=True, verbose=get_verbose(),
+                           workers=1, fill_depressions=False, watermap='droplets'):
+    """
+    Generate the same world for several ocean levels. The plates simulation
+    and the elevation noise are run only once, as is the calculation of the
+    flood level which makes placing the ocean a single comparison per level.
+    The worlds are yielded one at a time, each one equal to what world_gen
+    would produce for that ocean level apart from the additional flood level
+    layer.
+    """
+    world = _world_elevation(name, width, height, seed, temps, humids, num_plates,
+                             ocean_levels[0], step, gamma_curve, curve_offset,
+                             fade_borders, verbose, workers)
+
+    if verbose:
+        start_time = time.time()
+    level = flood_level(world.elevation)
+    if verbose:
+        elapsed_time = time.time() - start_time
+        print("...plates.world_gen_ocean_levels: flood level calculated. Elapsed time " +
+              str(elapsed_time) + " seconds.")
+
+    # every world has to continue from the same state of the global RNG
+    rng_state = numpy.random.get_state()
+
+    for ocean_level in ocean_levels:
+        w = World(name, Size(width, height), seed,
+                  GenerationParameters(num_plates, ocean_level, step),
+                  temps, humids, gamma_curve, curve_offset)
+        w.elevation = (world.elevation.copy(), None)
+        w.plates = world.plates.copy()
+        w.flood_level = level
+
+        numpy.random.set_state(rng_state)
+        if verbose:
+            start_time = time.time()
+        initialize_ocean_and_thresholds(w, ocean_level)
+        if verbose:
+            elapsed_time = time.time() - start_time
+            print("...plates.world_gen_ocean_levels: oceans initialized for level %f. "
+                  "Elapsed time %f seconds." % (ocean_level, elapsed_time))
+
+        yield generate_world(w, step, workers, fill_depressions, watermap)
@@ -45,6 +45,14 @@ def find_threshold(map_data, land_percentage, ocean=None):#never used anywhere?
 
 
 def find_threshold_f(map_data, land_perc, ocean=None, max=1000.0, mindist=0.005):
+    return find_thresholds(map_data, [land_perc], ocean, max=max, mindist=mindist)[0]
+
+
+def sorted_values(map_data, ocean=None):
+    """
+    Return the values of map_data which are not masked (nor ocean, if given)
+    as a sorted one-dimensional array.
+    """
     height, width = map_data.shape
 
     #maybe map was already masked when we got it; if not, this will make sure we operate on a mask
@@ -58,28 +66,65 @@ def find_threshold_f(map_data, land_perc, ocean=None, max=1000.0, mindist=0.005)
                     width, height, ocean.shape[1], ocean.shape[0]))
         mask = numpy.ma.array(mask, mask=ocean, keep_mask=True)
 
+    return numpy.sort(mask.compressed(), axis=None)
+
+
+def find_thresholds(map_data, percentages, ocean=None, exact=True, max=1000.0, mindist=0.005,
+                    values=None):
+    """
+    Find, for each of the given percentages, the threshold which has that
+    percentage of the (non-ocean) cells above it.
+
+    The unmasked values are sorted once and every threshold is derived from
+    the sorted values. With exact set the thresholds are the ones the original
+    bisection over [-max, max] finds (counting the cells above a probe is now
+    a binary search in the sorted values), otherwise they are taken directly
+    from the sorted values.
+
+    values can be passed the result of sorted_values(map_data, ocean) if it is
+    already known, in which case map_data and ocean are not looked at.
+    """
+    if values is None:
+        values = sorted_values(map_data, ocean)
+    all_land = len(values)
+
     def count(e):
-        return numpy.ma.masked_less_equal(mask, e).count()
+        # the number of values greater than e
+        return all_land - numpy.searchsorted(values, e, side='right')
 
     def search(a, b, desired):
-        if a == b:
-            return a
-        if abs(b - a) < mindist:
-            ca = count(a)
-            cb = count(b)
-            dista = abs(desired - ca)
-            distb = abs(desired - cb)
-            if dista < distb:
+        while True:
+            if a == b:
                 return a
+            if abs(b - a) < mindist:
+                ca = count(a)
+                cb = count(b)
+                dista = abs(desired - ca)
+                distb = abs(desired - cb)
+                if dista < distb:
+                    return a
+                else:
+                    return b
+            m = (a + b) / 2.0
+            cm = count(m)
+            if desired < cm:
+                a = m
             else:
-                return b
-        m = (a + b) / 2.0
-        cm = count(m)
-        if desired < cm:
-            return search(m, b, desired)
-        else:
-            return search(a, m, desired)
+                b = m
 
-    all_land = mask.count()
-    desired_land = all_land * land_perc
-    return search(-1*max, max, desired_land)
+    def direct(desired):
+        above = int(round(desired))
+        if all_land == 0:
+            return -1 * max
+        if above >= all_land:
+            return numpy.nextafter(values[0], -numpy.inf)
+        return values[all_land - above - 1]
+
+    thresholds = []
+    for land_perc in percentages:
+        desired_land = all_land * land_perc
+        if exact:
+            thresholds.append(search(-1 * max, max, desired_land))
+        else:
+            thresholds.append(direct(desired_land))
+    return thresholds
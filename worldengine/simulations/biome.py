@@ -1,5 +1,32 @@
 import numpy
 
+from worldengine.biome import biome_index_names
+from worldengine.model.world import HUMIDITY_QUANTILES
+
+
+# For every temperature band the biomes from the driest to the wettest. The
+# last entry of a band also takes every humidity above the previous ones.
+BIOMES_BY_TEMPERATURE = [
+    ('polar', ['polar desert', 'ice']),
+    ('alpine', ['subpolar dry tundra', 'subpolar moist tundra', 'subpolar wet tundra',
+                'subpolar rain tundra']),
+    ('boreal', ['boreal desert', 'boreal dry scrub', 'boreal moist forest',
+                'boreal wet forest', 'boreal rain forest']),
+    ('cool', ['cool temperate desert', 'cool temperate desert scrub', 'cool temperate steppe',
+              'cool temperate moist forest', 'cool temperate wet forest',
+              'cool temperate rain forest']),
+    ('warm', ['warm temperate desert', 'warm temperate desert scrub',
+              'warm temperate thorn scrub', 'warm temperate dry forest',
+              'warm temperate moist forest', 'warm temperate wet forest',
+              'warm temperate rain forest']),
+    ('subtropical', ['subtropical desert', 'subtropical desert scrub',
+                     'subtropical thorn woodland', 'subtropical dry forest',
+                     'subtropical moist forest', 'subtropical wet forest',
+                     'subtropical rain forest']),
+    ('tropical', ['tropical desert', 'tropical desert scrub', 'tropical thorn woodland',
+                  'tropical very dry forest', 'tropical dry forest', 'tropical moist forest',
+                  'tropical wet forest', 'tropical rain forest'])
+]
 
 class BiomeSimulation(object):
 
@@ -10,108 +37,41 @@ class BiomeSimulation(object):
     @staticmethod
     def execute(world, seed):
         assert seed is not None
-        w = world
-        width = world.width
-        height = world.height
         ocean = world.layers['ocean'].data
         cm = {}
+
+        t = world.temperature_class()
+        h = world.humidity_class()
+
+        # a table of the biome index of all the (temperature band, humidity
+        # band) combinations; within a temperature band the humidity tests
+        # stop at its last biome, cells in no band are bare rock
+        names = biome_index_names()
+        table = numpy.empty((len(BIOMES_BY_TEMPERATURE) + 1, len(HUMIDITY_QUANTILES) + 2),
+                            dtype=numpy.uint8)
+        table[:] = names.index('bare rock')
+        for i, (_, biomes) in enumerate(BIOMES_BY_TEMPERATURE):
+            for j in range(table.shape[1]):
+                table[i, j] = names.index(biomes[min(j, len(biomes) - 1)])
+
+        index = table[t, h]
+        index[ocean] = names.index('ocean')
+        world.biome = index
+
+        # count the biomes in the order in which they first appear, looking
+        # for the first cells only until all the biomes found are seen
+        flat = index.ravel()
+        counts = numpy.bincount(flat, minlength=len(names))
+        first = {}
+        chunk_size = 1 << 16
+        for start in range(0, flat.size, chunk_size):
+            chunk = flat[start:start + chunk_size]
+            for i in numpy.nonzero(numpy.bincount(chunk, minlength=len(names)))[0]:
+                if i not in first:
+                    first[i] = start + numpy.argmax(chunk == i)
+            if len(first) == numpy.count_nonzero(counts):
+                break
         biome_cm = {}
-        # this is still kind of expensive memory-wise
-        biome = numpy.zeros((height, width), dtype=object)
-        for y in range(height):
-            for x in range(width):
-                if ocean[y, x]:
-                    biome[y, x] = 'ocean'
-                else:
-                    if w.is_temperature_polar((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = 'polar desert'
-                        else:
-                            biome[y, x] = 'ice'
-                    elif w.is_temperature_alpine((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = 'subpolar dry tundra'
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = 'subpolar moist tundra'
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = 'subpolar wet tundra'
-                        else:
-                            biome[y, x] = 'subpolar rain tundra'
-                    elif w.is_temperature_boreal((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = 'boreal desert'
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = 'boreal dry scrub'
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = 'boreal moist forest'
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = 'boreal wet forest'
-                        else:
-                            biome[y, x] = 'boreal rain forest'
-                    elif w.is_temperature_cool((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = 'cool temperate desert'
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = 'cool temperate desert scrub'
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = 'cool temperate steppe'
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = 'cool temperate moist forest'
-                        elif w.is_humidity_subhumid((x, y)):
-                            biome[y, x] = 'cool temperate wet forest'
-                        else:
-                            biome[y, x] = 'cool temperate rain forest'
-                    elif w.is_temperature_warm((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = 'warm temperate desert'
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = 'warm temperate desert scrub'
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = 'warm temperate thorn scrub'
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = 'warm temperate dry forest'
-                        elif w.is_humidity_subhumid((x, y)):
-                            biome[y, x] = 'warm temperate moist forest'
-                        elif w.is_humidity_humid((x, y)):
-                            biome[y, x] = 'warm temperate wet forest'
-                        else:
-                            biome[y, x] = 'warm temperate rain forest'
-                    elif w.is_temperature_subtropical((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = 'subtropical desert'
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = 'subtropical desert scrub'
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = 'subtropical thorn woodland'
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = 'subtropical dry forest'
-                        elif w.is_humidity_subhumid((x, y)):
-                            biome[y, x] = 'subtropical moist forest'
-                        elif w.is_humidity_humid((x, y)):
-                            biome[y, x] = 'subtropical wet forest'
-                        else:
-                            biome[y, x] = 'subtropical rain forest'
-                    elif w.is_temperature_tropical((x, y)):
-                        if w.is_humidity_superarid((x, y)):
-                            biome[y, x] = 'tropical desert'
-                        elif w.is_humidity_perarid((x, y)):
-                            biome[y, x] = 'tropical desert scrub'
-                        elif w.is_humidity_arid((x, y)):
-                            biome[y, x] = 'tropical thorn woodland'
-                        elif w.is_humidity_semiarid((x, y)):
-                            biome[y, x] = 'tropical very dry forest'
-                        elif w.is_humidity_subhumid((x, y)):
-                            biome[y, x] = 'tropical dry forest'
-                        elif w.is_humidity_humid((x, y)):
-                            biome[y, x] = 'tropical moist forest'
-                        elif w.is_humidity_perhumid((x, y)):
-                            biome[y, x] = 'tropical wet forest'
-                        else:
-                            biome[y, x] = 'tropical rain forest'
-                    else:
-                        biome[y, x] = 'bare rock'
-                if not biome[y, x] in biome_cm:
-                    biome_cm[biome[y, x]] = 0
-                biome_cm[biome[y, x]] += 1
-        w.biome = biome
+        for i in sorted(first, key=first.get):
+            biome_cm[names[i]] = int(counts[i])
         return cm, biome_cm
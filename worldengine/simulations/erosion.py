@@ -1,3 +1,4 @@
+import heapq
 import math
 import numpy
 import worldengine.astar
@@ -18,6 +19,9 @@ DIR_NEIGHBORS_CENTER = [CENTER, NORTH, EAST, SOUTH, WEST]
 
 RIVER_TH = 0.02
 
+# no river seed is placed within this distance from another one
+SEED_DISTANCE = 9
+
 
 def overflow(value, max_value):
     return value % max_value
@@ -28,9 +32,162 @@ def in_circle(radius, center_x, center_y, x, y):
     return square_dist <= radius ** 2
 
 
+def _downstream(water_path):
+    """
+    The flat index of the cell each cell flows to, -1 for the cells without
+    flow direction.
+    """
+    height, width = water_path.shape
+    steps = numpy.array([dx + dy * width for dx, dy in DIR_NEIGHBORS_CENTER])
+    downstream = numpy.arange(height * width) + steps[water_path.ravel()]
+    downstream[water_path.ravel() == 0] = -1
+    return downstream
+
+
+def _first_downstream(downstream, marked):
+    """
+    For every cell the flat index of the first marked cell strictly
+    downstream of it, -1 if there is none. The paths are followed by
+    doubling the number of steps at each iteration.
+    """
+    has_next = downstream >= 0
+    ahead = downstream.copy()
+    first = numpy.full(len(downstream), -1)
+    first[has_next] = numpy.where(marked[downstream[has_next]], downstream[has_next], -1)
+
+    pending = numpy.nonzero(numpy.logical_and(first < 0, has_next))[0]
+    while len(pending):
+        jump = ahead[pending]
+        first[pending] = first[jump]
+        ahead[pending] = ahead[jump]
+        pending = pending[numpy.logical_and(first[pending] < 0, ahead[pending] >= 0)]
+    return first
+
+
+def _flow_accumulation(downstream, values):
+    """
+    Sum the values of every cell and of all the cells flowing into it. The
+    cells are visited in topological order, a front of cells whose upstream
+    cells are all done at a time.
+    """
+    accumulated = numpy.array(values, dtype=float)
+    upstream = numpy.bincount(downstream[downstream >= 0], minlength=len(downstream))
+
+    front = numpy.nonzero(upstream == 0)[0]
+    while len(front):
+        front = front[downstream[front] >= 0]
+        targets = downstream[front]
+        numpy.add.at(accumulated, targets, accumulated[front])
+        numpy.subtract.at(upstream, targets, 1)
+        targets = numpy.unique(targets)
+        front = targets[upstream[targets] == 0]
+    return accumulated
+
+
+def _index_rivers(world, river_list):
+    """
+    Grids with, for every cell, the first river of the list passing through
+    it (-1 for none) and the position of the cell in that river.
+    """
+    river_ids = numpy.full((world.height, world.width), -1, dtype=int)
+    river_positions = numpy.zeros((world.height, world.width), dtype=int)
+    river_index = (river_ids, river_positions)
+    for river_id, river in enumerate(river_list):
+        _add_to_river_index(river_index, river, river_id)
+    return river_index
+
+
+def _add_to_river_index(river_index, river, river_id):
+    """Record the cells of a river not already taken by a previous one"""
+    river_ids, river_positions = river_index
+    xs, ys = numpy.array(river, dtype=int).reshape(-1, 2).T
+    cells, first = numpy.unique(ys * river_ids.shape[1] + xs, return_index=True)
+    free = river_ids.ravel()[cells] < 0
+    river_ids.ravel()[cells[free]] = river_id
+    river_positions.ravel()[cells[free]] = first[free]
+
+
+def _priority_flood(elevation, ocean, wrap=True):
+    """
+    Fill the depressions of the map, flooding it from the ocean with a
+    priority queue: the lowest cell reached so far is always expanded first
+    and the neighbours below it are raised to its level.
+
+    Returns (filled, receivers, lakes): the filled elevation, for every cell
+    the flat index of the cell it was reached from (-1 for the ocean), and
+    the id of the depression each cell belongs to (-1 if not flooded). The
+    receivers form a tree leading every cell to the ocean without ever going
+    up in the filled elevation, so the way out of a depression passes through
+    its spill point.
+    """
+    height, width = elevation.shape
+    size = height * width
+    levels = elevation.ravel().tolist()
+    filled = list(levels)
+    receivers = [-1] * size
+    lakes = [-1] * size
+    done = bytearray(size)
+
+    y, x = numpy.divmod(numpy.arange(size), width)
+    neighbours = []
+    for dx, dy in DIR_NEIGHBORS:
+        nx, ny = x + dx, y + dy
+        inside = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+        n = overflow(ny, height) * width + overflow(nx, width)
+        if not wrap:
+            n[~inside] = -1
+        neighbours.append(n)
+
+    # the flood starts from the coast, the rest of the ocean is never entered
+    ocean = ocean.ravel()
+    neighbours = numpy.array(neighbours).T
+    near_land = numpy.zeros(size, dtype=bool)
+    for n in neighbours.T:
+        near_land[n >= 0] |= ~ocean[n[n >= 0]]
+    seeds = numpy.nonzero(ocean & near_land)[0].tolist()
+    if ocean.any():
+        done = bytearray(ocean.astype(numpy.uint8).tobytes())
+    else:
+        seeds = [int(numpy.argmin(elevation))]  # flood from the lowest cell
+        done[seeds[0]] = 1
+    neighbours = neighbours.tolist()
+    # the counter keeps cells at the same level in the order they were reached
+    queue = [(levels[lid], i, lid) for i, lid in enumerate(seeds)]
+    heapq.heapify(queue)
+    counter = len(queue)
+    n_lakes = 0
+
+    while queue:
+        level, _, lid = heapq.heappop(queue)
+        for n in neighbours[lid]:
+            if n < 0 or done[n]:
+                continue
+            done[n] = 1
+            receivers[n] = lid
+            if levels[n] < level:  # flooded
+                filled[n] = level
+                if lakes[lid] < 0:
+                    lakes[lid] = n_lakes  # not a lake cell: the spill point
+                    n_lakes += 1
+                lakes[n] = lakes[lid]
+            counter += 1
+            heapq.heappush(queue, (filled[n], counter, n))
+
+    filled = numpy.array(filled).reshape(height, width)
+    lakes = numpy.array(lakes).reshape(height, width)
+    # the spill points were only used to share the id with the lake cells
+    lakes[filled == elevation] = -1
+    return filled, numpy.array(receivers), lakes
+
+
 class ErosionSimulation(object):
-    def __init__(self):
+    def __init__(self, fill_depressions=False):
         self.wrap = True
+        # use a priority-flood to find the way out of the depressions, instead
+        # of searching a lower cell nearby and a path to it
+        self.fill_depressions = fill_depressions
+        # the searches for a way around the obstacles met by rivers
+        self.path_finder = worldengine.astar.PathFinder()
 
     def execute(self, world, seed):
         water_flow = numpy.zeros((world.height, world.width))
@@ -47,9 +204,16 @@ class ErosionSimulation(object):
         river_sources = self.river_sources(world, water_flow, water_path)
 
         # step three: for each source, find a path to sea
+        river_index = _index_rivers(world, river_list)
+        depressions = None
+        if self.fill_depressions:
+            depressions = _priority_flood(world.layers['elevation'].data,
+                                          world.layers['ocean'].data, self.wrap)
         for source in river_sources:
-            river = self.river_flow(source, world, river_list, lake_list)
+            river = self.river_flow(source, world, river_list, lake_list, river_index,
+                                    depressions)
             if river:
+                _add_to_river_index(river_index, river, len(river_list))
                 river_list.append(river)
                 self.cleanUpFlow(river, world)
                 rx, ry = river[-1]  # find last cell in river
@@ -67,25 +231,72 @@ class ErosionSimulation(object):
             lx, ly = lake
             lake_map[ly, lx] = 0.1  # TODO: make this based on rainfall/flow
 
+        # the rivers have carved their way out of the depressions they passed
+        # through, what is left of them is found on the eroded elevation: the
+        # depressions along the rivers are filled up to their spill point and
+        # the lake map holds the depth of the water
+        if depressions is not None:
+            elevation = world.layers['elevation'].data
+            filled, _, lakes = _priority_flood(elevation, world.layers['ocean'].data,
+                                               self.wrap)
+            lake_cells = numpy.isin(lakes, lakes[self._along_rivers(world, river_list)])
+            lake_cells &= lakes >= 0
+            lake_map[lake_cells] = (filled - elevation)[lake_cells]
+
         world.rivermap = river_map
         world.lakemap = lake_map
+        world.layer_changed('elevation')  # eroded in place
+
+    def _along_rivers(self, world, river_list):
+        """The cells of the rivers and their neighbours"""
+        on_river = numpy.zeros((world.height, world.width), dtype=bool)
+        for river in river_list:
+            xs, ys = numpy.array(river, dtype=int).reshape(-1, 2).T
+            on_river[ys, xs] = True
+        along = on_river.copy()
+        for dx, dy in DIR_NEIGHBORS:
+            shifted = numpy.roll(on_river, (dy, dx), axis=(0, 1))
+            if not self.wrap:  # nothing comes in across the border
+                if dy:
+                    shifted[0 if dy > 0 else -1, :] = False
+                if dx:
+                    shifted[:, 0 if dx > 0 else -1] = False
+            along |= shifted
+        return along
 
     def find_water_flow(self, world, water_path):
         """Find the flow direction for each cell in heightmap"""
 
-        # iterate through each cell
-        for x in range(world.width - 1):
-            for y in range(world.height - 1):
-                # search around cell for a direction
-                path = self.find_quick_path([x, y], world)
-                if path:
-                    tx, ty = path
-                    flow_dir = [tx - x, ty - y]
-                    key = 0
-                    for direction in DIR_NEIGHBORS_CENTER:
-                        if direction == flow_dir:
-                            water_path[y, x] = key
-                        key += 1
+        # the same search as find_quick_path, for all the cells at once: the
+        # first of the neighbours with the lowest elevation below the cell
+        # (the last row and column are not given a direction)
+        elevation = world.layers['elevation'].data
+        height, width = elevation.shape
+        y, x = numpy.mgrid[0:height - 1, 0:width - 1]
+        lowest_elevation = elevation[:-1, :-1].copy()
+        water_path = water_path[:-1, :-1]
+
+        for dx, dy in DIR_NEIGHBORS:
+            tx, ty = x + dx, y + dy
+
+            if self.wrap:
+                inside = True
+            else:
+                inside = (tx >= 0) & (tx < width) & (ty >= 0) & (ty < height)
+
+            tx, ty = overflow(tx, width), overflow(ty, height)
+
+            elevation_around = elevation[ty, tx]
+            lower = inside & (elevation_around < lowest_elevation)
+            lowest_elevation[lower] = elevation_around[lower]
+
+            # encode the step taken; a step wrapping around the border
+            # matches none of the directions and leaves the cell without one
+            flow_dir_x, flow_dir_y = tx - x, ty - y
+            key = numpy.zeros(lower.shape, dtype=water_path.dtype)
+            for k, (kx, ky) in enumerate(DIR_NEIGHBORS_CENTER):
+                key[(flow_dir_x == kx) & (flow_dir_y == ky)] = k
+            water_path[lower] = key[lower]
 
     def find_quick_path(self, river, world):
         # Water flows based on cost, seeking the highest elevation difference
@@ -135,49 +346,101 @@ class ErosionSimulation(object):
         #     we mark them as rivers. While looking, the cells with no
         #     out-going flow, above water flow threshold and are still
         #     above sea level are marked as 'sources'.
-        for y in range(0, world.height - 1):
-            for x in range(0, world.width - 1):
-                rain_fall = world.layers['precipitation'].data[y, x]
-                water_flow[y, x] = rain_fall
-
-                if water_path[y, x] == 0:
-                    continue  # ignore cells without flow direction
-                cx, cy = x, y  # begin with starting location
-                neighbour_seed_found = False
-                # follow flow path to where it may lead
-                while not neighbour_seed_found:
-
-                    # have we found a seed?
-                    if world.is_mountain((cx, cy)) and water_flow[cy, cx] >= RIVER_TH:
-
-                        # try not to create seeds around other seeds
-                        for seed in river_source_list:
-                            sx, sy = seed
-                            if in_circle(9, cx, cy, sx, sy):
-                                neighbour_seed_found = True
-                        if neighbour_seed_found:
-                            break  # we do not want seeds for neighbors
 
+        # Cells are taken in row order and each one starts with its own
+        # rainfall (dropping what flowed in so far), then passes it downstream
+        # until a mountain cell with enough flow is met, which becomes a seed.
+        # Only the walks meeting mountain cells can stop early or create
+        # seeds, so only those are followed one by one (jumping from mountain
+        # cell to mountain cell); everything else is a flow accumulation over
+        # the graph of flow directions.
+        height, width = water_path.shape
+        rain = world.layers['precipitation'].data.ravel()
+        mountains = numpy.logical_and(
+            numpy.logical_not(world.layers['ocean'].data),
+            world.layers['elevation'].data > world.get_mountain_level()).ravel()
+
+        downstream = _downstream(water_path)
+        next_mountain = _first_downstream(downstream, mountains)
+
+        # the cells the loop starts from: all except the last row and column
+        starts = numpy.zeros((height, width), dtype=bool)
+        starts[:-1, :-1] = True
+        starts = starts.ravel()
+        flowing = numpy.logical_and(starts, downstream >= 0)
+
+        # flow of the cells along the walks which are followed; only the
+        # values of mountain cells are used
+        flow = numpy.zeros(height * width)
+        # the cells within SEED_DISTANCE of a seed
+        near_seed = numpy.zeros((height, width), dtype=bool)
+        r = SEED_DISTANCE
+        disk = numpy.fromfunction(lambda y, x: in_circle(r, r, r, x, y), (2 * r + 1, 2 * r + 1))
+        # walks stopped at a seed, as (start, last cell)
+        stopped = []
+
+        _next_mountain = next_mountain.tolist()
+        _mountains = mountains.tolist()
+        followed = numpy.logical_and(starts, numpy.logical_or(mountains, next_mountain >= 0))
+        for start in numpy.nonzero(followed)[0].tolist():
+            rain_fall = rain[start]
+            flow[start] = rain_fall
+            if not flowing[start]:
+                continue  # ignore cells without flow direction
+            current = start
+            while True:
+                # have we found a seed?
+                if _mountains[current] and flow[current] >= RIVER_TH:
+                    cy, cx = divmod(current, width)
+                    # try not to create seeds around other seeds
+                    if not near_seed[cy, cx]:
                         river_source_list.append([cx, cy])  # river seed
-                        break
+                        top, bottom = max(cy - r, 0), min(cy + r + 1, height)
+                        left, right = max(cx - r, 0), min(cx + r + 1, width)
+                        near_seed[top:bottom, left:right] |= \
+                            disk[top - cy + r:bottom - cy + r, left - cx + r:right - cx + r]
+                    stopped.append((start, current))
+                    break
 
-                    # no path means dead end...
-                    if water_path[cy, cx] == 0:
-                        break  # break out of loop
+                # follow the path to the next mountain cell, the flow of the
+                # cells in between cannot stop it
+                current = _next_mountain[current]
+                if current < 0:
+                    break
+                flow[current] += rain_fall
+
+        # the rainfall of every cell flows from the cell after it to the end
+        # of its path, or to the cell where it stopped
+        inflow = numpy.zeros(height * width)
+        sources = numpy.nonzero(flowing)[0]
+        numpy.add.at(inflow, downstream[sources], rain[sources])
+        if stopped:
+            start, last = numpy.array(stopped).T
+            ends = downstream[last]
+            numpy.subtract.at(inflow, ends[ends >= 0], rain[start[ends >= 0]])
+
+        accumulated = _flow_accumulation(downstream, inflow)
+        accumulated[starts] += rain[starts]
+        accumulated[mountains] = flow[mountains]
+        water_flow[:, :] = accumulated.reshape(height, width)
 
-                    # follow path, add water flow from previous cell
-                    dx, dy = DIR_NEIGHBORS_CENTER[water_path[cy, cx]]
-                    nx, ny = cx + dx, cy + dy  # calculate next cell
-                    water_flow[ny, nx] += rain_fall
-                    cx, cy = nx, ny  # set current cell to next cell
         return river_source_list
 
-    def river_flow(self, source, world, river_list, lake_list):
+    def river_flow(self, source, world, river_list, lake_list, river_index=None,
+                   depressions=None):
         """simulate fluid dynamics by using starting point and flowing to the
-        lowest available point"""
+        lowest available point
+
+        depressions is the result of _priority_flood: if given, a river stuck
+        in a depression leaves it through its spill point."""
         current_location = source
         path = [source]
 
+        # which river passes through each cell, and where
+        if river_index is None:
+            river_index = _index_rivers(world, river_list)
+        river_ids, river_positions = river_index
+
         # start the flow
         while True:
             x, y = current_location
@@ -188,17 +451,15 @@ class ErosionSimulation(object):
                 if self.wrap:
                     ax, ay = overflow(ax, world.width), overflow(ay,
                                                                  world.height)
+                elif not world.contains((ax, ay)):
+                    continue
 
-                for river in river_list:
-                    if [ax, ay] in river:
-                        merge = False
-                        for rx, ry in river:
-                            if [ax, ay] == [rx, ry]:
-                                merge = True
-                                path.append([rx, ry])
-                            elif merge:
-                                path.append([rx, ry])
-                        return path  # skip the rest, return path
+                river_id = river_ids[ay, ax]
+                if river_id >= 0:
+                    # follow that river from the cell touched onwards
+                    river = river_list[river_id]
+                    path.extend([rx, ry] for rx, ry in river[river_positions[ay, ax]:])
+                    return path  # skip the rest, return path
 
             # found a sea?
             if world.is_ocean((x, y)):
@@ -212,10 +473,19 @@ class ErosionSimulation(object):
                 current_location = quick_section
                 continue  # stop here and enter back into loop
 
+            if depressions is not None:
+                spill_path = self.spill_path(current_location, world, depressions)
+                if not spill_path:  # the lowest point of a map without sea
+                    lake_list.append(current_location)
+                    break
+                path += spill_path
+                current_location = path[-1]
+                continue
+
             is_wrapped, lower_elevation = self.findLowerElevation(
                 current_location, world)
             if lower_elevation and not is_wrapped:
-                lower_path = worldengine.astar.PathFinder().find(
+                lower_path = self.path_finder.find(
                     world.layers['elevation'].data, current_location, lower_elevation)
                 if lower_path:
                     path += lower_path
@@ -258,7 +528,7 @@ class ErosionSimulation(object):
                             current_location, lower_elevation))
 
                 # find our way to the edge
-                edge_path = worldengine.astar.PathFinder().find(
+                edge_path = self.path_finder.find(
                     world.layers['elevation'].data, [cx, cy], [lx, ly])
                 if not edge_path:
                     # can't find another other path, make it a lake
@@ -269,7 +539,7 @@ class ErosionSimulation(object):
                 current_location = path[-1]
 
                 # find our way to lowest position original found
-                lower_path = worldengine.astar.PathFinder().find(
+                lower_path = self.path_finder.find(
                     world.layers['elevation'].data, current_location, lower_elevation)
                 path += lower_path
                 current_location = path[-1]
@@ -283,6 +553,26 @@ class ErosionSimulation(object):
 
         return path
 
+    @staticmethod
+    def spill_path(source, world, depressions):
+        """Path out of the depression of source, following the cells the
+        priority-flood reached it from, up to a lower cell outside of any
+        depression or to the sea"""
+        _, receivers, lakes = depressions
+        elevation = world.layers['elevation'].data
+        x, y = source
+        lowest_elevation = elevation[y, x]
+        lid = y * world.width + x
+        path = []
+        while receivers[lid] >= 0:
+            lid = receivers[lid]
+            y, x = divmod(int(lid), world.width)
+            path.append([x, y])
+            if world.is_ocean((x, y)) or \
+                    (elevation[y, x] < lowest_elevation and lakes[y, x] < 0):
+                break
+        return path
+
     def cleanUpFlow(self, river, world):
         '''Validate that for each point in river is equal to or lower than the
         last'''
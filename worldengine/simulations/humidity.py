@@ -1,4 +1,4 @@
-from worldengine.simulations.basic import find_threshold_f
+from worldengine.simulations.basic import find_thresholds
 import numpy
 
 
@@ -22,15 +22,21 @@ class HumiditySimulation(object):
 
         data = (world.layers['precipitation'].data * precipitationWeight - world.layers['irrigation'].data * irrigationWeight)/(precipitationWeight + irrigationWeight)
 
+        ocean = world.layers['ocean'].data
+        return data, HumiditySimulation.quantiles(data, humids, ocean)
+
+    @staticmethod
+    def quantiles(humidity, humids, ocean, values=None):
+        """The humidity quantiles for the given humids percentages"""
         # These were originally evenly spaced at 12.5% each but changing them
         # to a bell curve produced better results
-        ocean = world.layers['ocean'].data
+        ths = find_thresholds(humidity, humids[:7], ocean, values=values)
         quantiles = {}
-        quantiles['12'] = find_threshold_f(data, humids[6], ocean)
-        quantiles['25'] = find_threshold_f(data, humids[5], ocean)
-        quantiles['37'] = find_threshold_f(data, humids[4], ocean)
-        quantiles['50'] = find_threshold_f(data, humids[3], ocean)
-        quantiles['62'] = find_threshold_f(data, humids[2], ocean)
-        quantiles['75'] = find_threshold_f(data, humids[1], ocean)
-        quantiles['87'] = find_threshold_f(data, humids[0], ocean)
-        return data, quantiles
+        quantiles['12'] = ths[6]
+        quantiles['25'] = ths[5]
+        quantiles['37'] = ths[4]
+        quantiles['50'] = ths[3]
+        quantiles['62'] = ths[2]
+        quantiles['75'] = ths[1]
+        quantiles['87'] = ths[0]
+        return quantiles
@@ -1,8 +1,28 @@
-from worldengine.simulations.basic import find_threshold_f
+import time
+
+from worldengine.simulations.basic import find_thresholds
+from worldengine.common import get_verbose
 import numpy
 
 
 class WatermapSimulation(object):
+    """
+    The watermap holds how much water flows through every land cell. It is
+    found either by letting the precipitation of 20000 random land cells
+    flow downhill ('droplets', the default), by doing so with a number of
+    droplets depending on the land area, until the thresholds converge
+    ('adaptive'), or deterministically by accumulating the precipitation of
+    all the land cells over the whole map ('flow').
+    """
+
+    METHODS = ('droplets', 'flow', 'adaptive')
+
+    def __init__(self, method='droplets', tolerance=0.02):
+        if method not in WatermapSimulation.METHODS:
+            raise ValueError("Unknown watermap method '%s', expected one of %s" %
+                             (method, ', '.join(WatermapSimulation.METHODS)))
+        self.method = method
+        self.tolerance = tolerance
 
     @staticmethod
     def is_applicable(world):
@@ -10,24 +30,141 @@ class WatermapSimulation(object):
 
     def execute(self, world, seed):
         assert seed is not None
-        data, thresholds = self._watermap(world, 20000)
+        if get_verbose():
+            start_time = time.time()
+        if self.method == 'flow':
+            data, thresholds = self._flow_watermap(world)
+        elif self.method == 'adaptive':
+            data, thresholds, curve = self._adaptive_watermap(world, self.tolerance)
+            if get_verbose():
+                for droplets, change in curve:
+                    if change is None:
+                        print("   %7i droplets" % droplets)
+                    else:
+                        print("   %7i droplets, thresholds changed by %f" % (droplets, change))
+                change = curve[-1][1]
+                if change is not None and change < self.tolerance:
+                    print("   converged after %i droplets" % curve[-1][0])
+                else:
+                    print("   stopped after %i droplets, one for every land cell" % curve[-1][0])
+        else:
+            data, thresholds = self._watermap(world, 20000)
         world.watermap = (data, thresholds)
+        if get_verbose():
+            elapsed_time = time.time() - start_time
+            print("...watermap calculated (%s). Elapsed time %f  seconds."
+                  % (self.method, elapsed_time))
 
     @staticmethod
-    def _watermap(world, n):
-        def droplet(world, pos, q, _watermap):
-            if q < 0:
-                return
-            x, y = pos
-            pos_elev = world.layers['elevation'].data[y, x] + _watermap[y, x]
+    def _thresholds(watermap, ocean):
+        ths = find_thresholds(watermap, [0.05, 0.02, 0.007], ocean=ocean)
+        thresholds = dict()
+        thresholds['creek'] = ths[0]
+        thresholds['river'] = ths[1]
+        thresholds['main river'] = ths[2]
+        return thresholds
+
+    @staticmethod
+    def _flow_watermap(world):
+        """
+        Every land cell receives its precipitation and passes all the water
+        it gets to the lower cells around it, each one getting a share
+        proportional to the difference of elevation (multiple flow
+        directions). The water reaching the ocean is lost and the cells
+        without lower cells around keep it.
+
+        The cells are processed in topological order, a front of cells
+        whose upstream cells are all done at a time, so the cost is linear
+        in the number of cells and no random number is used.
+        """
+        height, width = world.height, world.width
+        ocean = world.layers['ocean'].data
+        if ocean.all():
+            return numpy.zeros((height, width)), WatermapSimulation._thresholds(
+                numpy.zeros((height, width)), ocean)
+
+        elevation = world.layers['elevation'].data
+        land = ~ocean
+        # the cells around every cell, in the order of world.tiles_around
+        around = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx != 0 or dy != 0]
+
+        def shifted(dx, dy):
+            """The slices of the cells having a cell at (dx, dy) from them,
+            and of those cells"""
+            def axis(d, n):
+                return slice(max(0, -d), n - max(0, d)), slice(max(0, d), n - max(0, -d))
+            (ys, yt), (xs, xt) = axis(dy, height), axis(dx, width)
+            return (ys, xs), (yt, xt)
+
+        # one direction at a time, the total drop around every cell (its
+        # water is shared in proportion to the drops) and the number of land
+        # cells sending water to every land cell
+        total = numpy.zeros((height, width))
+        upstream = numpy.zeros((height, width), dtype=numpy.int8)
+        for dx, dy in around:
+            source, target = shifted(dx, dy)
+            drop = elevation[source] - elevation[target]
+            total[source] += numpy.maximum(drop, 0.0)
+            upstream[target] += land[source] & land[target] & (drop > 0)
+        total = total.ravel()
+        upstream = upstream.ravel()
+        elevation = elevation.ravel()
+        land = land.ravel()
+
+        water = numpy.where(land, world.layers['precipitation'].data.ravel(), 0.0)
+        water = numpy.maximum(water, 0.0)
+
+        front = numpy.nonzero(numpy.logical_and(land, upstream == 0))[0]
+        while len(front):
+            y, x = numpy.divmod(front, width)
+            reached = []
+            for dx, dy in around:
+                inside = (x + dx >= 0) & (x + dx < width) & (y + dy >= 0) & (y + dy < height)
+                going = front[inside]
+                to = going + (dy * width + dx)
+                drop = elevation[going] - elevation[to]
+                # only the water going to other land cells is followed
+                down = (drop > 0) & land[to]
+                going, to = going[down], to[down]
+                numpy.add.at(water, to, water[going] * (drop[down] / total[going]))
+                numpy.subtract.at(upstream, to, 1)
+                reached.append(to)
+            reached = numpy.unique(numpy.concatenate(reached))
+            front = reached[upstream[reached] == 0]
+
+        data = water.reshape(height, width)
+        return data, WatermapSimulation._thresholds(data, ocean)
+
+    @staticmethod
+    def _droplets(world):
+        """
+        The droplet model: returns a function letting n droplets fall on
+        random land cells, and the flat list of the water they leave, which
+        grows every time the function is called.
+        """
+        height, width = world.height, world.width
+        # flat copies of the layers, read and written one cell at a time
+        layers = {}
+        water = [0.0] * (width * height)
+        # the cells around a cell, in the order of world.tiles_around
+        around = [(dx, dy, dy * width + dx) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                  if dx != 0 or dy != 0]
+
+        def spread(pos, q):
+            """Share the water q of a cell among the lower cells around it,
+            returns the cells getting some as a stack of (cell, quantity)"""
+            elevation = layers['elevation']
+            x, y = pos % width, pos // width
+            pos_elev = elevation[pos] + water[pos]
             lowers = []
-            min_higher = None
             min_lower = None
-            # pos_min_higher = None  # TODO: no longer used?
             tot_lowers = 0
-            for p in world.tiles_around((x, y)):#TODO: switch to numpy
-                px, py = p
-                e = world.layers['elevation'].data[py, px] + _watermap[py, px]
+            inside = 0 < x < width - 1 and 0 < y < height - 1
+            for dx, dy, d in around:
+                if not inside and not (0 <= x + dx < width and 0 <= y + dy < height):
+                    continue
+                p = pos + d
+                e = elevation[p] + water[p]
                 if e < pos_elev:
                     dq = int(pos_elev - e) << 2
                     if min_lower is None or e < min_lower:
@@ -36,45 +173,96 @@ class WatermapSimulation(object):
                             dq = 1
                     lowers.append((dq, p))
                     tot_lowers += dq
+            if not lowers:
+                water[pos] += q
+                return []
+            f = q / tot_lowers
+            ocean = layers['ocean']
+            return [(p, f * s) for s, p in reversed(lowers) if not ocean[p]]
 
-                else:
-                    if min_higher is None or e > min_higher:
-                        min_higher = e
-                        # pos_min_higher = p
-            if lowers:
-                f = q / tot_lowers
-                for l in lowers:
-                    s, p = l
-                    if not world.is_ocean(p):
-                        px, py = p
-                        ql = f * s
-                        # ql = q
-                        going = ql > 0.05
-                        _watermap[py, px] += ql
-                        if going:
-                            droplet(world, p, ql, _watermap)
-            else:
-                _watermap[y, x] += q
-
-        _watermap_data = numpy.zeros((world.height, world.width), dtype=float)
-
-        # This indirectly calls the global rng.
-        # We want different implementations of _watermap
-        # and internally called functions (especially random_land)
-        # to show the same rng behaviour and not contamine the state of the global rng
-        # should anyone else happen to rely on it.
-
-        land_sample = world.random_land(n)
-
-        if land_sample[0] is not None:
-            for i in range(n):
-                x, y = land_sample[2*i], land_sample[2*i+1]
-                if world.precipitations_at((x, y)) > 0:
-                    droplet(world, (x, y), world.precipitations_at((x, y)), _watermap_data)
+        def droplet(pos, q):
+            # depth first, like a recursive walk: the water of a cell goes
+            # all the way down before the next cell around it gets its share
+            stack = [spread(pos, q)]
+            while stack:
+                cells = stack[-1]
+                if not cells:
+                    stack.pop()
+                    continue
+                p, ql = cells.pop()
+                water[p] += ql
+                if ql > 0.05:
+                    stack.append(spread(p, ql))
+
+        def drop(n):
+            # This indirectly calls the global rng.
+            # We want different implementations of _watermap
+            # and internally called functions (especially random_land)
+            # to show the same rng behaviour and not contamine the state of the global rng
+            # should anyone else happen to rely on it.
+
+            land_sample = world.random_land(n)
+
+            if land_sample[0] is not None:
+                if not layers:
+                    layers['elevation'] = world.layers['elevation'].data.ravel().tolist()
+                    layers['ocean'] = world.layers['ocean'].data.ravel().tolist()
+                precipitation = world.layers['precipitation'].data
+                for i in range(n):
+                    x, y = land_sample[2*i], land_sample[2*i+1]
+                    if precipitation[y, x] > 0:
+                        droplet(y * width + x, precipitation[y, x])
+
+        return drop, water
+
+    @staticmethod
+    def _watermap(world, n):
+        drop, water = WatermapSimulation._droplets(world)
+        drop(n)
+        _watermap_data = numpy.array(water).reshape(world.height, world.width)
 
         ocean = world.layers['ocean'].data
-        thresholds = dict()
-        thresholds['creek'] = find_threshold_f(_watermap_data, 0.05, ocean=ocean)
-        thresholds['river'] = find_threshold_f(_watermap_data, 0.02, ocean=ocean)
-        thresholds['main river'] = find_threshold_f(_watermap_data, 0.007, ocean=ocean)
-        return _watermap_data, thresholds
+        return _watermap_data, WatermapSimulation._thresholds(_watermap_data, ocean)
+
+    @staticmethod
+    def _adaptive_watermap(world, tolerance=0.02):
+        """
+        The droplet model with as many droplets as the map needs: they fall
+        in batches sized on the land area (one droplet every 32 land cells,
+        at least 500) until the thresholds of the watermap change by less
+        than tolerance (relatively) from a batch to the next, or a droplet
+        has fallen for every land cell.
+
+        The watermap is scaled to the 20000 droplets of the 'droplets'
+        method, so that its values and thresholds can be compared.
+        Returns the watermap, its thresholds and the convergence curve: the
+        droplets fallen and the largest change of the thresholds after
+        every batch. The change is None when there is no full batch to
+        compare with: after the first batch, and after a last batch cut
+        short by the limit on the droplets.
+        """
+        height, width = world.height, world.width
+        ocean = world.layers['ocean'].data
+        land = int(ocean.size - numpy.count_nonzero(ocean))
+        batch = max(500, land // 32)
+        limit = max(2 * batch, land)
+
+        drop, water = WatermapSimulation._droplets(world)
+        curve = []
+        used = 0
+        previous = None
+        while used < limit:
+            n = min(batch, limit - used)
+            drop(n)
+            used += n
+            data = numpy.array(water).reshape(height, width) * (20000.0 / used)
+            thresholds = WatermapSimulation._thresholds(data, ocean)
+            change = None
+            if previous is not None and n == batch and land > 0:
+                change = max(abs(thresholds[k] - previous[k]) /
+                             max(abs(previous[k]), 1e-9) for k in thresholds)
+            curve.append((used, change))
+            if land == 0 or (change is not None and change < tolerance):
+                break
+            previous = thresholds
+        return data, thresholds, curve
@@ -10,24 +10,51 @@ class IcecapSimulation(object):
     # TODO: Find out if a desert planet could still freeze or if the freeze-threshold is dynamic.
     # TODO: Freeze rivers etc.
 
+    # 'raster': the tiles are visited row by row, every tile seeing the ice
+    # of the tiles visited before it (the original behaviour);
+    # 'checkerboard': the tiles are visited in four batches of tiles not
+    # touching each other, every batch seeing the ice of the batches before
+    MODES = ('raster', 'checkerboard')
+
+    def __init__(self, mode='raster'):
+        if mode not in IcecapSimulation.MODES:
+            raise ValueError("Unknown icecap mode '%s', expected one of %s" %
+                             (mode, ', '.join(IcecapSimulation.MODES)))
+        self.mode = mode
+
     @staticmethod
     def is_applicable(world):
         return world.has_ocean() and world.has_temperature()
 
     def execute(self, world, seed):
-        world.icecap = self._calculate(world, seed)
+        world.icecap = self._calculate(world, seed, self.mode)
+
+    @staticmethod
+    def _solid_around(solid_map):
+        """The number of solid tiles around every tile, the tile excluded"""
+        padded = numpy.pad(solid_map, 1, mode='constant').astype(int)
+        height, width = solid_map.shape
+        count = numpy.zeros((height, width), dtype=int)
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                if dy != 1 or dx != 1:
+                    count += padded[dy:dy + height, dx:dx + width]
+        return count
 
     @staticmethod
-    def _calculate(world, seed):
+    def _calculate(world, seed, mode='raster'):
         # Notes on performance:
         #  -method is run once per generation
-        #  -iterations        : width * height
+        #  -the chance of every tile to freeze is computed for all of them at
+        #   once; in raster mode only the tiles whose fate depends on the
+        #   tiles frozen before them are then visited one at a time
         #  -memory consumption: width * height * sizeof(numpy.float) (permanent)
-        #                       width * height * sizeof(numpy.bool) (temporary)
+        #                       a few width * height arrays (temporary)
 
         # constants for convenience (or performance)
         ocean = world.layers['ocean'].data
         temperature = world.layers['temperature'].data
+        height, width = ocean.shape
 
         # primary constants (could be used as global variables at some point);
         # all values should be in [0, 1]
@@ -58,34 +85,74 @@ class IcecapSimulation(object):
         freeze_chance_threshold = freeze_threshold * (1.0 - freeze_chance_window)
 
         # local variables
-        icecap = numpy.zeros((world.height, world.width), dtype=float)
+        icecap = numpy.zeros((height, width), dtype=float)
         rng = numpy.random.RandomState(seed)  # create our own random generator
 
         # map that is True whenever there is land or (certain) ice around
         solid_map = numpy.logical_or(temperature <= freeze_chance_threshold + temp_min, numpy.logical_not(ocean))
 
-        for y in range(world.height):
-            for x in range(world.width):
-                if world.is_ocean((x, y)):  # or world.river_map[y, x] > 0 or world.lake_map[y, x] > 0 or world.watermap['data'][y, x] > 0:
-                    t = temperature[y, x]
-                    if t - temp_min < freeze_threshold:
-                        # map temperature to freeze-chance (linear interpolation)
-                        chance = numpy.interp(t, [temp_min, freeze_chance_threshold, freeze_threshold], [1.0, 1.0, 0.0])
-                        # *will* freeze for temp_min <= t <= freeze_chance_threshold
-                        # *can* freeze for freeze_chance_threshold < t < freeze_threshold
-
-                        # count number of frozen/solid tiles around this one
-                        if 0 < x < world.width - 1 and 0 < y < world.height - 1:  # exclude borders
-                            surr_tiles = solid_map[y-1:y+2, x-1:x+2]
-                            chance_mod = numpy.count_nonzero(surr_tiles)
-                            chance_mod -= 1 if solid_map[y, x] else 0  # remove center-tile (i.e. the current tile)
-
-                            # map amount of tiles to chance-modifier, [-1.0, 1.0]
-                            chance_mod = numpy.interp(chance_mod, [0, surr_tiles.size - 1], [-1.0, 1.0])
-                            chance += chance_mod * surrounding_tile_influence
-
-                        if rng.rand() <= chance:  # always freeze for chance >= 1.0, never for <= 0.0
-                            solid_map[y, x] = True  # mark tile as frozen
-                            icecap[y, x] = freeze_threshold - (t - temp_min)  # thickness of the ice (arbitrary scale)
+        # the tiles which can freeze (or river_map, lake_map, watermap > 0?)
+        candidates = numpy.logical_and(ocean, temperature - temp_min < freeze_threshold)
+        ys, xs = numpy.nonzero(candidates)  # in the order of a row by row visit
+        # one random number per candidate, as drawn by the row by row visit
+        draws = rng.rand(len(ys))
+        t = temperature[ys, xs]
+
+        # map temperature to freeze-chance (linear interpolation)
+        chance = numpy.interp(t, [temp_min, freeze_chance_threshold, freeze_threshold], [1.0, 1.0, 0.0])
+        # *will* freeze for temp_min <= t <= freeze_chance_threshold
+        # *can* freeze for freeze_chance_threshold < t < freeze_threshold
+
+        # the tiles on the borders are not influenced by the tiles around
+        inner = (xs > 0) & (xs < width - 1) & (ys > 0) & (ys < height - 1)
+
+        def chance_with(count, which=slice(None)):
+            """The chance of the candidates selected by which to freeze,
+            given the number of solid tiles around them"""
+            # map amount of tiles to chance-modifier, [-1.0, 1.0]
+            chance_mod = numpy.interp(count, [0, 8], [-1.0, 1.0])
+            return numpy.where(inner[which], chance[which] + chance_mod * surrounding_tile_influence,
+                               chance[which])
+
+        frozen = numpy.zeros((height, width), dtype=bool)
+        if mode == 'checkerboard':
+            # tiles of the same color do not touch each other
+            color = (ys % 2) * 2 + xs % 2
+            for c in range(4):
+                batch = color == c
+                solid = numpy.logical_or(solid_map, frozen)
+                count = IcecapSimulation._solid_around(solid)[ys[batch], xs[batch]]
+                # always freeze for chance >= 1.0, never for <= 0.0
+                frozen[ys[batch], xs[batch]] = draws[batch] <= chance_with(count, batch)
+        else:
+            # a tile sees the ice of the tiles visited before it: the one on
+            # its left and the three above. Only the tiles which are not
+            # solid already can change what the others see
+            count = IcecapSimulation._solid_around(solid_map)[ys, xs]
+            can_change = numpy.logical_and(candidates, numpy.logical_not(solid_map))
+            padded = numpy.pad(can_change, 1, mode='constant')
+            before = [(-1, -1), (-1, 0), (-1, 1), (0, -1)]
+            changes_before = sum(padded[ys + 1 + dy, xs + 1 + dx].astype(int) for dy, dx in before)
+
+            # freeze when freezing with none of them is sure, and do not
+            # when not even all of them would do
+            sure = draws <= chance_with(count)
+            undecided = numpy.logical_and(numpy.logical_not(sure),
+                                          draws <= chance_with(count + changes_before))
+            frozen[ys[sure], xs[sure]] = True
+
+            # the others are visited in order, the ones before them are known
+            # (they are all inner tiles, the border ones are decided already)
+            froze_and_changed = numpy.logical_and(frozen, can_change)
+            for i in numpy.nonzero(undecided)[0]:
+                y, x = ys[i], xs[i]
+                extra = froze_and_changed[y - 1, x - 1:x + 2].sum() + froze_and_changed[y, x - 1]
+                chance_mod = numpy.interp(count[i] + extra, [0, 8], [-1.0, 1.0])
+                if draws[i] <= chance[i] + chance_mod * surrounding_tile_influence:
+                    frozen[y, x] = True
+                    froze_and_changed[y, x] = can_change[y, x]
+
+        # thickness of the ice (arbitrary scale)
+        icecap[frozen] = freeze_threshold - (temperature[frozen] - temp_min)
 
         return icecap
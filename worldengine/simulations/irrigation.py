@@ -1,23 +1,28 @@
 import numpy
 
 class IrrigationSimulation(object):
+    def __init__(self, radius=10):
+        self.radius = radius
+
     @staticmethod
     def is_applicable(world):
         return world.has_watermap() and (not world.has_irrigation())
 
     def execute(self, world, seed):
-        world.irrigation = self._calculate(world)
+        world.irrigation = self._calculate(world, self.radius)
 
     @staticmethod
-    def _calculate(world):
+    def _calculate(world, radius=10):
         # Notes on performance:
         #  -method is run once per generation
-        #  -iterations        : width * height
-        #  -memory consumption: width * height * sizeof(numpy.float) (permanent)
+        #  -the water of every ocean cell is spread over the square of the
+        #   given radius around it: that is a convolution of the watermap of
+        #   the ocean with 1 / logs, done with FFTs, so the time hardly
+        #   depends on the radius
+        #  -memory consumption: a few times (width + 2 * radius) * (height + 2 * radius) floats
 
         width = world.width
         height = world.height
-        radius = 10
 
         #create array of pre-calculated values -> less calculations
         d = numpy.arange(-radius, radius + 1, 1, dtype=float)
@@ -25,27 +30,16 @@ class IrrigationSimulation(object):
         #calculate final matrix: ln(sqrt(x^2+y^2) + 1) + 1
         logs = numpy.log1p(numpy.sqrt(numpy.square(x) + numpy.square(y))) + 1
 
-        #create output array
-        values = numpy.zeros((height, width), dtype=float)
-
-        it_all = numpy.nditer(values, flags=['multi_index'], op_flags=['readonly'])
-        while not it_all.finished:
-            x = it_all.multi_index[1]
-            y = it_all.multi_index[0]
-            if world.is_ocean((x, y)):
-                #coordinates used for the values-slice (tl = top-left etc.)
-                tl_v = (max(x - radius, 0)        , max(y - radius, 0))
-                br_v = (min(x + radius, width - 1), min(y + radius, height - 1))
-                #coordinates used for the logs-slice
-                tl_l = (max(radius - x, 0)        , max(radius - y, 0))
-                br_l = (min(radius - x + width - 1, 2 * radius), min(radius - y + height - 1, 2 * radius))
-
-                #extract the necessary parts of the arrays
-                logs_relevant = logs[tl_l[1]:br_l[1]+1, tl_l[0]:br_l[0]+1]
-
-                #finish calculation
-                values[tl_v[1]:br_v[1]+1, tl_v[0]:br_v[0]+1] += world.layers['watermap'].data[y, x] / logs_relevant
+        #the water given by every cell: only ocean cells give any
+        sources = numpy.where(world.layers['ocean'].data, world.layers['watermap'].data, 0.0)
+        if not sources.any():
+            return numpy.zeros((height, width), dtype=float)
 
-            it_all.iternext()
+        #the kernel is symmetric, so the convolution is the sum of its copies
+        #centered on every source; padding both to the full size of the
+        #convolution keeps the FFTs from wrapping around the borders
+        shape = (height + 2 * radius, width + 2 * radius)
+        spread = numpy.fft.irfft2(numpy.fft.rfft2(sources, shape) *
+                                  numpy.fft.rfft2(1.0 / logs, shape), shape)
 
-        return values
+        return spread[radius:radius + height, radius:radius + width]
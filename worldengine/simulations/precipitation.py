@@ -1,13 +1,16 @@
 import time
 import numpy
-from noise import snoise2
 
-from worldengine.simulations.basic import find_threshold_f
+from worldengine.simulations.basic import find_thresholds
 from worldengine.common import get_verbose
+from worldengine.noise_field import noise_field
 
 
 class PrecipitationSimulation(object):
 
+    def __init__(self, workers=1):
+        self.workers = workers
+
     @staticmethod
     def is_applicable(world):
         return not world.has_precipitations()
@@ -15,11 +18,12 @@ class PrecipitationSimulation(object):
     def execute(self, world, seed):
         if get_verbose():
             start_time = time.time()
-        pre_calculated = self._calculate(seed, world)
+        pre_calculated = self._calculate(seed, world, self.workers)
         ocean = world.layers['ocean'].data
+        low, med = find_thresholds(pre_calculated, [0.75, 0.3], ocean)
         ths = [
-            ('low', find_threshold_f(pre_calculated, 0.75, ocean)),
-            ('med', find_threshold_f(pre_calculated, 0.3, ocean)),
+            ('low', low),
+            ('med', med),
             ('hig', None)
         ]
         world.precipitation = (pre_calculated, ths)
@@ -30,7 +34,7 @@ class PrecipitationSimulation(object):
                 % elapsed_time)
 
     @staticmethod
-    def _calculate(seed, world):
+    def _calculate(seed, world, workers=1):
         """Precipitation is a value in [-1,1]"""
         rng = numpy.random.RandomState(seed)  # create our own random generator
         base = rng.randint(0, 4096)
@@ -40,7 +44,6 @@ class PrecipitationSimulation(object):
         height = world.height
         width = world.width
         border = width / 4
-        precipitations = numpy.zeros((height, width), dtype=float)
 
         octaves = 6
         freq = 64.0 * octaves
@@ -49,18 +52,9 @@ class PrecipitationSimulation(object):
                                        #so that worlds sharing a common seed but
                                        #different sizes will have similar patterns
 
-        for y in range(height):#TODO: numpy
-            for x in range(width):
-                n = snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves, base=base)
-
-                # Added to allow noise pattern to wrap around right and left.
-                if x < border:
-                    n = (snoise2( (x * n_scale) / freq, (y * n_scale) / freq, octaves,
-                                 base=base) * x / border) + (
-                        snoise2(( (x * n_scale) + width) / freq, (y * n_scale) / freq, octaves,
-                                base=base) * (border - x) / border)
-
-                precipitations[y, x] = n
+        # the noise pattern is blended to allow it to wrap around right and left
+        precipitations = noise_field(width, height, freq, octaves, base,
+                                     scale=n_scale, border=border, workers=workers)
 
         #find ranges
         min_precip = precipitations.min()
@@ -1,10 +1,13 @@
-from worldengine.simulations.basic import find_threshold_f
-from noise import snoise2  # http://nullege.com/codes/search/noise.snoise2
+from worldengine.simulations.basic import find_thresholds
+from worldengine.noise_field import noise_field
 import numpy
 
 
 class TemperatureSimulation(object):
 
+    def __init__(self, workers=1):
+        self.workers = workers
+
     @staticmethod
     def is_applicable(world):
         return not world.has_temperature()
@@ -14,26 +17,30 @@ class TemperatureSimulation(object):
         ml = world.start_mountain_th()  # returns how many percent of the world are mountains
         ocean = world.layers['ocean'].data
 
-        t = self._calculate(world, seed, e, ml)
-        t_th = [
-            ('polar', find_threshold_f(t, world.temps[0], ocean)),
-            ('alpine', find_threshold_f(t, world.temps[1], ocean)),
-            ('boreal', find_threshold_f(t, world.temps[2], ocean)),
-            ('cool', find_threshold_f(t, world.temps[3], ocean)),
-            ('warm', find_threshold_f(t, world.temps[4], ocean)),
-            ('subtropical', find_threshold_f(t, world.temps[5], ocean)),
+        t = self._calculate(world, seed, e, ml, self.workers)
+        world.temperature = (t, self.thresholds(t, world.temps, ocean))
+
+    @staticmethod
+    def thresholds(temperature, temps, ocean, values=None):
+        """The named temperature thresholds for the given temps percentages"""
+        ths = find_thresholds(temperature, temps[:6], ocean, values=values)
+        return [
+            ('polar', ths[0]),
+            ('alpine', ths[1]),
+            ('boreal', ths[2]),
+            ('cool', ths[3]),
+            ('warm', ths[4]),
+            ('subtropical', ths[5]),
             ('tropical', None)
         ]
-        world.temperature = (t, t_th)
 
     @staticmethod
-    def _calculate(world, seed, elevation, mountain_level):
+    def _calculate(world, seed, elevation, mountain_level, workers=1):
         width = world.width
         height = world.height
 
         rng = numpy.random.RandomState(seed)  # create our own random generator
         base = rng.randint(0, 4096)
-        temp = numpy.zeros((height, width), dtype=float)
 
         '''
         Set up variables to take care of some orbital parameters:
@@ -71,31 +78,23 @@ class TemperatureSimulation(object):
         freq = 16.0 * octaves
         n_scale = 1024 / float(height)
 
-        for y in range(0, height):  # TODO: Check for possible numpy optimizations.
-            y_scaled = float(y) / height - 0.5  # -0.5...0.5
-
-            # map/linearly interpolate y_scaled to latitude measured from where the most sunlight hits the world:
-            # 1.0 = hottest zone, 0.0 = coldest zone
-            latitude_factor = numpy.interp(y_scaled, [axial_tilt - 0.5, axial_tilt, axial_tilt + 0.5],
-                                           [0.0, 1.0, 0.0], left=0.0, right=0.0)
-            for x in range(0, width):
-                n = snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves, base=base)
-
-                # Added to allow noise pattern to wrap around right and left.
-                if x <= border:
-                    n = (snoise2((x * n_scale) / freq, (y * n_scale) / freq, octaves,
-                                 base=base) * x / border) \
-                        + (snoise2(((x * n_scale) + width) / freq, (y * n_scale) / freq, octaves,
-                                   base=base) * (border - x) / border)
-
-                t = (latitude_factor * 12 + n * 1) / 13.0 / distance_to_sun
-                if elevation[y, x] > mountain_level:  # vary temperature based on height
-                    if elevation[y, x] > (mountain_level + 29):
-                        altitude_factor = 0.033
-                    else:
-                        altitude_factor = 1.00 - (
-                            float(elevation[y, x] - mountain_level) / 30)
-                    t *= altitude_factor
-                temp[y, x] = t
+        y_scaled = numpy.arange(height, dtype=float) / height - 0.5  # -0.5...0.5
+
+        # map/linearly interpolate y_scaled to latitude measured from where the most sunlight hits the world:
+        # 1.0 = hottest zone, 0.0 = coldest zone
+        latitude_factor = numpy.interp(y_scaled, [axial_tilt - 0.5, axial_tilt, axial_tilt + 0.5],
+                                       [0.0, 1.0, 0.0], left=0.0, right=0.0)
+
+        # the noise pattern is blended to allow it to wrap around right and left
+        n = noise_field(width, height, freq, octaves, base, scale=n_scale,
+                        border=border, border_inclusive=True, workers=workers)
+
+        temp = (latitude_factor[:, numpy.newaxis] * 12 + n * 1) / 13.0 / distance_to_sun
+
+        # vary temperature based on height
+        altitude_factor = numpy.where(elevation > (mountain_level + 29), 0.033,
+                                      1.00 - (elevation - mountain_level) / 30)
+        mountains = elevation > mountain_level
+        temp[mountains] *= altitude_factor[mountains]
 
         return temp